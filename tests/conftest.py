@@ -22,3 +22,19 @@ def pytest_collection_modifyitems(config, items):
     for item in items:
         if "slow" in item.keywords:
             item.add_marker(skip_slow)
+
+
+@pytest.fixture
+def kitti_data_dir(tmp_path):
+    r"""
+    Creates a tiny synthetic dataset in the directory layout of KITTI raw (3 sequences of 12 random 8x16 frames).
+    """
+    import cv2
+    import numpy as np
+    rng = np.random.default_rng(0)
+    for seq_idx in range(3):
+        img_dir = tmp_path / "kitti" / "2011_09_26" / f"drive_{seq_idx:04d}_sync" / "image_02" / "data"
+        img_dir.mkdir(parents=True)
+        for frame_idx in range(12):
+            cv2.imwrite(str(img_dir / f"{frame_idx:010d}.png"), rng.integers(0, 256, (8, 16, 3), dtype=np.uint8))
+    return str(tmp_path / "kitti")
@@ -1,8 +1,14 @@
 import pytest
+import torch
+from torch.utils.data import DataLoader, TensorDataset
 
+from vp_suite.base.base_dataset import VPSubset
 from vp_suite.datasets import DATASET_CLASSES
+from vp_suite.defaults import DEFAULT_RUN_CONFIG
 from vp_suite.utils.dataset_wrapper import VPDatasetWrapper
-from vp_suite.utils.utils import PytestExpectedException
+from vp_suite.utils.streaming import VPVideoStream
+from vp_suite.utils.shards import export_to_shards, VPShardDataset
+from vp_suite.utils.utils import PytestExpectedException, get_loader
 from helpers.test_helpers import skip_on
 
 
@@ -27,3 +33,104 @@ def test_dataset(dataset_str):
         assert ex_["frames"].shape[-3:] == train_wrapper.img_shape
         if train_wrapper.action_size > 0:
             assert ex_["actions"].shape[-1] == train_wrapper.action_size
+
+
+def test_dataset_window_stride(kitti_data_dir):
+    dataset_class = DATASET_CLASSES["KITTI"]
+    default_data = dataset_class("test", data_dir=kitti_data_dir, img_size=(8, 16))
+    default_data.set_seq_len(2, 2, 2)  # seq_len = 7
+    assert len(default_data) == 1  # only one non-overlapping window fits into 12 frames
+    dense_data = dataset_class("test", data_dir=kitti_data_dir, img_size=(8, 16), window_stride=1)
+    dense_data.set_seq_len(2, 2, 2)
+    assert len(dense_data) == 12 - 7 + 1
+    dense_data.set_seq_len(2, 2, 2)  # setting the sequence length again must not duplicate data points
+    assert len(dense_data) == 12 - 7 + 1
+
+    # reading the windows jointly (shared decoding) gives the same data as reading them one by one
+    indices = [3, 0, 5, 1]
+    joint_data = dense_data.__getitems__(indices)
+    for i, joint_dp in zip(indices, joint_data):
+        single_dp = dense_data[i]
+        assert joint_dp["origin"] == single_dp["origin"]
+        assert joint_dp["frames"].shape == (4, 3, 8, 16)
+        assert torch.equal(joint_dp["frames"], single_dp["frames"])
+    assert torch.equal(joint_data[0]["frames"][0], joint_data[3]["frames"][1])  # frame 3 is shared by both windows
+
+
+def test_dataset_loader_shared_decoding(kitti_data_dir):
+    dataset = DATASET_CLASSES["KITTI"]("test", data_dir=kitti_data_dir, img_size=(8, 16), window_stride=1)
+    dataset.set_seq_len(2, 2, 2)  # 6 overlapping windows of a single sequence
+    expected = [dataset[i] for i in range(len(dataset))]
+    read_frames, num_reads = dataset._read_frames, []
+
+    def counting_read_frames(sequence_path, frame_indices):
+        num_reads.append(len(frame_indices))
+        return read_frames(sequence_path, frame_indices)
+
+    dataset._read_frames = counting_read_frames
+    config = {**DEFAULT_RUN_CONFIG, "num_workers": 0}
+
+    # the loader fetches each batch at once, so that the overlapping windows of a batch are decoded only once
+    batches = list(get_loader(dataset, 3, config))
+    assert num_reads == [3 + 6, 3 + 6]  # each batch of 3 windows spans 9 frames
+    assert [dp["origin"] for dp in expected] == [o for batch in batches for o in batch["origin"]]
+    assert torch.equal(torch.cat([batch["frames"] for batch in batches]),
+                       torch.stack([dp["frames"] for dp in expected]))
+
+    # the same holds for subsets (e.g. train/val splits), whose indices are mapped to the underlying dataset
+    num_reads.clear()
+    subset = VPSubset(dataset, [5, 0, 4, 1])
+    batches = list(get_loader(subset, 4, config, drop_last=True))
+    assert num_reads == [12]  # the chained windows 0, 1, 4 and 5 are decoded jointly (frames 0-11)
+    assert batches[0]["origin"] == [expected[i]["origin"] for i in [5, 0, 4, 1]]
+
+    # datasets without __getitems__ are loaded datapoint by datapoint
+    plain_loader = get_loader(VPSubset(TensorDataset(torch.arange(4)), [3, 1]), 2, config)
+    assert plain_loader.batch_size == 2 and [batch[0].tolist() for batch in plain_loader] == [[3, 1]]
+
+
+def test_dataset_streaming(kitti_data_dir):
+    dataset = DATASET_CLASSES["KITTI"]("train", data_dir=kitti_data_dir, img_size=(8, 16), window_stride=2,
+                                       train_to_val_ratio=1.0)
+    dataset.set_seq_len(2, 3, 1)
+    expected = {dataset[i]["origin"]: dataset[i]["frames"] for i in range(len(dataset))}
+
+    # in-order streaming yields the same datapoints as map-style access
+    stream = VPVideoStream(dataset, shuffle=False)
+    streamed = list(stream)
+    assert [dp["origin"] for dp in streamed] == [dataset[i]["origin"] for i in range(len(dataset))]
+    for dp in streamed:
+        assert torch.equal(dp["frames"], expected[dp["origin"]])
+
+    # subsets (e.g. training splits) stream only their own windows
+    subset_stream = VPVideoStream(VPSubset(dataset, [4, 0, 2]), shuffle=False)
+    assert len(subset_stream) == 3
+    assert [dp["origin"] for dp in subset_stream] == [dataset[i]["origin"] for i in [0, 2, 4]]
+
+    # with multiple workers and shuffling, every datapoint is still emitted exactly once
+    loader = DataLoader(VPVideoStream(dataset, shuffle_buffer_size=3), batch_size=None, num_workers=2)
+    streamed_origins = [dp["origin"] for dp in loader]
+    assert sorted(streamed_origins) == sorted(expected.keys())
+
+
+@pytest.mark.parametrize('float_frames', [False, True])
+def test_dataset_shards(kitti_data_dir, tmp_path, float_frames):
+    dataset = DATASET_CLASSES["KITTI"]("train", data_dir=kitti_data_dir, img_size=(8, 16), window_stride=1,
+                                       train_to_val_ratio=1.0)
+    dataset.set_seq_len(2, 2, 1)
+    shard_dir = tmp_path / "shards"
+    index = export_to_shards(dataset, shard_dir, samples_per_shard=4, float_frames=float_frames)
+    assert len(index["shards"]) == (len(dataset) + 3) // 4
+    assert sum(shard["samples"] for shard in index["shards"]) == len(dataset)
+
+    expected = {dataset[i]["origin"]: dataset[i] for i in range(len(dataset))}
+    shard_data = VPShardDataset(shard_dir, shuffle=True, shuffle_buffer_size=3)
+    assert len(shard_data) == len(dataset) and shard_data.img_shape == dataset.img_shape
+    loader = DataLoader(shard_data, batch_size=None, num_workers=2)
+    read_data = list(loader)
+    assert sorted(dp["origin"] for dp in read_data) == sorted(expected.keys())
+    for dp in read_data:
+        expected_dp = expected[dp["origin"]]
+        assert dp["frames"].dtype == torch.float and dp["frames"].shape == expected_dp["frames"].shape
+        assert torch.allclose(dp["frames"], expected_dp["frames"], atol=0 if float_frames else 1e-6)
+        assert torch.equal(dp["actions"], expected_dp["actions"])
@@ -1,6 +1,12 @@
+import numpy as np
 import pytest
 
 from vp_suite.measure import METRIC_CLASSES, LOSS_CLASSES
+from vp_suite.measure.metric_provider import PredictionMetricProvider
+from vp_suite.measure.aggregation import MetricAggregator
+from vp_suite.measure.pipeline import AsyncMetricPipeline
+from vp_suite.measure.image_wise import pixel_frame_values
+from vp_suite.measure.fvd.fvd import FVDStatistics, I3DFeatureCache, calculate_2_wasserstein_dist
 import torch
 
 
@@ -65,3 +71,137 @@ def test_measure_triangle_eq(measure_class):
     assert m_xz <= m_xy + m_yz
     assert m_xy <= m_xz + m_yz
     assert m_yz <= m_xy + m_xz
+
+
+@pytest.mark.parametrize("measure_class", measure_classes, ids=measure_names)
+def test_measure_per_sample_reduction(measure_class):
+    """ checks whether the per-sample values average to the batch value: mean(f(x, y, 'none')) == f(x, y) """
+    x, y, _, cpu = setup_tensors_cpu()
+    measure = measure_class(device=cpu)
+    per_sample = measure(x, y, reduction="none")
+    assert per_sample.shape == (x.shape[0],)
+    assert torch.abs(per_sample.mean() - measure(x, y)) < 1e-4
+
+
+frame_wise_metrics = [mn for (mn, mc) in METRIC_CLASSES.items() if mc.FRAME_WISE]
+@pytest.mark.parametrize("metric_name", frame_wise_metrics, ids=frame_wise_metrics)
+def test_metric_provider_all_frame_cnts(metric_name):
+    """ checks whether the per-horizon values obtained from frame-wise values match re-assessing each horizon """
+    x, y, _, cpu = setup_tensors_cpu()
+    provider = PredictionMetricProvider({"device": cpu, "metrics": [metric_name], "img_c": 3})
+    metric = provider.metrics[metric_name]
+    horizon_metrics = provider.get_metrics(x, y, all_frame_cnts=True)
+    assert len(horizon_metrics) == x.shape[1]
+    for t, frame_cnt_metrics in enumerate(horizon_metrics, start=1):
+        expected = metric.to_display(metric(x[:, :t], y[:, :t]).item())
+        assert list(frame_cnt_metrics.values())[0] == pytest.approx(expected, rel=1e-4, abs=1e-4)
+
+
+def test_metric_aggregator():
+    """ checks whether aggregating (and merging) batches of per-sample values yields the statistics of all values """
+    values = np.random.default_rng(0).normal(loc=3.0, scale=2.0, size=(50, 4))  # [n, t]
+    aggregator, other_aggregator = MetricAggregator(confidence=0.95), MetricAggregator(confidence=0.95)
+    for i in range(0, len(values), 7):
+        batch = values[i:i+7]
+        # the 'seq' metric is only available for longer horizons (like FVD)
+        batch_metrics = [{"frame": batch[:, f].tolist(), **({"seq": batch[:, f].tolist()} if f > 1 else {})}
+                         for f in range(values.shape[1])]
+        (aggregator if i < 25 else other_aggregator).update(batch_metrics)
+    aggregator.merge(other_aggregator)
+    results = aggregator.result()
+    assert aggregator.num_samples == len(values)
+    assert len(results) == values.shape[1]
+    for f, frame_cnt_results in enumerate(results):
+        assert frame_cnt_results["frame"] == pytest.approx(values[:, f].mean())
+        assert frame_cnt_results["frame std"] == pytest.approx(values[:, f].std(ddof=1))
+        assert frame_cnt_results["frame ci95"] == pytest.approx(1.96 * values[:, f].std(ddof=1) / len(values) ** 0.5,
+                                                               rel=1e-3)
+        assert ("seq" in frame_cnt_results) == (f > 1)
+
+
+def test_fvd_statistics():
+    """ checks whether the FVD from accumulated (and merged) feature statistics equals the FVD over all features """
+    pred_features = torch.randn(30, 2, 8) * 2 + 1  # [b, n_chunks, n_feat]
+    target_features = torch.randn(30, 2, 8)
+    stats, other_stats = FVDStatistics(), FVDStatistics()
+    stats.update(0, pred_features[:11], target_features[:11])
+    other_stats.update(0, pred_features[11:], target_features[11:])
+    stats.merge(other_stats)
+    expected = sum(calculate_2_wasserstein_dist(pred_features[:, i], target_features[:, i]) for i in range(2)) / 2
+    assert stats.result()[0] == pytest.approx(expected.item(), rel=1e-4)
+
+
+def test_i3d_feature_cache(tmp_path):
+    """ checks whether cached features are found for equal sequences only and survive saving and re-loading """
+    x, y, _, _ = setup_tensors_cpu()
+    cache = I3DFeatureCache(tmp_path / "cache.pt")
+    keys = cache.keys(x)
+    assert keys == cache.keys(x.clone()) and len(set(keys)) == x.shape[0]
+    assert not set(keys) & set(cache.keys(y)) and not set(keys) & set(cache.keys(x[:, :5]))
+    for key in keys:
+        cache.put(key, torch.randn(1, 400))
+    cache.save()
+    loaded_cache = I3DFeatureCache(tmp_path / "cache.pt")
+    assert len(loaded_cache) == len(keys)
+    assert all(torch.equal(loaded_cache.get(key), cache.get(key)) for key in keys)
+    assert loaded_cache.get(cache.keys(y)[0]) is None
+
+
+def test_pixel_frame_values():
+    """ checks whether the fused calculation of pixel-wise measures matches their element-wise reference definitions """
+    x, y, _, cpu = setup_tensors_cpu()
+    references = {
+        "mse": torch.nn.functional.mse_loss(x, y, reduction="none").sum(dim=(2, 3, 4)),
+        "l1": torch.nn.functional.l1_loss(x, y, reduction="none").sum(dim=(2, 3, 4)),
+        "smooth_l1": torch.nn.functional.smooth_l1_loss(x * 4, y, reduction="none").sum(dim=(2, 3, 4)),
+        "psnr": 10 * torch.log10(torch.nn.functional.mse_loss(x, y, reduction="none").mean(dim=(2, 3, 4))),
+    }
+    measures = {key: LOSS_CLASSES[key](device=cpu) for key in references.keys()}
+    values = pixel_frame_values(x, y, {k: m for k, m in measures.items() if k != "smooth_l1"})
+    values["smooth_l1"] = measures["smooth_l1"].frame_values(x * 4, y)
+    for key, reference in references.items():
+        assert values[key].shape == (x.shape[0], x.shape[1])
+        assert torch.allclose(values[key], reference, rtol=1e-4), key
+
+
+def test_measure_shared_instances():
+    """ checks whether shared measure instances are re-used per device and still provide gradients w.r.t. inputs """
+    x, y, _, cpu = setup_tensors_cpu()
+    measure = LOSS_CLASSES["ssim"].get_shared(device=cpu)
+    assert measure is LOSS_CLASSES["ssim"].get_shared(device=cpu)
+    assert not measure.training and not any(p.requires_grad for p in measure.parameters())
+    x.requires_grad_(True)
+    measure(x, y).backward()
+    assert x.grad is not None
+
+
+@pytest.mark.parametrize("measure_name", ["lpips", "ssim"], ids=["lpips", "ssim"])
+def test_measure_target_features(measure_name):
+    """ checks whether assessing with pre-computed target features yields the same values as assessing directly """
+    x, y, z, cpu = setup_tensors_cpu()
+    measure = METRIC_CLASSES[measure_name](device=cpu)
+    target_features = measure.extract_target_features(y)
+    for pred in [x, z]:
+        expected = measure.frame_values(pred, y)
+        assert torch.allclose(measure.frame_values(pred, y, target_features=target_features), expected, atol=1e-5)
+
+
+def test_async_metric_pipeline():
+    """ checks whether asynchronously computed metrics aggregate to the same results as synchronously computed ones """
+    _, _, _, cpu = setup_tensors_cpu()
+    provider = PredictionMetricProvider({"device": cpu, "metrics": ["mse", "psnr", "ssim"], "img_c": 3})
+    batches = [(torch.rand(2, 6, 3, 32, 32), torch.rand(2, 6, 3, 32, 32), torch.rand(2, 6, 3, 32, 32))
+               for _ in range(7)]  # (target, pred of model 1, pred of model 2)
+    sync_aggregators = [MetricAggregator(), MetricAggregator()]
+    for target, *preds in batches:
+        for aggregator, pred in zip(sync_aggregators, preds):
+            aggregator.update(provider.get_metrics(pred, target, all_frame_cnts=True, reduction="none"))
+    async_aggregators = [MetricAggregator(), MetricAggregator()]
+    pipeline = AsyncMetricPipeline(provider, num_workers=3, queue_size=2)
+    for target, *preds in batches:
+        pipeline.submit([(aggregator, pred, target) for aggregator, pred in zip(async_aggregators, preds)])
+    pipeline.finish()
+    for sync_aggregator, async_aggregator in zip(sync_aggregators, async_aggregators):
+        assert async_aggregator.num_samples == sync_aggregator.num_samples
+        for async_results, sync_results in zip(async_aggregator.result(), sync_aggregator.result()):
+            assert async_results == pytest.approx(sync_results)
@@ -58,3 +58,273 @@ def test_models_with_actions(model_key):
 
     assert pred_1.shape == (b, c, h, w)
     assert pred_5.shape == (b, 5, c, h, w)
+
+
+@pytest.mark.parametrize('model_key', ["copy", "phy", "predrnn-pp"])
+def test_models_eval_iter_batch_invariance(model_key):
+    """ checks that validation results don't depend on the batch size (losses are averaged per sample) """
+    from vp_suite.measure.loss_provider import PredictionLossProvider
+    model_class = MODEL_CLASSES[model_key]
+    model_kwargs = {
+        "action_size": ACTION_SIZE,
+        "img_shape": IMG_SHAPE,
+        "temporal_dim": TEMPORAL_DIM,
+        "action_conditional": False,
+        "tensor_value_range": [0.0, 1.0]
+    }
+    model: VPModel = model_class(DEVICE, **model_kwargs).to(DEVICE)
+    config = {"device": DEVICE, "context_frames": 3, "pred_frames": p, "val_rec_criterion": "mse",
+              "losses_and_scales": {"mse": 1.0, "l1": 1.0, "psnr": 1.0}, "img_c": c}
+    loss_provider = PredictionLossProvider(config)
+    n = 5
+    frames = torch.rand(n, 3 + p, c, h, w)
+    actions = torch.zeros(n, 3 + p, ACTION_SIZE)
+    loader_b1 = [{"frames": frames[i:i+1], "actions": actions[i:i+1]} for i in range(n)]
+    loader_b3 = [{"frames": frames[i:i+3], "actions": actions[i:i+3]} for i in range(0, n, 3)]  # uneven last batch
+    losses_b1, indicator_b1 = model.eval_iter(config, loader_b1, loss_provider)
+    losses_b3, indicator_b3 = model.eval_iter(config, loader_b3, loss_provider)
+    assert losses_b1.keys() == losses_b3.keys() == {"mse", "l1", "psnr"}
+    for k in losses_b1.keys():
+        assert losses_b1[k] == pytest.approx(losses_b3[k], rel=1e-4)
+    assert indicator_b1.item() == pytest.approx(indicator_b3.item(), rel=1e-4)
+    assert model.training
+
+
+def test_models_eval_iter_fvd_batch_invariance():
+    """ checks that the validation FVD (not defined per sample) is calculated over all data, not averaged over batches """
+    from vp_suite.measure.loss_provider import PredictionLossProvider
+    model: VPModel = MODEL_CLASSES["copy"](DEVICE, action_size=ACTION_SIZE, img_shape=IMG_SHAPE,
+                                           tensor_value_range=[0.0, 1.0]).to(DEVICE)
+    pred_frames = 10
+    config = {"device": DEVICE, "context_frames": 3, "pred_frames": pred_frames, "val_rec_criterion": "mse",
+              "losses_and_scales": {"mse": 1.0, "fvd": 1.0}, "img_c": c}
+    loss_provider = PredictionLossProvider(config)
+    n = 5
+    frames = torch.rand(n, 3 + pred_frames, c, h, w)
+    actions = torch.zeros(n, 3 + pred_frames, ACTION_SIZE)
+    loader_b2 = [{"frames": frames[i:i+2], "actions": actions[i:i+2]} for i in range(0, n, 2)]
+    loader_b5 = [{"frames": frames, "actions": actions}]
+    losses_b2, _ = model.eval_iter(config, loader_b2, loss_provider)
+    losses_b5, _ = model.eval_iter(config, loader_b5, loss_provider)
+    assert losses_b2.keys() == losses_b5.keys() == {"mse", "fvd"}
+    assert losses_b2["fvd"] == pytest.approx(losses_b5["fvd"], rel=1e-3)
+
+
+@pytest.mark.parametrize('model_key', ["lstm", "phy", "st-phy", "predrnn-pp"])
+def test_models_mixed_precision(model_key):
+    """ checks that training and validation iterations run under bfloat16 autocast and yield float32 results """
+    from vp_suite.measure.loss_provider import PredictionLossProvider
+    model_class = MODEL_CLASSES[model_key]
+    model_kwargs = {
+        "action_size": ACTION_SIZE,
+        "img_shape": IMG_SHAPE,
+        "temporal_dim": TEMPORAL_DIM,
+        "action_conditional": False,
+        "tensor_value_range": [0.0, 1.0]
+    }
+    model: VPModel = model_class("cpu", **model_kwargs)
+    config = {"device": "cpu", "context_frames": 3, "pred_frames": p, "val_rec_criterion": "mse",
+              "losses_and_scales": {"mse": 1.0}, "img_c": c, "precision": "bf16"}
+    loss_provider = PredictionLossProvider(config)
+    loader = [{"frames": torch.rand(b, 3 + p, c, h, w), "actions": torch.zeros(b, 3 + p, ACTION_SIZE)}]
+    optimizer = torch.optim.Adam(params=model.parameters(), lr=1e-4)
+    model.train_iter(config, loader, optimizer, loss_provider, epoch=0)
+    assert all(param.dtype == torch.float32 and torch.isfinite(param).all() for param in model.parameters())
+    losses, indicator_loss = model.eval_iter(config, loader, loss_provider)
+    assert indicator_loss.dtype == torch.float32 and torch.isfinite(indicator_loss)
+    with pytest.raises(ValueError):
+        model.train_iter({**config, "precision": "fp16"}, loader, optimizer, loss_provider, epoch=0)
+
+
+@pytest.mark.parametrize('model_key', MODEL_CLASSES.keys(), ids=[v.NAME for v in MODEL_CLASSES.values()])
+def test_models_compiled(model_key):
+    """ checks that models with compiled recurrent cells predict the same as in eager mode and remain picklable """
+    import io
+    from vp_suite.utils.compilation import compile_model
+    model_class = MODEL_CLASSES[model_key]
+    model_kwargs = {
+        "action_size": ACTION_SIZE,
+        "img_shape": IMG_SHAPE,
+        "temporal_dim": TEMPORAL_DIM,
+        "action_conditional": False,
+        "tensor_value_range": [0.0, 1.0]
+    }
+    model: VPModel = model_class(DEVICE, **model_kwargs).to(DEVICE)
+    model.eval()
+    t = p+3 if model_class.NEEDS_COMPLETE_INPUT else 3
+    x = torch.randn(b, t, c, h, w, device=DEVICE)
+    with torch.no_grad():
+        eager_pred, _ = model(x, pred_frames=p)
+        compile_model(model, "trace")
+        compiled_pred, _ = model(x, pred_frames=p)
+        compiled_pred_cached, _ = model(x, pred_frames=p)
+    assert torch.allclose(compiled_pred, eager_pred, rtol=1e-4, atol=1e-5)
+    assert torch.equal(compiled_pred_cached, compiled_pred)
+    buffer = io.BytesIO()
+    torch.save(model, buffer)
+    buffer.seek(0)
+    with torch.no_grad():
+        loaded_pred, _ = torch.load(buffer)(x, pred_frames=p)
+    assert torch.allclose(loaded_pred, eager_pred, rtol=1e-4, atol=1e-5)
+
+
+@pytest.mark.parametrize('model_key', MODEL_CLASSES.keys(), ids=[v.NAME for v in MODEL_CLASSES.values()])
+def test_models_onnx_export(model_key, tmp_path):
+    """ checks that models exported to ONNX predict the same as in PyTorch when run with onnxruntime """
+    pytest.importorskip("onnxruntime")
+    from vp_suite.models.onnx_model import ONNXModel, export_onnx
+    model_class = MODEL_CLASSES[model_key]
+    model_kwargs = {
+        "action_size": ACTION_SIZE,
+        "img_shape": IMG_SHAPE,
+        "temporal_dim": TEMPORAL_DIM,
+        "action_conditional": model_class.CAN_HANDLE_ACTIONS,
+        "tensor_value_range": [0.0, 1.0]
+    }
+    model: VPModel = model_class("cpu", **model_kwargs)
+    model.eval()
+    context_frames = 3
+    onnx_fp = tmp_path / "model.onnx"
+    export_onnx(model, onnx_fp, context_frames, p)
+    onnx_model = ONNXModel("cpu", onnx_fp)
+    assert onnx_model.exported_frames == (context_frames, p)
+
+    t_x = context_frames + p if model_class.NEEDS_COMPLETE_INPUT else context_frames
+    x = torch.rand(b + 1, t_x, c, h, w)  # batch size differs from the export batch size
+    a = torch.rand(b + 1, context_frames + p - 1, ACTION_SIZE)
+    with torch.no_grad():
+        torch_pred, _ = model(x, pred_frames=p, actions=a)
+    onnx_pred, _ = onnx_model(x, pred_frames=p, actions=a)
+    assert onnx_pred.shape == torch_pred.shape
+    assert torch.allclose(onnx_pred, torch_pred, rtol=1e-3, atol=1e-4)
+    with pytest.raises(ValueError):
+        onnx_model(x, pred_frames=p + 1, actions=a)
+
+
+@pytest.mark.parametrize('model_key', MODEL_CLASSES.keys(), ids=[v.NAME for v in MODEL_CLASSES.values()])
+def test_models_quantization(model_key):
+    """ checks that int8-quantized models predict valid frames and can be saved and loaded """
+    if "fbgemm" not in torch.backends.quantized.supported_engines:
+        pytest.skip("quantization backend 'fbgemm' not available")
+    import io
+    from vp_suite.utils.quantization import quantize_model
+    model_class = MODEL_CLASSES[model_key]
+    model_kwargs = {
+        "action_size": ACTION_SIZE,
+        "img_shape": IMG_SHAPE,
+        "temporal_dim": TEMPORAL_DIM,
+        "action_conditional": model_class.CAN_HANDLE_ACTIONS,
+        "tensor_value_range": [0.0, 1.0]
+    }
+    model: VPModel = model_class("cpu", **model_kwargs)
+    context_frames = 3
+    config = {"device": "cpu", "context_frames": context_frames, "pred_frames": p}
+    calibration_data = [{"frames": torch.rand(b, context_frames + p, c, h, w),
+                         "actions": torch.rand(b, context_frames + p - 1, ACTION_SIZE)} for _ in range(2)]
+    quantized = quantize_model(model, calibration_data, config)
+    assert not quantized.TRAINABLE
+
+    t_x = context_frames + p if model_class.NEEDS_COMPLETE_INPUT else context_frames
+    x = torch.rand(b, t_x, c, h, w)
+    a = torch.rand(b, context_frames + p - 1, ACTION_SIZE)
+    with torch.no_grad():
+        float_pred, _ = model.eval()(x, pred_frames=p, actions=a)
+        quantized_pred, _ = quantized(x, pred_frames=p, actions=a)
+    assert quantized_pred.shape == float_pred.shape
+    assert quantized_pred.dtype == torch.float32 and torch.isfinite(quantized_pred).all()
+
+    buffer = io.BytesIO()
+    torch.save(quantized, buffer)
+    buffer.seek(0)
+    loaded = torch.load(buffer)
+    with torch.no_grad():
+        loaded_pred, _ = loaded(x, pred_frames=p, actions=a)
+    assert torch.equal(loaded_pred, quantized_pred)
+
+
+@pytest.mark.parametrize('model_key', MODEL_CLASSES.keys(), ids=[v.NAME for v in MODEL_CLASSES.values()])
+def test_models_channels_last(model_key):
+    """ checks that models predict the same in channels_last format and that their recurrent cells stay in it """
+    from copy import deepcopy
+    from vp_suite.utils.compilation import STEP_MODULE_CLASSES
+    from vp_suite.utils.memory_format import is_channels_last, model_to_channels_last, to_channels_last
+    model_class = MODEL_CLASSES[model_key]
+    model_kwargs = {
+        "action_size": ACTION_SIZE,
+        "img_shape": IMG_SHAPE,
+        "temporal_dim": TEMPORAL_DIM,
+        "action_conditional": model_class.CAN_HANDLE_ACTIONS,
+        "tensor_value_range": [0.0, 1.0]
+    }
+    model: VPModel = model_class(DEVICE, **model_kwargs).to(DEVICE)
+    model.eval()
+    cl_model = model_to_channels_last(deepcopy(model))
+
+    cell_outputs = []
+    for module in cl_model.modules():
+        if isinstance(module, STEP_MODULE_CLASSES):
+            module.register_forward_hook(lambda m, inputs, output: cell_outputs.append(output))
+
+    t = p + 3 if model_class.NEEDS_COMPLETE_INPUT else 3
+    x = torch.rand(b, t, c, h, w, device=DEVICE)
+    a = torch.rand(b, t + p - 1, ACTION_SIZE, device=DEVICE)
+    with torch.no_grad():
+        pred, _ = model(x, pred_frames=p, actions=a)
+        cl_pred, _ = cl_model(to_channels_last(x), pred_frames=p, actions=a)
+    assert cl_pred.shape == pred.shape
+    assert torch.allclose(cl_pred, pred, rtol=1e-4, atol=1e-5)
+    for output in cell_outputs:
+        output_tensors = output if isinstance(output, (tuple, list)) else [output]
+        for output_tensor in output_tensors:
+            if isinstance(output_tensor, torch.Tensor) and output_tensor.dim() in (4, 5):
+                assert is_channels_last(output_tensor)
+
+
+@pytest.mark.parametrize('model_key', MODEL_CLASSES.keys(), ids=[v.NAME for v in MODEL_CLASSES.values()])
+def test_models_grad_accumulation(model_key):
+    """ checks that accumulating the weighted gradients of micro-batches yields the gradients of the whole batch """
+    from copy import deepcopy
+    model_class = MODEL_CLASSES[model_key]
+    if not model_class.TRAINABLE:
+        pytest.skip(f"model '{model_class.NAME}' is not trainable")
+    model_kwargs = {
+        "action_size": ACTION_SIZE,
+        "img_shape": IMG_SHAPE,
+        "temporal_dim": TEMPORAL_DIM,
+        "action_conditional": model_class.CAN_HANDLE_ACTIONS,
+        "tensor_value_range": [0.0, 1.0]
+    }
+    model: VPModel = model_class(DEVICE, **model_kwargs).to(DEVICE)
+    model.eval()  # batch-dependent layers (batch normalization) are the documented exception
+    accum_model = deepcopy(model)
+
+    t = p + 3 if model_class.NEEDS_COMPLETE_INPUT else 3
+    data = {"frames": torch.rand(3, t, c, h, w, device=DEVICE),
+            "actions": torch.rand(3, t + p - 1, ACTION_SIZE, device=DEVICE),
+            "origin": "test"}
+    targets = torch.rand(3, p, c, h, w, device=DEVICE)
+
+    def loss_fn(m, micro_data, micro_targets):
+        pred, _ = m(micro_data["frames"], pred_frames=p, actions=micro_data["actions"])
+        return torch.nn.functional.mse_loss(pred, micro_targets)
+
+    config = {"device": DEVICE, "grad_accum_steps": 1}
+    [(full_data, weight)] = model.split_batch(data, config)
+    model.accumulate_gradients(loss_fn(model, full_data, targets), weight)
+
+    config["grad_accum_steps"] = 2
+    micro_batches = accum_model.split_batch(data, config)
+    assert [micro_data["frames"].shape[0] for micro_data, _ in micro_batches] == [2, 1]
+    assert sum(weight for _, weight in micro_batches) == pytest.approx(1.0)
+    start = 0
+    for micro_data, weight in micro_batches:
+        micro_b = micro_data["frames"].shape[0]
+        assert micro_data["origin"] == "test"
+        accum_model.accumulate_gradients(loss_fn(accum_model, micro_data, targets[start:start + micro_b]), weight)
+        start += micro_b
+
+    for param, accum_param in zip(model.parameters(), accum_model.parameters()):
+        if param.grad is None:
+            assert accum_param.grad is None
+        else:
+            assert torch.allclose(param.grad, accum_param.grad, rtol=1e-4, atol=1e-6)
@@ -6,8 +6,18 @@ The testing of all models and datasets is done in test_models.py and test_datase
 import tempfile
 import json
 import pytest
+import torch
+import torch.nn as nn
 from vp_suite import VPSuite
-from vp_suite.defaults import SETTINGS
+from vp_suite.defaults import SETTINGS, DEFAULT_RUN_CONFIG
+from vp_suite.measure.aggregation import MetricAggregator
+from vp_suite.models.copy_last_frame import CopyLastFrame
+from vp_suite.utils.evaluation import evaluate_batches, evaluate_models_in_processes, evaluate_shards_in_processes, \
+    get_shard_indices
+from vp_suite.utils.utils import get_loader
+from vp_suite.utils.shards import export_splits_to_shards
+from vp_suite.utils.distributed import get_split_indices
+from vp_suite.utils.checkpoint import AsyncCheckpointWriter, load_checkpoint, training_checkpoint
 
 import torchvision.transforms as TF
 
@@ -64,3 +74,155 @@ def test_brief_testing_multi_dataset_multi_model():
     suite.create_model(model_id=model1)
     suite.create_model(model_id=model2, temporal_dim=3)
     suite.test(brief_test=True, context_frames=4, pred_frames=6, no_wandb=True)
+
+
+def test_training_and_testing_with_loader_options(kitti_data_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(SETTINGS, "OUT_PATH", tmp_path / "output")
+    SETTINGS.OUT_PATH.mkdir()
+    suite = VPSuite(device="cpu")
+    suite.load_dataset(dataset_id="KITTI", data_dir=kitti_data_dir, img_size=(64, 64), window_stride=1)
+    suite.load_dataset(dataset_id="KITTI", split="test", data_dir=kitti_data_dir, img_size=(64, 64), window_stride=1)
+    suite.create_model(model_id=model1)
+    loader_options = {"num_workers": 2, "pin_memory": False, "persistent_workers": True, "prefetch_factor": 1}
+    suite.train(epochs=2, batch_size=1, val_batch_size=2, context_frames=4, pred_frames=6, no_wandb=True,
+                no_vis=True, out_dir=str(tmp_path / "train"), **loader_options)
+    suite.test(brief_test=True, context_frames=4, pred_frames=6, no_wandb=True, no_vis=True, metrics=["mse", "psnr"],
+               test_batch_size=2, metric_ci=0.95, metric_workers=2, metric_queue_size=1, **loader_options)
+
+
+def test_distributed_training(kitti_data_dir, tmp_path):
+    """ checks whether training data-parallel in multiple processes yields a saved and loaded trained model """
+    assert [get_split_indices(5, 2, rank) for rank in range(2)] == [[0, 1, 2], [3, 4]]
+    suite = VPSuite(device="cpu")
+    suite.load_dataset(dataset_id="KITTI", data_dir=kitti_data_dir, img_size=(64, 64), window_stride=1)
+    suite.create_model(model_id=model1)
+    untrained_model = suite.models[0]
+    best_val_loss = suite.train(epochs=2, batch_size=2, context_frames=4, pred_frames=6, no_wandb=True, no_vis=True,
+                                num_workers=0, train_processes=2, grad_accum_steps=2, out_dir=str(tmp_path / "train"))
+    assert best_val_loss < float("inf")
+    assert (tmp_path / "train" / "best_model.pth").exists() and (tmp_path / "train" / "final_model.pth").exists()
+    assert len(suite.models) == 1 and suite.models[0] is not untrained_model
+    assert any(not torch.equal(p, p_untrained)
+               for p, p_untrained in zip(suite.models[0].parameters(), untrained_model.parameters()))
+
+
+def test_training_from_shards(kitti_data_dir, tmp_path):
+    """ checks whether a dataset exported to shards can be loaded and trained on like the original dataset """
+    suite = VPSuite(device="cpu")
+    suite.load_dataset(dataset_id="KITTI", data_dir=kitti_data_dir, img_size=(64, 64), window_stride=1,
+                       context_frames=4, pred_frames=6, seq_step=1)
+    # frames are resized on loading, so they are exported as floats to keep them exact
+    export_splits_to_shards(suite.datasets[0], tmp_path / "shards", samples_per_shard=4, float_frames=True)
+    suite.load_dataset(dataset_id="KITTI", shards_dir=str(tmp_path / "shards"))
+    assert suite.datasets[1].img_shape == suite.datasets[0].img_shape
+    suite.create_model(model_id=model1)
+    run_kwargs = {"context_frames": 4, "pred_frames": 6, "no_wandb": True, "num_workers": 0}
+
+    # validating on the shards gives the same results as validating on the original data
+    source_val_loss = suite.train(dataset_idx=0, no_train=True, no_vis=True, out_dir=str(tmp_path / "source"), **run_kwargs)
+    shard_val_loss = suite.train(dataset_idx=1, no_train=True, no_vis=True, out_dir=str(tmp_path / "shards_val"), **run_kwargs)
+    assert shard_val_loss == pytest.approx(source_val_loss)
+
+    # training on the shards (shuffled, with visualizations skipped as they need random access)
+    best_val_loss = suite.train(dataset_idx=1, epochs=2, batch_size=2, vis_every=1, out_dir=str(tmp_path / "train"), **run_kwargs)
+    assert best_val_loss < float("inf") and (tmp_path / "train" / "final_model.pth").exists()
+    with pytest.raises(ValueError):  # the shards hold 10 frames per sequence
+        suite.train(dataset_idx=1, context_frames=4, pred_frames=7, no_wandb=True)
+
+
+@pytest.mark.parametrize('data_kwargs', [{"num_workers": 0}, {"num_workers": 2, "stream_train_data": True}],
+                         ids=["map-style", "streamed"])
+def test_resuming_interrupted_training(kitti_data_dir, tmp_path, data_kwargs):
+    """ checks whether resuming a training run that has been interrupted mid-epoch yields the uninterrupted results """
+    suites = []
+    for _ in range(2):
+        suite = VPSuite(device="cpu")
+        suite.load_dataset(dataset_id="KITTI", data_dir=kitti_data_dir, img_size=(64, 64), window_stride=1)
+        suite.create_model(model_id=model1)
+        suites.append(suite)
+    suites[1].models[0].load_state_dict(suites[0].models[0].state_dict())
+    run_kwargs = {"epochs": 2, "batch_size": 1, "context_frames": 4, "pred_frames": 6, "no_wandb": True,
+                  "no_vis": True, "checkpoint_every": 100, **data_kwargs}
+    best_val_loss = suites[0].train(out_dir=str(tmp_path / "uninterrupted"), **run_kwargs)
+
+    # time limit exceeded after the first training step -> resumable checkpoint saved
+    suites[1].train(out_dir=str(tmp_path / "interrupted"), max_training_hours=0, **run_kwargs)
+    checkpoint = load_checkpoint(tmp_path / "interrupted" / "last_checkpoint.pth")
+    assert checkpoint["epoch"] == 0 and checkpoint["step"] == 1
+    resumed_best_val_loss = suites[1].train(resume_from=str(tmp_path / "interrupted"), **run_kwargs)
+
+    assert resumed_best_val_loss == pytest.approx(best_val_loss)
+    for p, resumed_p in zip(suites[0].models[0].parameters(), suites[1].models[0].parameters()):
+        assert torch.allclose(p, resumed_p)
+
+
+def test_evaluating_models_in_processes(kitti_data_dir):
+    """ checks whether evaluating the models in worker processes aggregates to the same results as in-process """
+    suite = VPSuite(device="cpu")
+    suite.load_dataset(dataset_id="KITTI", split="test", data_dir=kitti_data_dir, img_size=(64, 64))
+    suite.create_model(model_id=model1)
+    config = {**DEFAULT_RUN_CONFIG, **suite.test_sets[0].config, "device": "cpu", "context_frames": 4,
+              "pred_frames": 6, "metrics": ["mse", "psnr", "lpips", "ssim"], "metric_queue_size": 2,
+              "test_threads": 2}  # the workers get the LPIPS/SSIM target features from the calling process
+    batches = [{"frames": torch.rand(2, 10, 3, 64, 64), "actions": torch.zeros(2, 9, 0), "origin": ["", ""]}
+               for _ in range(3)]
+    results = []
+    for evaluate in [evaluate_batches, evaluate_models_in_processes]:
+        model_info_list = [(model, nn.Identity(), nn.Identity(), MetricAggregator())
+                           for model in [suite.models[0], CopyLastFrame()]]
+        evaluate(batches, model_info_list, config)
+        results.append([metric_aggregator.result() for (_, _, _, metric_aggregator) in model_info_list])
+    for sequential_results, parallel_results in zip(*results):
+        for sequential_horizon_results, parallel_horizon_results in zip(sequential_results, parallel_results):
+            assert parallel_horizon_results == pytest.approx(sequential_horizon_results)
+
+
+def test_evaluating_shards_in_processes(kitti_data_dir):
+    """ checks whether evaluating test set shards in worker processes aggregates to the same results as in-process """
+    assert get_shard_indices(11, 2, 3) == [range(0, 4), range(4, 8), range(8, 11)]
+    assert get_shard_indices(3, 2, 4) == [range(0, 2), range(2, 3)]
+    suite = VPSuite(device="cpu")
+    suite.load_dataset(dataset_id="KITTI", split="test", data_dir=kitti_data_dir, img_size=(64, 64), window_stride=1)
+    suite.test_sets[0].set_seq_len(4, 6, 1)
+    test_data = suite.test_sets[0].test_data
+    config = {**DEFAULT_RUN_CONFIG, **suite.test_sets[0].config, "device": "cpu", "context_frames": 4,
+              "pred_frames": 6, "metrics": ["mse", "psnr"], "test_batch_size": 2, "test_processes": 2,
+              "test_threads": 2, "num_workers": 0}
+    sequential_aggregator, parallel_aggregator = MetricAggregator(), MetricAggregator()
+    evaluate_batches(get_loader(test_data, 2, config), [(CopyLastFrame(), nn.Identity(), nn.Identity(),
+                                                         sequential_aggregator)], config)
+    evaluate_shards_in_processes(test_data, [(CopyLastFrame(), nn.Identity(), nn.Identity(), parallel_aggregator)],
+                                 config)
+    assert parallel_aggregator.num_samples == sequential_aggregator.num_samples == len(test_data)
+    for sequential_results, parallel_results in zip(sequential_aggregator.result(), parallel_aggregator.result()):
+        assert parallel_results == pytest.approx(sequential_results)
+
+
+def test_async_checkpoint_writer(tmp_path):
+    """ checks that checkpoints are CPU snapshots that get written completely and atomically in the background """
+    model = nn.Sequential(nn.Linear(4, 4), nn.BatchNorm1d(4))
+    model.step_counter = 1
+    optimizer = torch.optim.Adam(model.parameters())
+    model(torch.rand(8, 4)).sum().backward()
+    optimizer.step()
+    checkpoint = training_checkpoint(model, optimizer, epoch=3)
+    expected_state = {k: v.clone() for k, v in model.state_dict().items()}
+
+    writer = AsyncCheckpointWriter()
+    writer.save(checkpoint, tmp_path / "ckpt.pth")
+    with torch.no_grad():  # modifications after the snapshot must not affect the written checkpoint
+        for p in model.parameters():
+            p.add_(1.)
+    model.step_counter = 2
+    writer.save(training_checkpoint(model), tmp_path / "other_ckpt.pth")
+    writer.close()
+
+    assert sorted(f.name for f in tmp_path.iterdir()) == ["ckpt.pth", "other_ckpt.pth"]  # no temporary files left
+    loaded = load_checkpoint(tmp_path / "ckpt.pth")
+    assert loaded["epoch"] == 3 and loaded["model"].step_counter == 1
+    for k, v in loaded["model"].state_dict().items():
+        assert torch.equal(v, expected_state[k])
+    assert loaded["optimizer_state_dict"]["state"][0]["step"] == 1
+    assert load_checkpoint(tmp_path / "other_ckpt.pth")["model"].step_counter == 2
+    torch.save(model, tmp_path / "model.pth")  # model-only checkpoint files are loaded as well
+    assert load_checkpoint(tmp_path / "model.pth")["model"].step_counter == 2
@@ -1,7 +1,7 @@
 r"""
 This package contains base classes for the other packages of this project.
 """
-from .base_dataset import VPData, VPSubset, VPDataset
+from .base_dataset import VPData, VPSubset, VPDataset, VPVideoDataset
 from .base_measure import VPMeasure
 from .base_model import VPModel
 from .base_model_block import VPModelBlock
\ No newline at end of file
@@ -1,5 +1,6 @@
 import sys
-from .typing import TypedDict, Union, Sequence, List
+from .typing import TypedDict, Union, Sequence, List, Optional
+from collections import deque
 from copy import deepcopy
 from pathlib import Path
 import random
@@ -37,8 +38,16 @@ class VPSubset(Subset):
     A minimal wrapper around :class:`~Subset` that allows to directly access the underlying dataset's attributes.
     """
     def __getattr__(self, item):
+        if item == "dataset":  # not set yet (e.g. while unpickling) -> avoid infinite recursion
+            raise AttributeError(item)
         return getattr(self.dataset, item)
 
+    def __getitems__(self, indices: List[int]) -> list:
+        dataset_indices = [self.indices[i] for i in indices]
+        if hasattr(self.dataset, "__getitems__"):
+            return self.dataset.__getitems__(dataset_indices)
+        return [self.dataset[i] for i in dataset_indices]
+
 
 class VPDataset(Dataset):
     r"""
@@ -374,6 +383,173 @@ class VPDataset(Dataset):
         return D_test
 
 
+class VPVideoDataset(VPDataset):
+    r"""
+    The base class for datasets whose data points are windows cut out of longer videos/frame sequences
+    (e.g. Human 3.6M, Caltech Pedestrian or KITTI raw).
+    Derived classes provide the available sequences in :attr:`self.sequences` as `(sequence_path, frame_count)`
+    tuples and implement :meth:`self._read_frames()`.
+
+    The start indices of the windows are placed :attr:`self.window_stride` frames apart, so that consecutive
+    windows of a video may overlap. When multiple windows are requested at once via :meth:`self.__getitems__()`
+    (as done by the data loaders obtained from :func:`~vp_suite.utils.utils.get_loader()` for each batch),
+    overlapping windows of the same video are decoded only once and then sliced for each window.
+    """
+    NON_CONFIG_VARS = VPDataset.NON_CONFIG_VARS + ["sequences", "sequences_with_frame_index"]
+
+    SKIP_FIRST_N: int = 0  #: The first N frames of each sequence are not used for the data points.
+
+    window_stride: int = None  #: The offset (in frames) between the start frames of consecutive windows of a sequence. Defaults to `seq_len + seq_step - 1`, which yields non-overlapping windows. Smaller values yield more (overlapping) data points per decoded sequence.
+
+    def __init__(self, split: str, **dataset_kwargs):
+        r"""
+        Initializes the video dataset by setting the window stride and then calling the base class initialization.
+
+        Args:
+            split (str): The dataset's split identifier (i.e. whether it's a training/validation/test dataset)
+            **dataset_kwargs (Any): Optional dataset arguments for image transformation, value_range, splitting etc.
+        """
+        super(VPVideoDataset, self).__init__(split, **dataset_kwargs)
+        self.NON_CONFIG_VARS = self.NON_CONFIG_VARS.copy()
+        set_from_kwarg(self, dataset_kwargs, "window_stride")
+        if self.window_stride is not None and (not isinstance(self.window_stride, int) or self.window_stride < 1):
+            raise ValueError(f"parameter 'window_stride' needs to be a positive integer (given: {self.window_stride})")
+        self.sequences = []  #: The available sequences as `(sequence_path, frame_count)` tuples.
+        self.sequences_with_frame_index = []  # mock value, must not be used for iteration till sequence length is set
+
+    def _set_seq_len(self):
+        # Determine per sequence which frame indices are valid start indices. Each resulting index marks a datapoint.
+        self.sequences_with_frame_index = []
+        for sequence_path, frame_count in self.sequences:
+            for idx in self._window_start_indices(frame_count):
+                self.sequences_with_frame_index.append((sequence_path, idx))
+
+    def _window_start_indices(self, frame_count: int) -> range:
+        r"""
+        Args:
+            frame_count (int): The number of frames of a sequence.
+
+        Returns: The start indices of all windows that can be taken from a sequence of given length.
+        """
+        stride = self.window_stride or self.seq_len + self.seq_step - 1
+        return range(self.SKIP_FIRST_N, frame_count - self.seq_len + 1, stride)
+
+    def _read_frames(self, sequence_path, frame_indices: List[int]) -> np.ndarray:
+        r"""
+        Reads the specified frames of given sequence. Implemented by the derived dataset classes.
+
+        Args:
+            sequence_path (Any): The identifier of the sequence (e.g. a video filepath).
+            frame_indices (List[int]): The (sorted, unique) indices of the frames to read.
+
+        Returns: The read frames as a numpy array of shape [len(frame_indices), h, w, c].
+        """
+        raise NotImplementedError
+
+    def _iter_frames(self, sequence_path, start_idx: int, num_frames: int):
+        r"""
+        Reads the specified range of frames of given sequence in order, yielding one frame at a time.
+        Derived classes can override this to decode their sequences sequentially (without seeking);
+        By default, the frames are obtained chunk-wise from :meth:`self._read_frames()`.
+
+        Args:
+            sequence_path (Any): The identifier of the sequence (e.g. a video filepath).
+            start_idx (int): The index of the first frame to read.
+            num_frames (int): The number of frames to read.
+
+        Returns: A generator yielding the frames as numpy arrays of shape [h, w, c].
+        """
+        chunk_size = 64
+        for chunk_start in range(start_idx, start_idx + num_frames, chunk_size):
+            chunk_end = min(chunk_start + chunk_size, start_idx + num_frames)
+            yield from self._read_frames(sequence_path, list(range(chunk_start, chunk_end)))
+
+    def iter_sequence_windows(self, sequence_path, frame_count: int, start_indices: Optional[List[int]] = None):
+        r"""
+        Decodes the given sequence once from front to back and yields all its windows as datapoints
+        (in the order of their start indices). Used for streaming data (see :class:`~vp_suite.utils.streaming.VPVideoStream`).
+
+        Args:
+            sequence_path (Any): The identifier of the sequence (e.g. a video filepath).
+            frame_count (int): The number of frames of the sequence.
+            start_indices (Optional[List[int]]): If specified, only the windows starting at these indices are yielded (e.g. those of a subset).
+
+        Returns: A generator yielding the datapoints of all (or the specified) windows of the sequence.
+        """
+        if start_indices is None:
+            start_indices = list(self._window_start_indices(frame_count))
+        else:
+            start_indices = sorted(start_indices)
+        if len(start_indices) == 0:
+            return
+        first_idx, end_idx = start_indices[0], start_indices[-1] + self.seq_len
+        frame_buffer = deque(maxlen=self.seq_len)  # holds the last seq_len decoded frames
+        next_window = 0
+        for frame_idx, frame in enumerate(self._iter_frames(sequence_path, first_idx, end_idx - first_idx),
+                                          start=first_idx):
+            frame_buffer.append(frame)
+            if frame_idx == start_indices[next_window] + self.seq_len - 1:
+                frames = np.stack([frame_buffer[offset] for offset in self.frame_offsets], axis=0)  # [t, h, w, c]
+                yield self._make_datapoint(frames, sequence_path, start_indices[next_window])
+                next_window += 1
+                if next_window == len(start_indices):
+                    return
+
+    def _make_datapoint(self, frames: np.ndarray, sequence_path, start_idx: int) -> VPData:
+        r"""
+        Assembles a datapoint from the already-subsampled frames of a window.
+
+        Args:
+            frames (np.ndarray): The frames of the window, of shape [t, h, w, c].
+            sequence_path (Any): The identifier of the sequence the window has been taken from.
+            start_idx (int): The index of the window's first frame within the sequence.
+
+        Returns: The assembled datapoint.
+        """
+        vid = self.preprocess(frames)  # [t, c, h, w]
+        actions = torch.zeros((self.total_frames, 1))  # [t, a], actions should be disregarded in training logic
+        return {"frames": vid, "actions": actions, "origin": f"{sequence_path}, start frame: {start_idx}"}
+
+    def __getitem__(self, i) -> VPData:
+        return self.__getitems__([i])[0]
+
+    def __getitems__(self, indices: List[int]) -> List[VPData]:
+        r"""
+        Retrieves multiple datapoints at once. Windows from the same sequence whose frame ranges overlap or touch
+        are grouped, and the frames of each group are read only once.
+
+        Args:
+            indices (List[int]): The indices of the requested datapoints.
+
+        Returns: The requested datapoints, in the order of the given indices.
+        """
+        windows_per_sequence = dict()
+        for pos, i in enumerate(indices):
+            sequence_path, start_idx = self.sequences_with_frame_index[i]
+            windows_per_sequence.setdefault(sequence_path, []).append((start_idx, pos))
+
+        datapoints = [None] * len(indices)
+        for sequence_path, windows in windows_per_sequence.items():
+            windows.sort()
+            groups, group_end = [], -1
+            for start_idx, pos in windows:
+                if start_idx > group_end:
+                    groups.append([])
+                groups[-1].append((start_idx, pos))
+                group_end = max(group_end, start_idx + self.seq_len)
+            for group in groups:
+                frame_indices = sorted({start_idx + offset for start_idx, _ in group for offset in self.frame_offsets})
+                frames = self._read_frames(sequence_path, frame_indices)  # [n, h, w, c]
+                frame_positions = {frame_idx: p for p, frame_idx in enumerate(frame_indices)}
+                for start_idx, pos in group:
+                    window = [frame_positions[start_idx + offset] for offset in self.frame_offsets]
+                    datapoints[pos] = self._make_datapoint(frames[window], sequence_path, start_idx)
+        return datapoints
+
+    def __len__(self):
+        return len(self.sequences_with_frame_index)
+
+
 def _random_split(dataset: VPDataset, lengths: Sequence[int], random_seed: int) -> List[VPSubset]:
     r"""
     Custom implementation of torch.utils.data.random_split that returns SubsetWrappers.
@@ -1,6 +1,11 @@
+import threading
+
 import torch
 from torch import nn as nn
 
+_SHARED_MEASURES = dict()  #: The measure instances shared within the process, by measure class and device.
+_SHARED_MEASURES_LOCK = threading.Lock()
+
 
 class VPMeasure(nn.Module):
     r"""
@@ -22,6 +27,8 @@ class VPMeasure(nn.Module):
     REFERENCE: str = None  #: The reference publication where this measure is originally introduced (represented as string)
     BIGGER_IS_BETTER = False  #: Specifies whether bigger values are better.
     OPT_VALUE = 0.  #: Specifies the best value attainable (e.g. when input tensors are equal).
+    FRAME_WISE = True  #: Specifies whether the measure value is the average of independently assessed frames.
+    ACCUMULATABLE = False  #: Specifies whether the measure can alternatively be accumulated over a whole dataset (see :meth:`accumulate()`).
 
     def __init__(self, device: str):
         r"""
@@ -36,25 +43,122 @@ class VPMeasure(nn.Module):
         self.device = device
         self.to(device)
 
-    def forward(self, pred: torch.Tensor, target: torch.Tensor):
+    @classmethod
+    def get_shared(cls, device: str):
+        r"""
+        Returns an instance of the measure for the given device that is shared within the process:
+        It is instantiated on the first request only, so that expensive initialization (e.g. loading pretrained
+        networks such as the I3D network of the FVD) is not repeated for every provider, test or training run.
+        Shared instances are put into evaluation mode and their parameters don't require gradients
+        (gradients w.r.t. the input tensors are still available, so that they can be used as losses).
+
+        Args:
+            device (str): A string specifying whether to use the GPU for calculations (`cuda`) or the CPU (`cpu`).
+
+        Returns: The shared measure instance.
+        """
+        key = (cls, str(device))
+        with _SHARED_MEASURES_LOCK:
+            if key not in _SHARED_MEASURES:
+                measure = cls(device=device)
+                measure.eval()
+                measure.requires_grad_(False)
+                _SHARED_MEASURES[key] = measure
+            return _SHARED_MEASURES[key]
+
+    def forward(self, pred: torch.Tensor, target: torch.Tensor, reduction: str = "mean"):
         r"""
         The module's forward pass takes the predicted frame sequence and the ground truth,
         compares them based on the deriving measure's criterion and logic and outputs a numerical assessment of the
         prediction quality.
 
-        The base measure's forward method can be used by deriving classes and simply applies the criterion to the
-        input tensors, sums up over all entries of an image and finally averages over frames and then batches.
+        The base measure's forward method can be used by frame-wise deriving classes and simply averages the values
+        obtained from :meth:`frame_values()` over frames and then batches.
 
         Args:
             pred (torch.Tensor): The predicted frame sequence as a 5D tensor (batch, frames, c, h, w).
             target (torch.Tensor): The ground truth frame sequence as a 5D tensor (batch, frames, c, h, w)
+            reduction (str): If 'mean', averages the values over the batch. If 'none', returns one value per sample.
 
         Returns: The calculated numerical quality assessment.
         """
+        return self.reduce(self.frame_values(pred, target).mean(dim=1), reduction)
+
+    def frame_values(self, pred: torch.Tensor, target: torch.Tensor, target_features=None):
+        r"""
+        Assesses each predicted frame separately, returning the lower-is-better measurement value of every frame.
+        For frame-wise measures, the value for any prediction horizon is the mean over the values of its frames,
+        which allows obtaining the values for all horizons from a single pass (see :attr:`FRAME_WISE`).
+
+        The base measure's implementation applies the criterion to the input tensors
+        and sums up over all entries of an image.
+
+        Args:
+            pred (torch.Tensor): The predicted frame sequence as a 5D tensor (batch, frames, c, h, w).
+            target (torch.Tensor): The ground truth frame sequence as a 5D tensor (batch, frames, c, h, w)
+            target_features (Any): If not None, the features of the target as obtained from :meth:`extract_target_features()`.
+
+        Returns: The measurement values as a 2D tensor (batch, frames).
+        """
+        if not self.FRAME_WISE:
+            raise NotImplementedError(f"{self.NAME} is not a frame-wise measure")
         if pred.ndim != 5 or target.ndim != 5:
             raise ValueError(f"{self.NAME} expects 5-D inputs!")
-        value = self.criterion(pred, target)
-        return value.sum(dim=(4, 3, 2)).mean(dim=1).mean(dim=0)
+        return self.criterion(pred, target).sum(dim=(4, 3, 2))
+
+    def extract_target_features(self, target: torch.Tensor):
+        r"""
+        For measures that compare features of the prediction with features of the ground truth, computes the
+        ground truth features, so that they can be re-used when assessing multiple predictions of the same
+        ground truth (see :meth:`frame_values()`). The base measure's implementation returns None (no features).
+
+        Args:
+            target (torch.Tensor): The ground truth frame sequence as a 5D tensor (batch, frames, c, h, w)
+
+        Returns: The target features (or None if the measure doesn't support re-using target features).
+        """
+        return None
+
+    def new_accumulator(self):
+        r"""
+        For accumulatable measures, creates an empty accumulator that can be filled with :meth:`accumulate()`.
+        Accumulators provide a `merge(other)` method to merge in other accumulators of the same measure, as well as
+        a `result()` method returning a dictionary that maps horizon indices to the measurement values
+        (in display representation) obtained over all accumulated data.
+
+        Returns: The created accumulator.
+        """
+        raise NotImplementedError(f"{self.NAME} can not be accumulated")
+
+    def accumulate(self, pred: torch.Tensor, target: torch.Tensor, accumulator, horizon_idx: int = 0):
+        r"""
+        For accumulatable measures, adds the given batch of predictions and ground truth sequences to the accumulator,
+        so that the measure can be calculated over a whole dataset instead of per batch.
+
+        Args:
+            pred (torch.Tensor): The predicted frame sequence as a 5D tensor (batch, frames, c, h, w).
+            target (torch.Tensor): The ground truth frame sequence as a 5D tensor (batch, frames, c, h, w)
+            accumulator (Any): The accumulator obtained from :meth:`new_accumulator()`.
+            horizon_idx (int): The index of the prediction horizon the given sequences belong to.
+        """
+        raise NotImplementedError(f"{self.NAME} can not be accumulated")
+
+    @staticmethod
+    def reduce(value: torch.Tensor, reduction: str):
+        r"""
+        Reduces the given per-sample measurement values according to the specified reduction.
+
+        Args:
+            value (torch.Tensor): The per-sample measurement values as a 1D tensor (batch).
+            reduction (str): If 'mean', returns the mean over the batch. If 'none', returns the values unchanged.
+
+        Returns: The reduced measurement value(s).
+        """
+        if reduction == "mean":
+            return value.mean(dim=0)
+        elif reduction == "none":
+            return value
+        raise ValueError(f"unknown reduction '{reduction}' (supported: 'mean', 'none')")
 
     def reshape_clamp(self, pred: torch.Tensor, target: torch.Tensor):
         r"""
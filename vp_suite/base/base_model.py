@@ -1,9 +1,16 @@
+from typing import Optional
+
 import torch
 import torch.nn as nn
+from torch.cuda.amp import GradScaler
+from torch.nn.parallel import DistributedDataParallel
 from torch.utils.data.dataloader import DataLoader
 from torch.optim.optimizer import Optimizer
 from tqdm import tqdm
 from vp_suite.utils.utils import set_from_kwarg, get_public_attrs
+from vp_suite.utils.precision import autocast
+from vp_suite.utils.memory_format import to_channels_last
+from vp_suite.utils.distributed import all_gather_object, all_reduce_sums, is_main_process
 from vp_suite.measure.loss_provider import PredictionLossProvider
 from vp_suite.base import VPData
 
@@ -105,6 +112,8 @@ class VPModel(nn.Module):
         if reverse:
             img_data = torch.flip(img_data, dims=[1])
             actions = torch.flip(actions, dims=[1])
+        if config.get("channels_last", False):
+            img_data = to_channels_last(img_data)  # each frame in channels_last, so that slices/splits stay in it
         T_in, T_pred = config["context_frames"], config["pred_frames"]
         if self.NEEDS_COMPLETE_INPUT or complete:
             input_frames = img_data[:, :T_in+T_pred]
@@ -146,10 +155,14 @@ class VPModel(nn.Module):
         return pred, None
 
     def train_iter(self, config: dict, loader: DataLoader, optimizer: Optimizer,
-                   loss_provider: PredictionLossProvider, epoch: int):
+                   loss_provider: PredictionLossProvider, epoch: int, grad_scaler: Optional[GradScaler] = None,
+                   ddp_model: Optional[DistributedDataParallel] = None):
         r"""
         Default training iteration: Loops through the whole data loader once and, for every batch, executes
         forward pass, loss calculation and backward pass/optimization step.
+        If a reduced precision is configured, the forward pass runs under autocast.
+        If gradient accumulation is configured, each batch is split into micro-batches whose gradients are
+        accumulated before the optimization step (see :meth:`micro_batches()`).
 
         Args:
             config (dict): The configuration dict of the current training run (combines model, dataset and run config)
@@ -157,31 +170,123 @@ class VPModel(nn.Module):
             optimizer (Optimizer): The optimizer to use for weight update calculations.
             loss_provider (PredictionLossProvider): An instance of the :class:`LossProvider` class for flexible loss calculation.
             epoch (int): The current epoch.
+            grad_scaler (Optional[GradScaler]): The gradient scaler of the training run (see :func:`~vp_suite.utils.precision.create_grad_scaler()`), if training in float16 mixed precision.
+            ddp_model (Optional[DistributedDataParallel]): In distributed runs, the data-parallel wrapper of this model (see :func:`~vp_suite.utils.distributed.wrap_data_parallel()`).
         """
-        loop = tqdm(loader)
+        loop = tqdm(loader, disable=not is_main_process())
         for batch_idx, data in enumerate(loop):
-            # fwd
-            input, targets, actions = self.unpack_data(data, config)
-            predictions, model_losses = self(input, pred_frames=config["pred_frames"], actions=actions)
-
-            # loss
-            _, total_loss = loss_provider.get_losses(predictions, targets)
-            if model_losses is not None:
-                for value in model_losses.values():
-                    total_loss += value
-
-            # bwd
-            optimizer.zero_grad()
-            total_loss.backward()
-            optimizer.step()
+            batch_loss = 0.
+            for micro_data, weight, model in self.micro_batches(data, config, ddp_model):
+                # fwd
+                input, targets, actions = self.unpack_data(micro_data, config)
+                with autocast(config):
+                    predictions, model_losses = model(input, pred_frames=config["pred_frames"], actions=actions)
+
+                # loss
+                _, total_loss = loss_provider.get_losses(predictions.float(), targets)
+                if model_losses is not None:
+                    for value in model_losses.values():
+                        total_loss += value
+
+                # bwd
+                self.accumulate_gradients(total_loss, weight, grad_scaler)
+                batch_loss += total_loss.detach() * weight
+
+            self.optimization_step(optimizer, grad_scaler)
 
             # bookkeeping
-            loop.set_postfix(loss=total_loss.item())
+            loop.set_postfix(loss=batch_loss.item())
+
+    def split_batch(self, data: VPData, config: dict):
+        r"""
+        Splits given batch into `grad_accum_steps` micro-batches of (nearly) equal size, as specified in the run
+        configuration. Each micro-batch is weighted by its share of the batch's samples, so that the accumulated
+        gradients of the weighted micro-batch losses equal the gradients of the (batch-averaged) loss of the whole
+        batch. Batch-dependent layers (e.g. batch normalization) are the only exception, as they only see the
+        micro-batches.
+
+        Args:
+            data (VPData): The batch to split.
+            config (dict): The configuration dict of the current training run.
+
+        Returns: A list of (micro-batch, weight) tuples.
+        """
+        batch_size = data["frames"].shape[0]
+        num_micro_batches = min(config.get("grad_accum_steps", 1), batch_size)
+        if num_micro_batches <= 1:
+            return [(data, 1.0)]
+        micro_batches = []
+        for indices in torch.tensor_split(torch.arange(batch_size), num_micro_batches):
+            start, end = indices[0].item(), indices[-1].item() + 1
+            micro_data = {k: v[start:end] if isinstance(v, (torch.Tensor, list, tuple)) else v for k, v in data.items()}
+            micro_batches.append((micro_data, (end - start) / batch_size))
+        return micro_batches
+
+    def micro_batches(self, data: VPData, config: dict, ddp_model: Optional[DistributedDataParallel] = None):
+        r"""
+        Iterates over the micro-batches of given batch (see :meth:`split_batch()`), yielding each micro-batch and its
+        weight together with the module that runs the forward pass. In distributed runs, this is the data-parallel
+        wrapper of the model: Then, the gradients of all but the last micro-batch are accumulated locally, and the
+        gradients are averaged over all ranks in the backward pass of the last micro-batch only.
+        The backward pass of each micro-batch has to be executed before advancing to the next one.
+
+        Args:
+            data (VPData): The batch to split.
+            config (dict): The configuration dict of the current training run.
+            ddp_model (Optional[DistributedDataParallel]): In distributed runs, the data-parallel wrapper of this model.
+
+        Returns: A generator yielding (micro-batch, weight, model) tuples.
+        """
+        micro_batches = self.split_batch(data, config)
+        for i, (micro_data, weight) in enumerate(micro_batches):
+            if ddp_model is None:
+                yield micro_data, weight, self
+            elif i < len(micro_batches) - 1:
+                with ddp_model.no_sync():
+                    yield micro_data, weight, ddp_model
+            else:
+                yield micro_data, weight, ddp_model
+
+    def accumulate_gradients(self, loss: torch.Tensor, weight: float = 1.0, grad_scaler: Optional[GradScaler] = None):
+        r"""
+        Executes the backward pass for the given (micro-batch) loss, accumulating the gradients until the next
+        optimization step. If training in float16 mixed precision, the loss is scaled by the run's gradient scaler
+        to avoid underflowing gradients.
+
+        Args:
+            loss (torch.Tensor): The loss to minimize.
+            weight (float): The factor the loss is multiplied with (the micro-batch's share of the batch).
+            grad_scaler (Optional[GradScaler]): The gradient scaler of the training run (if any).
+        """
+        loss = loss * weight
+        if grad_scaler is None:
+            loss.backward()
+        else:
+            grad_scaler.scale(loss).backward()
+
+    def optimization_step(self, optimizer: Optimizer, grad_scaler: Optional[GradScaler] = None):
+        r"""
+        Executes the weight update with the accumulated gradients and resets them afterwards.
+
+        Args:
+            optimizer (Optimizer): The optimizer to use for weight update calculations.
+            grad_scaler (Optional[GradScaler]): The gradient scaler of the training run (if any).
+        """
+        if grad_scaler is None:
+            optimizer.step()
+        else:
+            grad_scaler.step(optimizer)
+            grad_scaler.update()
+        optimizer.zero_grad()
 
     def eval_iter(self, config: dict, loader: DataLoader, loss_provider: PredictionLossProvider):
         r"""
-        Default training iteration: Loops through the whole data loader once and, for every datapoint, executes
+        Default training iteration: Loops through the whole data loader once and, for every batch, executes
         forward pass, and loss calculation. Then, aggregates all loss values to assess the prediction quality.
+        The losses are calculated per sample and accumulated in running sums,
+        so that the returned averages are exact regardless of the batch size.
+        Losses that are not defined per sample but can be accumulated (e.g. FVD) are calculated once over all
+        validation data instead (see :meth:`~vp_suite.base.VPMeasure.accumulate()`).
 
         Args:
             config (dict): The configuration dict of the current validation run (combines model, dataset and run config)
@@ -192,25 +297,39 @@ class VPModel(nn.Module):
         as well as the value for the 'indicator' loss (the loss used for determining overall model improvement).
         """
         self.eval()
-        loop = tqdm(loader)
-        all_losses = []
-        indicator_losses = []
+        loop = tqdm(loader, disable=not is_main_process())
+        loss_sums, accumulators = dict(), dict()
+        n_samples = 0
 
         with torch.no_grad():
             for batch_idx, data in enumerate(loop):
                 # fwd
                 input, targets, actions = self.unpack_data(data, config)
-                predictions, model_losses = self(input, pred_frames=config["pred_frames"], actions=actions)
+                with autocast(config):
+                    predictions, model_losses = self(input, pred_frames=config["pred_frames"], actions=actions)
 
                 # metrics
-                loss_values, _ = loss_provider.get_losses(predictions, targets)
-                all_losses.append(loss_values)
-                indicator_losses.append(loss_values[config["val_rec_criterion"]])
-
-        indicator_loss = torch.stack(indicator_losses).mean()
-        all_losses = {
-            k: torch.stack([loss_values[k] for loss_values in all_losses]).mean().item() for k in all_losses[0].keys()
-        }
+                loss_values, _ = loss_provider.get_losses(predictions.float(), targets, reduction="none",
+                                                          accumulators=accumulators)  # values: [b]
+                for k, v in loss_values.items():
+                    loss_sums[k] = loss_sums.get(k, 0.) + v.double().sum()
+                n_samples += predictions.shape[0]
+
+        # in distributed runs, the sums and accumulators are taken over the validation data of all ranks
+        sample_wise_keys = [k for k, (loss, _) in loss_provider.losses.items() if not loss.ACCUMULATABLE]
+        loss_sums, n_samples = all_reduce_sums({k: float(loss_sums.get(k, 0.)) for k in sample_wise_keys}, n_samples)
+        all_losses = {k: loss_sum / n_samples for k, loss_sum in loss_sums.items()}
+        for rank_accumulators in all_gather_object(accumulators)[1:]:
+            for k, accumulator in rank_accumulators.items():
+                if k in accumulators:
+                    accumulators[k].merge(accumulator)
+                else:
+                    accumulators[k] = accumulator
+        for k, accumulator in accumulators.items():
+            result = accumulator.result()
+            if 0 in result:  # nothing is accumulated if the measure can't be calculated (e.g. too few frames)
+                all_losses[k] = result[0]
+        indicator_loss = torch.tensor(all_losses.get(config["val_rec_criterion"], float("inf")), dtype=torch.float)
         self.train()
 
         return all_losses, indicator_loss
@@ -3,15 +3,14 @@ import random
 import os
 
 import cv2
-import torch
 from tqdm import tqdm
 
-from vp_suite.base import VPDataset, VPData
+from vp_suite.base import VPVideoDataset
 from vp_suite.defaults import SETTINGS
-from vp_suite.utils.utils import set_from_kwarg, read_video
+from vp_suite.utils.utils import set_from_kwarg, read_video, iter_video
 
 
-class CaltechPedestrianDataset(VPDataset):
+class CaltechPedestrianDataset(VPVideoDataset):
     r"""
     Dataset class for the dataset "Caltech Pedestrian", as firstly encountered in
     "Pedestrian Detection: A Benchmark" by Dollár et al.
@@ -35,8 +34,7 @@ class CaltechPedestrianDataset(VPDataset):
 
     def __init__(self, split, **dataset_kwargs):
         super(CaltechPedestrianDataset, self).__init__(split, **dataset_kwargs)
-        self.NON_CONFIG_VARS.extend(["sequences", "sequences_with_frame_index",
-                                     "AVAILABLE_CAMERAS"])
+        self.NON_CONFIG_VARS.extend(["AVAILABLE_CAMERAS"])
 
         # set attributes
         set_from_kwarg(self, dataset_kwargs, "train_to_val_ratio")
@@ -64,28 +62,13 @@ class CaltechPedestrianDataset(VPDataset):
                 sequences = sequences[slice_idx:]
         self.sequences = sequences
 
-        self.sequences_with_frame_index = []  # mock value, must not be used for iteration till sequence length is set
+    def _read_frames(self, sequence_path, frame_indices):
+        vid = read_video(sequence_path, start_index=frame_indices[0],
+                         num_frames=frame_indices[-1] - frame_indices[0] + 1)  # [T, h, w, c]
+        return vid[[idx - frame_indices[0] for idx in frame_indices]]  # [t, h, w, c]
 
-    def _set_seq_len(self):
-        # Determine per video which frame indices are valid start indices. Each resulting index marks a datapoint.
-        for sequence_path, frame_count in self.sequences:
-            valid_start_idx = range(0, frame_count - self.seq_len + 1,
-                                    self.seq_len + self.seq_step - 1)
-            for idx in valid_start_idx:
-                self.sequences_with_frame_index.append((sequence_path, idx))
-
-    def __getitem__(self, i) -> VPData:
-        sequence_path, start_idx = self.sequences_with_frame_index[i]
-        vid = read_video(sequence_path, start_index=start_idx, num_frames=self.seq_len)  # [T, h, w, c]
-        vid = vid[::self.seq_step]  # [t, h, w, c]
-        vid = self.preprocess(vid)  # [t, c, h, w]
-        actions = torch.zeros((self.total_frames, 1))  # [t, a], actions should be disregarded in training logic
-
-        data = {"frames": vid, "actions": actions, "origin": f"{sequence_path}, start frame: {start_idx}"}
-        return data
-
-    def __len__(self):
-        return len(self.sequences_with_frame_index)
+    def _iter_frames(self, sequence_path, start_idx, num_frames):
+        return iter_video(sequence_path, start_index=start_idx, num_frames=num_frames)
 
     @classmethod
     def download_and_prepare_dataset(cls):
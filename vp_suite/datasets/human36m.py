@@ -3,15 +3,14 @@ import json
 import random
 from pathlib import Path
 
-import torch
 from tqdm import tqdm
 
-from vp_suite.base import VPDataset, VPData
+from vp_suite.base import VPVideoDataset
 from vp_suite.defaults import SETTINGS
-from vp_suite.utils.utils import set_from_kwarg, get_frame_count, read_video
+from vp_suite.utils.utils import set_from_kwarg, get_frame_count, read_video, iter_video
 
 
-class Human36MDataset(VPDataset):
+class Human36MDataset(VPVideoDataset):
     r"""
     Dataset class for the Videos of the dataset "Human 3.6M", as encountered in
     "Human3.6M: Large Scale Datasets and Predictive Methods for 3D Human Sensing in Natural Environments"
@@ -39,8 +38,7 @@ class Human36MDataset(VPDataset):
 
     def __init__(self, split, **dataset_kwargs):
         super(Human36MDataset, self).__init__(split, **dataset_kwargs)
-        self.NON_CONFIG_VARS.extend(["sequences", "sequences_with_frame_index",
-                                     "ALL_SCENARIOS"])
+        self.NON_CONFIG_VARS.extend(["ALL_SCENARIOS"])
 
         # set attributes
         set_from_kwarg(self, dataset_kwargs, "scenarios", default=self.ALL_SCENARIOS, choices=self.ALL_SCENARIOS)
@@ -65,31 +63,15 @@ class Human36MDataset(VPDataset):
                 self.sequences = dict(vfc_list[:slice_idx])
             else:
                 self.sequences = dict(vfc_list[slice_idx:])
+        self.sequences = list(self.sequences.items())
 
-        self.sequences_with_frame_index = []  # mock value, must not be used for iteration till sequence length is set
+    def _read_frames(self, sequence_path, frame_indices):
+        vid = read_video(sequence_path, img_size=self.img_shape[1:], start_index=frame_indices[0],
+                         num_frames=frame_indices[-1] - frame_indices[0] + 1)  # [T, h, w, c]
+        return vid[[idx - frame_indices[0] for idx in frame_indices]]  # [t, h, w, c]
 
-    def _set_seq_len(self):
-        # Determine per video which frame indices are valid
-        for vfp, frame_count in self.sequences.items():
-            valid_idx = range(self.SKIP_FIRST_N,
-                              frame_count - self.seq_len + 1,
-                              self.seq_len + self.seq_step - 1)
-            for idx in valid_idx:
-                self.sequences_with_frame_index.append((vfp, idx))
-
-    def __getitem__(self, i) -> VPData:
-        sequence_path, start_idx = self.sequences_with_frame_index[i]
-        vid = read_video(sequence_path, img_size=self.img_shape[1:],
-                         start_index=start_idx, num_frames=self.seq_len)  # [T, h, w, c]
-        vid = vid[::self.seq_step]  # [t, h, w, c]
-        vid = self.preprocess(vid)  # [t, c, h, w]
-        actions = torch.zeros((self.total_frames, 1))  # [t, a], actions should be disregarded in training logic
-
-        data = {"frames": vid, "actions": actions, "origin": f"{sequence_path}, start frame: {start_idx}"}
-        return data
-
-    def __len__(self):
-        return len(self.sequences_with_frame_index)
+    def _iter_frames(self, sequence_path, start_idx, num_frames):
+        return iter_video(sequence_path, img_size=self.img_shape[1:], start_index=start_idx, num_frames=num_frames)
 
     @classmethod
     def download_and_prepare_dataset(cls):
@@ -3,14 +3,13 @@ from pathlib import Path
 
 import cv2
 import numpy as np
-import torch
 
-from vp_suite.base import VPDataset, VPData
+from vp_suite.base import VPVideoDataset
 from vp_suite.defaults import SETTINGS
 from vp_suite.utils.utils import set_from_kwarg
 
 
-class KITTIRawDataset(VPDataset):
+class KITTIRawDataset(VPVideoDataset):
     r"""
     Dataset class for the "raw data" regime of the "KITTI Vision Benchmark Suite", as described in
     "Vision meets Robotics: The KITTI Dataset" by Geiger et al. (http://www.cvlibs.net/publications/Geiger2013IJRR.pdf).
@@ -35,8 +34,7 @@ class KITTIRawDataset(VPDataset):
 
     def __init__(self, split, **dataset_kwargs):
         super(KITTIRawDataset, self).__init__(split, **dataset_kwargs)
-        self.NON_CONFIG_VARS.extend(["sequences", "sequences_with_frame_index",
-                                     "AVAILABLE_CAMERAS"])
+        self.NON_CONFIG_VARS.extend(["AVAILABLE_CAMERAS"])
 
         # set attributes
         set_from_kwarg(self, dataset_kwargs, "camera")
@@ -72,30 +70,11 @@ class KITTIRawDataset(VPDataset):
             sequence_len = len(list(sequence_dir.rglob(f"{self.camera}/data/*.png")))
             self.sequences.append((sequence_dir, sequence_len))
 
-        self.sequences_with_frame_index = []  # mock value, must not be used for iteration till sequence length is set
-
-    def _set_seq_len(self):
-        # Determine per video which frame indices are valid
-        for sequence_path, frame_count in self.sequences:
-            valid_start_idx = range(0, frame_count - self.seq_len + 1,
-                                    self.seq_len + self.seq_step - 1)
-            for idx in valid_start_idx:
-                self.sequences_with_frame_index.append((sequence_path, idx))
-
-    def __getitem__(self, i) -> VPData:
-        sequence_path, start_idx = self.sequences_with_frame_index[i]
+    def _read_frames(self, sequence_path, frame_indices):
         all_img_paths = sorted(list(sequence_path.rglob(f"{self.camera}/data/*.png")))
-        seq_img_paths = all_img_paths[start_idx:start_idx+self.seq_len:self.seq_step]  # t items of [h, w, c]
-        seq_imgs = [cv2.cvtColor(cv2.imread(str(fp.resolve())), cv2.COLOR_BGR2RGB) for fp in seq_img_paths]
-        vid = np.stack(seq_imgs, axis=0)  # [t, *self.DATASET_FRAME_SHAPE]
-        vid = self.preprocess(vid)  # [t, *self.img_shape]
-        actions = torch.zeros((self.total_frames, 1))  # [t, a], actions should be disregarded in training logic
-
-        data = {"frames": vid, "actions": actions, "origin": f"{sequence_path}, start frame: {start_idx}"}
-        return data
-
-    def __len__(self):
-        return len(self.sequences_with_frame_index)
+        seq_imgs = [cv2.cvtColor(cv2.imread(str(all_img_paths[idx].resolve())), cv2.COLOR_BGR2RGB)
+                    for idx in frame_indices]  # t items of [h, w, c]
+        return np.stack(seq_imgs, axis=0)  # [t, *self.DATASET_FRAME_SHAPE]
 
     @classmethod
     def download_and_prepare_dataset(cls):
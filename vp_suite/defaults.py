@@ -52,11 +52,35 @@ class DefaultRunConfig:
     seed: int = 42  #: The seed for all random number generators (python, numpy, pytorch) used throughout training/testing.
     lr: float = 0.0001  #: The learning rate for the models.
     epochs: int = 1000000  #: Number of epochs the model is trained before finalizing the training procedure. By default, this is set to a large number to let the training run terminate by time-outing.
-    max_training_hours: float = 48  #: Maximum number of training hours before finalizing the training procedure. When the training time is exceeded, the current training iteration is continued but becomes the last training iteration.
+    max_training_hours: float = 48  #: Maximum number of training hours before finalizing the training procedure (including the training time before resuming). The time is checked after every training step: When it is exceeded, the training loop is left right away (after saving a resumable checkpoint, if enabled).
     batch_size: int = 32  #: The batch size used for training.
+    train_processes: int = 1  #: If greater than 1, training runs distributed data-parallel in this many spawned processes on this machine: Each process trains a model replica on its share of every batch (`batch_size` is the total batch size and has to be divisible by the number of processes), the gradients are averaged before every optimizer step and the validation losses are summed up over all processes. Only the first process saves models, creates visualizations and logs to Weights and Biases.
+    dist_backend: str = "gloo"  #: The communication backend for distributed training: 'gloo' for training on CPUs, 'nccl' for training with one GPU per process.
+    grad_accum_steps: int = 1  #: If greater than 1, each training batch is split into this many micro-batches whose gradients are accumulated before a single optimizer step, which reduces the memory needed for large batch sizes. The results equal those of training on the whole batch at once, except for batch-dependent layers (e.g. batch normalization).
+    val_batch_size: int = None  #: The batch size used for validation. If None, `batch_size` is used.
+    test_batch_size: int = 1  #: The batch size used for testing. Image-wise metrics are calculated per sample and thus don't depend on it, but batch-level metrics (FVD) do.
+    num_workers: int = 4  #: The number of DataLoader worker processes used for loading training, validation and test data (0 means that data is loaded in the main process). Validation/test data of on-the-fly datasets is always loaded in the main process to keep it reproducible.
+    pin_memory: bool = False  #: If set to True, the DataLoaders put the loaded data into pinned memory (speeds up host-to-GPU copies).
+    persistent_workers: bool = True  #: If set to True (and using worker processes), the DataLoader worker pools are kept alive and re-used across epochs instead of being re-created for every pass over the data.
+    prefetch_factor: int = 2  #: The number of batches loaded in advance by each DataLoader worker process (only used when using worker processes).
+    stream_train_data: bool = False  #: If set to True, the training data of video datasets (Human 3.6M, Caltech Pedestrian, KITTI raw) is streamed: each video is decoded sequentially and its windows are mixed through a shuffle buffer, instead of seeking and decoding every datapoint separately.
+    shuffle_buffer_size: int = 512  #: If streaming training data (including training data loaded from shards), this many datapoints are mixed in the shuffle buffer of each DataLoader worker.
+    precision: str = None  #: If set to 'bf16' or 'fp16', the forward passes of training, validation and testing run under autocast in bfloat16 or float16 mixed precision ('auto' chooses bfloat16 on the CPU and float16 on the GPU). Float16 training uses gradient scaling. Numerically sensitive computations (e.g. FVD, PhyCell moment losses) always run in full precision.
+    channels_last: bool = False  #: If set to True, the models and their input frames are converted to the channels_last memory format (channels_last_3d for 3D convolutions) before training/testing, which speeds up convolutions on many CPUs and GPUs. Predictions are the same up to floating point accuracy.
+    checkpoint_every: int = None  #: If specified, a resumable checkpoint ('last_checkpoint.pth' in the output directory) is saved every this many training steps, after every epoch and when the training time is exceeded. Besides the model, it contains the states of optimizer, learning rate scheduler and random number generators, the best validation loss and the position within the current epoch.
+    resume_from: str = None  #: If specified, the training run continues from this resumable checkpoint (or from the 'last_checkpoint.pth' in this directory) exactly where the interrupted run stopped, replacing the trained model with the checkpoint's model. The other run options should be the same as for the interrupted run.
+    async_checkpoints: bool = True  #: If set to True, the model checkpoints saved during training (CPU snapshots of model, optimizer and learning rate scheduler) are written to disk by a background thread, so that training continues immediately. Either way, checkpoint files are replaced atomically.
     losses_and_scales: dict = {"mse": 1.0}  #: A dictionary where the keys denote all losses that should be calculated and logged during training, and their corresponding values denote the factor with which to multiply and add these losses to the overall loss used for backpropagation.
     val_rec_criterion: str = "mse"  #: The measure that is used to determine the model quality during validation. Every time the resulting measurement is improved, the current model snapshot is saved as the current 'best model'.
     metrics = ["mse", "lpips", "psnr", "ssim"]  #: A list of the metrics used for testing. If instead of a list, "all" is specified, all mavailable metrics are calculated.
+    metric_ci: float = None  #: If specified (e.g. 0.95), the test results additionally contain the standard deviation and the confidence interval half-width (for this confidence level) of each metric over the test set.
+    accumulate_metrics: bool = False  #: If set to True, dataset-level metrics (FVD) are calculated once over the whole test set from accumulated features, instead of being calculated per test batch and averaged.
+    fvd_feature_cache: bool = False  #: If set to True, the I3D features of the ground truth test sequences are computed only once for all tested models and are cached on disk (in the data path) for later test runs on the same dataset and sequence configuration.
+    metric_workers: int = 0  #: If greater than 0, test metrics are computed asynchronously by this many worker threads, overlapping with model inference. The aggregated results are identical to synchronous computation.
+    metric_queue_size: int = 8  #: If computing metrics asynchronously (or evaluating in worker processes), model inference (or data loading) blocks when this many batches are waiting for processing.
+    parallel_test: str = None  #: If set to 'models', each tested model is evaluated in its own spawned worker process, which is fed the test data through shared memory (together with the target-side metric features, which are computed once for all models). If set to 'shards', the test set is split into contiguous shards that are evaluated by separate worker processes. The aggregated results are merged at the end.
+    test_processes: int = 2  #: The number of worker processes (shards) the test set is split among if testing in parallel shards.
+    test_threads: int = None  #: The number of CPU threads split among the test worker processes. If none is specified, the current number of PyTorch threads is used.
     context_frames: int = 10  #: The number of context frames given to the prediction models. Also used in determining the needed sequence length for dataset usage.
     pred_frames: int = 10  #: The number of frames the prediction model shall predict. Also used in determining the needed sequence length for dataset usage.
     seq_step: int = 1  #: Sequences taken from the dataset use every Nth frame, where N is this value (Default value is 1, meaning that every frame is taken for the sequence).
@@ -0,0 +1,135 @@
+r"""
+This module contains the :class:`MetricAggregator`, which aggregates per-sample metric values over a whole test set
+without storing the individual values.
+"""
+from copy import deepcopy
+from statistics import NormalDist
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+
+class MetricAggregator:
+    r"""
+    Aggregates per-sample metric values for multiple prediction horizons in constant memory.
+    For every metric and prediction horizon, the sample count, the running mean and the running sum of squared
+    deviations from the mean are maintained using Welford's algorithm (in its batched variant by Chan et al.),
+    so that the mean, standard deviation and confidence intervals can be obtained at any time.
+    Aggregators that have been filled separately (e.g. on different parts of a test set) can be merged.
+
+    Attributes:
+        confidence (float): If specified, the results additionally contain the standard deviation and the half-width
+            of the confidence interval with this confidence level for every metric.
+        num_samples (int): The number of samples aggregated so far.
+        accumulators (dict): The accumulators of metrics that are calculated over the whole dataset instead of
+            per sample (e.g. FVD, see :meth:`PredictionMetricProvider.get_metrics()`).
+    """
+    def __init__(self, confidence: float = None):
+        r"""
+        Args:
+            confidence (float): If specified (e.g. 0.95), the results additionally contain the standard deviation and
+                the half-width of the normal-approximation confidence interval with this confidence level.
+        """
+        if confidence is not None and not 0.0 < confidence < 1.0:
+            raise ValueError(f"confidence level needs to be in (0, 1) (given: {confidence})")
+        self.confidence = confidence
+        self.num_samples = 0
+        self.accumulators = dict()
+        self._num_horizons = None
+        self._counts: Dict[str, np.ndarray] = dict()
+        self._means: Dict[str, np.ndarray] = dict()
+        self._m2s: Dict[str, np.ndarray] = dict()
+
+    def _check_num_horizons(self, num_horizons: int):
+        if self._num_horizons is None:
+            self._num_horizons = num_horizons
+        elif num_horizons != self._num_horizons:
+            raise ValueError(f"number of prediction horizons changed "
+                             f"(previously: {self._num_horizons}, given: {num_horizons})")
+
+    def _get_stats(self, key: str):
+        if key not in self._counts:
+            self._counts[key] = np.zeros(self._num_horizons, dtype=np.int64)
+            self._means[key] = np.zeros(self._num_horizons, dtype=np.float64)
+            self._m2s[key] = np.zeros(self._num_horizons, dtype=np.float64)
+        return self._counts[key], self._means[key], self._m2s[key]
+
+    def _merge_stats(self, key: str, count, mean, m2):
+        r"""
+        Merges the given per-horizon statistics into the statistics of the given metric.
+        Horizons with a count of zero are left unchanged.
+        """
+        counts, means, m2s = self._get_stats(key)
+        total = counts + count
+        valid = total > 0
+        delta = np.where(valid, mean - means, 0.0)
+        weight = np.divide(count, total, out=np.zeros_like(means), where=valid)
+        means += delta * weight
+        m2s += m2 + delta ** 2 * counts * weight
+        counts += count
+
+    def update(self, metrics: Sequence[Dict[str, Sequence[float]]]):
+        r"""
+        Adds the per-sample metric values of a batch, as returned by
+        :meth:`PredictionMetricProvider.get_metrics()` with `reduction='none'`.
+
+        Args:
+            metrics (Sequence[Dict[str, Sequence[float]]]): For each prediction horizon, a dictionary that contains
+                one value per sample for each metric.
+        """
+        self._check_num_horizons(len(metrics))
+        batch_stats, num_samples = dict(), 0
+        for f, frame_cnt_metrics in enumerate(metrics):
+            for key, values in frame_cnt_metrics.items():
+                values = np.asarray(values, dtype=np.float64).reshape(-1)
+                count, mean, m2 = batch_stats.setdefault(key, np.zeros((3, self._num_horizons), dtype=np.float64))
+                count[f] = values.size
+                mean[f] = values.mean()
+                m2[f] = ((values - mean[f]) ** 2).sum()
+                num_samples = max(num_samples, values.size)
+        for key, (count, mean, m2) in batch_stats.items():
+            self._merge_stats(key, count.astype(np.int64), mean, m2)
+        self.num_samples += num_samples
+
+    def merge(self, other: "MetricAggregator"):
+        r"""
+        Merges the statistics of another aggregator into this one.
+
+        Args:
+            other (MetricAggregator): The aggregator to merge. It is left unchanged.
+        """
+        if other._num_horizons is None:
+            return
+        self._check_num_horizons(other._num_horizons)
+        for key in other._counts.keys():
+            self._merge_stats(key, other._counts[key], other._means[key], other._m2s[key])
+        for key, accumulator in other.accumulators.items():
+            if key in self.accumulators:
+                self.accumulators[key].merge(accumulator)
+            else:
+                self.accumulators[key] = deepcopy(accumulator)
+        self.num_samples += other.num_samples
+
+    def result(self) -> List[Dict[str, float]]:
+        r"""
+        Returns: For each prediction horizon, a dictionary containing the mean value of each metric
+        (and, if a confidence level has been specified, its standard deviation and confidence interval half-width),
+        as well as the values of the accumulated metrics.
+        """
+        if self._num_horizons is None:
+            return []
+        z = NormalDist().inv_cdf(0.5 + self.confidence / 2) if self.confidence is not None else None
+        results = [dict() for _ in range(self._num_horizons)]
+        for key, counts in self._counts.items():
+            for f, count in enumerate(counts.tolist()):
+                if count == 0:
+                    continue
+                results[f][key] = self._means[key][f].item()
+                if z is not None:
+                    std = (self._m2s[key][f].item() / (count - 1)) ** 0.5 if count > 1 else 0.0
+                    results[f][f"{key} std"] = std
+                    results[f][f"{key} ci{self.confidence * 100:g}"] = z * std / count ** 0.5
+        for key, accumulator in self.accumulators.items():
+            for f, value in accumulator.result().items():
+                results[f][key] = value
+        return results
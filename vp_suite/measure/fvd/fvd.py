@@ -1,5 +1,8 @@
+import hashlib
 import math
+import os
 from pathlib import Path
+from typing import Dict, List, Union
 
 import torch
 from torch import linalg as linalg
@@ -7,6 +10,7 @@ import torchvision.transforms.functional as TF
 
 from vp_suite.measure.fvd._pytorch_i3d.pytorch_i3d import InceptionI3d
 from vp_suite.base import VPMeasure
+from vp_suite.utils.precision import full_precision
 
 
 class FrechetVideoDistance(VPMeasure):
@@ -25,12 +29,15 @@ class FrechetVideoDistance(VPMeasure):
     """
     NAME = "Fréchet Video Distance (FVD)"
     REFERENCE = "https://arxiv.org/abs/1812.01717"
+    FRAME_WISE = False
+    ACCUMULATABLE = True
 
     _MIN_T = 9  #: The minimum number of frames per sequence needed for FVD calculation.
     _MAX_T = 16  #: The maximum number of framed per sequence usable for FVD calculation in a singe chunk.
     _I3D_IN_SIZE = (224, 224)  #: The expected frame dimensions of the I3D Network.
     _I3D_NUM_CLASSES = 400  #: The number of classes (vector dimensionality) the I3D Network returns.
     _I3D_CKPT_FILE = "_pytorch_i3d/models/rgb_imagenet.pt"  #: The file path to the pretrained I3D Model
+    _I3D_BATCH_SIZE = 16  #: The maximum number of video chunks passed through the I3D Network at once.
 
     def __init__(self, device, in_channels=3):
         r"""
@@ -48,6 +55,7 @@ class FrechetVideoDistance(VPMeasure):
         self.i3d.to(self.device)
         self.i3d.eval()  # don't train the pre-trained I3D
         self.to(self.device)
+        self.feature_cache: I3DFeatureCache = None  #: If set, the I3D features of the ground truth sequences are taken from/stored to this cache.
 
     def calculate_n_chunks(self, num_frames):
         r"""
@@ -88,31 +96,141 @@ class FrechetVideoDistance(VPMeasure):
 
         return n_chunks, drop_last_chunk
 
-    def forward(self, pred, target):
+    def forward(self, pred, target, reduction="mean"):
+        r"""
+        Calculates the FVD between the given batches of predicted and ground truth sequences.
+
+        Note:
+            The FVD compares feature distributions and is therefore only defined for the batch as a whole.
+            If `reduction` is 'none', the batch value is returned for each sample, so averaging these values
+            over several batches depends on the batch size. To obtain the FVD over several batches,
+            use :meth:`accumulate()` instead.
+
+        Args:
+            pred (torch.Tensor): The predicted frame sequence as a 5D tensor (batch, frames, c, h, w).
+            target (torch.Tensor): The ground truth frame sequence as a 5D tensor (batch, frames, c, h, w)
+            reduction (str): If 'mean', returns the FVD as a scalar. If 'none', returns it once per sample.
+
+        Returns: The calculated FVD (or None if the sequences are too short).
+        """
+        if reduction not in ["mean", "none"]:
+            raise ValueError(f"unknown reduction '{reduction}' (supported: 'mean', 'none')")
         vid_shape = pred.shape
         if vid_shape != target.shape:
             raise ValueError("FrechetVideoDistance.get_distance(pred, target): vid shapes not equal!")
 
-        # determine whether input needs to be chunked for processing
-        num_frames = vid_shape[1]
-        n_chunks, drop_last_chunk = self.calculate_n_chunks(num_frames)
+        features = self.extract_pair_features(pred, target)
+        if features is None:
+            return None
+        pred_features, target_features = features
+        chunk_distances = [calculate_2_wasserstein_dist(pred_features[:, i], target_features[:, i])
+                           for i in range(pred_features.shape[1])]
+        fvd = sum(chunk_distances) / len(chunk_distances)  # mean of chunks
+        return fvd.expand(vid_shape[0]) if reduction == "none" else fvd
+
+    def extract_features(self, x):
+        r"""
+        Extracts the I3D features of the given video sequences. If the sequences are too long, they are split into
+        chunks (see :meth:`calculate_n_chunks()`) and features are extracted for every chunk.
+        Instead of passing each chunk separately, chunks of equal length are passed through the I3D Network together
+        in batches of at most :attr:`_I3D_BATCH_SIZE` chunks.
+
+        Args:
+            x (torch.Tensor): The video sequences as a 5D tensor (batch, frames, c, h, w).
+
+        Returns: The extracted features as a 3D tensor (batch, n_chunks, n_feat) (or None if the sequences are too short).
+        """
+        vid_shape = x.shape
+        n_chunks, drop_last_chunk = self.calculate_n_chunks(vid_shape[1])
         if n_chunks < 1:
             return None
 
         # resize images in video to 224x224 because the I3D network needs that
-        pred = TF.resize(pred.reshape(-1, *vid_shape[2:]), self._I3D_IN_SIZE)
-        target = TF.resize(target.reshape(-1, *vid_shape[2:]), self._I3D_IN_SIZE)
+        x = TF.resize(x.reshape(-1, *vid_shape[2:]), self._I3D_IN_SIZE)
 
         # re-arrange dims for I3D input
-        pred = pred.reshape(*vid_shape[:3], *self._I3D_IN_SIZE).permute((0, 2, 1, 3, 4))  # [b, c, T, 224, 224]
-        target = target.reshape(*vid_shape[:3], *self._I3D_IN_SIZE).permute((0, 2, 1, 3, 4))
+        x = x.reshape(*vid_shape[:3], *self._I3D_IN_SIZE).permute((0, 2, 1, 3, 4))  # [b, c, T, 224, 224]
+        chunks = torch.chunk(x, n_chunks, dim=2)
+        chunks = chunks[:-1] if drop_last_chunk else chunks
+
+        # pass chunks of equal length together, in batches of limited size
+        b = vid_shape[0]
+        chunk_features = [None] * len(chunks)
+        for chunk_l in {chunk.shape[2] for chunk in chunks}:
+            chunk_ids = [i for i, chunk in enumerate(chunks) if chunk.shape[2] == chunk_l]
+            same_l_chunks = torch.cat([chunks[i] for i in chunk_ids], dim=0)  # [len(chunk_ids)*b, c, chunk_l, ...]
+            features = torch.cat([self.i3d.extract_features(batch).flatten(start_dim=1)
+                                  for batch in torch.split(same_l_chunks, self._I3D_BATCH_SIZE)], dim=0)
+            for j, i in enumerate(chunk_ids):
+                chunk_features[i] = features[j * b:(j + 1) * b]
+        return torch.stack(chunk_features, dim=1)
+
+    def extract_pair_features(self, pred, target):
+        r"""
+        Extracts the I3D features of the given predicted and ground truth sequences. Without a feature cache,
+        both are passed through the I3D network together. Otherwise, only the ground truth sequences
+        not found in the cache are passed through the I3D network (and their features are added to the cache).
+
+        Args:
+            pred (torch.Tensor): The predicted frame sequence as a 5D tensor (batch, frames, c, h, w).
+            target (torch.Tensor): The ground truth frame sequence as a 5D tensor (batch, frames, c, h, w)
 
-        pred_chunked = torch.chunk(pred, n_chunks, dim=2)
-        target_chunked = torch.chunk(target, n_chunks, dim=2)
+        Returns: The extracted features of the predictions and the ground truth, each as a 3D tensor
+        (batch, n_chunks, n_feat) (or None if the sequences are too short).
+        """
+        if self.feature_cache is None:
+            features = self.extract_features(torch.cat([pred, target], dim=0))  # [2*b, n_chunks, n]
+            return None if features is None else (features[:pred.shape[0]], features[pred.shape[0]:])
 
-        n_valid_chunks = (n_chunks - 1) if drop_last_chunk else n_chunks
-        chunk_distances = [self.get_distance(pred_chunked[i], target_chunked[i]) for i in range(n_valid_chunks)]
-        return sum(chunk_distances) / n_valid_chunks  # mean of chunks
+        pred_features = self.extract_features(pred)
+        if pred_features is None:
+            return None
+        target_features = self.cached_target_features(target).values()
+        return pred_features, torch.stack([features.to(pred_features.device) for features in target_features])
+
+    def cached_target_features(self, target) -> Dict[str, torch.Tensor]:
+        r"""
+        Obtains the I3D features of the given ground truth sequences from the feature cache, passing the sequences
+        not found in the cache through the I3D network (and adding their features to the cache).
+
+        Args:
+            target (torch.Tensor): The ground truth frame sequence as a 5D tensor (batch, frames, c, h, w)
+
+        Returns: The cache key and features (n_chunks, n_feat) of each given sequence, in order
+        (or an empty dict if the sequences are too short).
+        """
+        if target.shape[1] < self._MIN_T:
+            return dict()
+        keys = self.feature_cache.keys(target)
+        target_features = [self.feature_cache.get(key) for key in keys]
+        missing_ids = [i for i, features in enumerate(target_features) if features is None]
+        if len(missing_ids) > 0:
+            missing_features = self.extract_features(target[missing_ids])
+            for i, features in zip(missing_ids, missing_features):
+                self.feature_cache.put(keys[i], features)
+                target_features[i] = features
+        return dict(zip(keys, target_features))
+
+    def new_accumulator(self):
+        return FVDStatistics()
+
+    def accumulate(self, pred, target, accumulator, horizon_idx=0):
+        r"""
+        Extracts the I3D features of the given batch of predictions and ground truth sequences and adds them to the
+        given :class:`FVDStatistics`, so that a single FVD can be calculated over all accumulated sequences
+        (instead of fitting the feature distributions on each batch separately).
+
+        Args:
+            pred (torch.Tensor): The predicted frame sequence as a 5D tensor (batch, frames, c, h, w).
+            target (torch.Tensor): The ground truth frame sequence as a 5D tensor (batch, frames, c, h, w)
+            accumulator (FVDStatistics): The statistics to add the features to.
+            horizon_idx (int): The index of the prediction horizon the given sequences belong to.
+        """
+        if pred.shape != target.shape:
+            raise ValueError("FrechetVideoDistance.accumulate(pred, target): vid shapes not equal!")
+        features = self.extract_pair_features(pred, target)
+        if features is not None:
+            accumulator.update(horizon_idx, *features)
 
     def get_distance(self, pred, target):
         r"""
@@ -137,6 +255,156 @@ class FrechetVideoDistance(VPMeasure):
         return calculate_2_wasserstein_dist(logits_pred, logits_target)
 
 
+class I3DFeatureCache:
+    r"""
+    Caches the I3D features of ground truth sequences, so that they are computed only once for all tested models
+    and, if a cache file is given, across runs. Each cached entry is identified by the digest of the content and shape
+    of the sequence it has been extracted from, so that cached features can never be confused with those of other
+    data. Cache files are meant to be used for a single dataset configuration and sequence configuration.
+    """
+    def __init__(self, cache_fp: Union[str, Path] = None):
+        r"""
+        Args:
+            cache_fp (Union[str, Path]): If specified, the cache is loaded from/saved to this file.
+        """
+        self.cache_fp = Path(cache_fp) if cache_fp is not None else None
+        self.features: Dict[str, torch.Tensor] = dict()  #: The cached features (n_chunks, n_feat), stored on the CPU.
+        self._new_keys = set()
+        if self.cache_fp is not None and self.cache_fp.exists():
+            self.features = torch.load(self.cache_fp)
+
+    def __len__(self):
+        return len(self.features)
+
+    @staticmethod
+    def keys(x: torch.Tensor) -> List[str]:
+        r"""
+        Args:
+            x (torch.Tensor): The sequences as a 5D tensor (batch, frames, c, h, w).
+
+        Returns: The cache key for each of the given sequences.
+        """
+        x = x.detach().cpu().contiguous()
+        return [f"{hashlib.blake2b(seq.numpy().tobytes(), digest_size=16).hexdigest()}_{'x'.join(map(str, seq.shape))}"
+                for seq in x]
+
+    def get(self, key: str):
+        r"""
+        Returns: The cached features for the given key, or None if not cached.
+        """
+        return self.features.get(key, None)
+
+    def put(self, key: str, features: torch.Tensor):
+        r"""
+        Adds the given features to the cache.
+        """
+        self.features[key] = features.detach().cpu()
+        self._new_keys.add(key)
+
+    def new_features(self) -> Dict[str, torch.Tensor]:
+        r"""
+        Returns: The features that have been added since loading/saving
+        (e.g. for adding them to the cache of another process).
+        """
+        return {key: self.features[key] for key in self._new_keys}
+
+    def save(self):
+        r"""
+        Saves the cache to its cache file (if it has been modified since loading).
+        """
+        if self.cache_fp is None or len(self._new_keys) == 0:
+            return
+        self.cache_fp.parent.mkdir(parents=True, exist_ok=True)
+        tmp_fp = self.cache_fp.with_suffix(".tmp")
+        torch.save(self.features, tmp_fp)
+        os.replace(tmp_fp, self.cache_fp)  # atomic replacement, so that an interrupted save keeps the old cache
+        self._new_keys.clear()
+
+
+class FVDStatistics:
+    r"""
+    Accumulates the I3D features of predictions and ground truth sequences for FVD calculation over a whole dataset.
+    Instead of the features themselves, their sufficient statistics (count, sum and sum of outer products)
+    are kept in double precision for every prediction horizon and chunk, which requires constant memory.
+    """
+    def __init__(self):
+        self.stats = dict()  #: For every horizon index, the count, the feature sums (2, n_chunks, n) and the sums of feature outer products (2, n_chunks, n, n) for prediction and ground truth.
+
+    def _add(self, horizon_idx: int, count: int, sums: torch.Tensor, outer_sums: torch.Tensor):
+        if horizon_idx not in self.stats:
+            self.stats[horizon_idx] = [count, sums.clone(), outer_sums.clone()]
+        else:
+            stats = self.stats[horizon_idx]
+            stats[0] += count
+            stats[1] += sums
+            stats[2] += outer_sums
+
+    def update(self, horizon_idx: int, pred_features: torch.Tensor, target_features: torch.Tensor):
+        r"""
+        Adds the features of a batch of predicted and ground truth sequences.
+
+        Args:
+            horizon_idx (int): The index of the prediction horizon the features belong to.
+            pred_features (torch.Tensor): The chunked prediction features (batch, n_chunks, n_feat).
+            target_features (torch.Tensor): The chunked ground truth features (batch, n_chunks, n_feat).
+        """
+        features = torch.stack([pred_features, target_features]).detach().double().cpu()  # [2, b, n_chunks, n]
+        features = features.transpose(1, 2)  # [2, n_chunks, b, n]
+        self._add(horizon_idx, features.shape[2], features.sum(dim=2), features.transpose(-1, -2) @ features)
+
+    def merge(self, other: "FVDStatistics"):
+        r"""
+        Merges the statistics of another instance into this one.
+
+        Args:
+            other (FVDStatistics): The statistics to merge. They are left unchanged.
+        """
+        for horizon_idx, (count, sums, outer_sums) in other.stats.items():
+            self._add(horizon_idx, count, sums, outer_sums)
+
+    def result(self) -> Dict[int, float]:
+        r"""
+        Returns: For every horizon index, the FVD between the accumulated prediction and ground truth features
+        (averaged over chunks).
+        """
+        results = dict()
+        for horizon_idx, (count, sums, outer_sums) in self.stats.items():
+            fact = 1.0 if count < 2 else 1.0 / (count - 1)
+            mu = sums / count  # [2, n_chunks, n]
+            cov = (outer_sums - count * mu.unsqueeze(-1) * mu.unsqueeze(-2)) * fact  # [2, n_chunks, n, n]
+            chunk_distances = [calculate_frechet_distance(mu[0, i], cov[0, i], mu[1, i], cov[1, i])
+                               for i in range(mu.shape[1])]
+            results[horizon_idx] = (sum(chunk_distances) / len(chunk_distances)).item()
+        return results
+
+
+@full_precision()
+def calculate_frechet_distance(mu_pred, cov_pred, mu_target, cov_target):
+    r"""
+    Calculates the 2-Wasserstein metric (see :func:`calculate_2_wasserstein_dist()`) between two multivariate gaussians
+    that are given by their means and covariance matrices.
+
+    Args:
+        mu_pred (torch.Tensor): The mean of the prediction features (n_feat).
+        cov_pred (torch.Tensor): The covariance matrix of the prediction features (n_feat, n_feat).
+        mu_target (torch.Tensor): The mean of the ground truth features (n_feat).
+        cov_target (torch.Tensor): The covariance matrix of the ground truth features (n_feat, n_feat).
+
+    Returns: The calculated 2-Wasserstein metric as a scalar tensor.
+    """
+    mu_pred, cov_pred, mu_target, cov_target = [t.double() for t in [mu_pred, cov_pred, mu_target, cov_target]]
+
+    # Tr((cov_target * cov_pred)^(1/2)) is the sum of the square roots of the eigenvalues of (cov_pred * cov_target)
+    S = linalg.eigvals(torch.matmul(cov_pred, cov_target)) + 1e-15
+    sq_tr_cov = S.sqrt().abs().sum()
+    trace_term = torch.trace(cov_pred + cov_target) - 2.0 * sq_tr_cov  # scalar
+
+    diff = mu_target - mu_pred
+    mean_term = torch.sum(torch.mul(diff, diff))  # scalar
+    return (trace_term + mean_term).float()
+
+
+@full_precision()
 def calculate_2_wasserstein_dist(pred, target):
     r"""
     Calulates the two components of the 2-Wasserstein metric:
@@ -9,72 +9,126 @@ APPLIES TO ALL LOSSES:
 - expected shape: [b, t, c, h, w] ([b, t, 3, h, w] for LPIPS and SSIM)
 """
 
+from typing import Dict
+
 import torch
-from torch import nn as nn
+import torch.nn.functional as F
 import piqa
 
 from vp_suite.base import VPMeasure
 
 
-class MSE(VPMeasure):
+PIXEL_STATS = {
+    "squared_error": lambda diff: diff.square(),
+    "absolute_error": lambda diff: diff.abs(),
+    "smooth_l1_error": lambda diff: torch.where(diff.abs() < 1.0, 0.5 * diff.square(), diff.abs() - 0.5),
+}  #: The element-wise statistics of the difference between prediction and target that pixel-wise measures are derived from.
+
+
+def pixel_frame_values(pred: torch.Tensor, target: torch.Tensor, measures: Dict[str, "PixelMeasure"]):
+    r"""
+    Calculates the per-frame values of several pixel-wise measures in a single pass over the frames:
+    For each frame, the difference between prediction and target is computed once, and each needed element-wise
+    statistic is summed up right away. Thus, no intermediate tensor is larger than a single frame batch,
+    and measures derived from the same statistic (e.g. MSE and PSNR) share its computation.
+
+    Args:
+        pred (torch.Tensor): The predicted frame sequence as a 5D tensor (batch, frames, c, h, w).
+        target (torch.Tensor): The ground truth frame sequence as a 5D tensor (batch, frames, c, h, w)
+        measures (Dict[str, PixelMeasure]): The pixel-wise measures to calculate.
+
+    Returns: A dictionary containing, for each given measure key, the measurement values as a 2D tensor (batch, frames).
+    """
+    if len(measures) == 0:
+        return dict()
+    if pred.ndim != 5 or target.ndim != 5:
+        raise ValueError("pixel-wise measures expect 5-D inputs!")
+    stat_sums = {measure.PIXEL_STAT: [] for measure in measures.values()}
+    for t in range(pred.shape[1]):
+        diff = pred[:, t] - target[:, t]  # [b, c, h, w]
+        for stat, sums in stat_sums.items():
+            sums.append(PIXEL_STATS[stat](diff).sum(dim=(1, 2, 3)))
+    stat_sums = {stat: torch.stack(sums, dim=1) for stat, sums in stat_sums.items()}  # [b, t]
+    n_values = pred[0, 0].numel()
+    return {key: measure.from_stat_sums(stat_sums[measure.PIXEL_STAT], n_values) for key, measure in measures.items()}
+
+
+class PixelMeasure(VPMeasure):
+    r"""
+    The base class for pixel-wise measures, whose per-frame values are derived from the sum of an element-wise
+    statistic of the difference between prediction and target (see :attr:`PIXEL_STATS`).
+    Multiple pixel-wise measures can be calculated together using :func:`pixel_frame_values()`.
+    """
+    PIXEL_STAT: str = NotImplemented  #: The element-wise statistic the measure is derived from (a key of :attr:`PIXEL_STATS`).
+
+    def frame_values(self, pred, target, target_features=None):
+        return pixel_frame_values(pred, target, {self.NAME: self})[self.NAME]
+
+    @classmethod
+    def from_stat_sums(cls, stat_sums: torch.Tensor, n_values: int):
+        r"""
+        Derives the per-frame measurement values from the per-frame sums of the measure's element-wise statistic.
+        By default, these sums are the measurement values.
+
+        Args:
+            stat_sums (torch.Tensor): The per-frame sums of the element-wise statistic as a 2D tensor (batch, frames).
+            n_values (int): The number of elements per frame (c*h*w).
+
+        Returns: The measurement values as a 2D tensor (batch, frames).
+        """
+        return stat_sums
+
+
+class MSE(PixelMeasure):
     r"""
     This class implements the pixel-wise Mean-Square Error (MSE/L2).
     """
     NAME = "Mean Squared Error (MSE) / L2 Loss"
+    PIXEL_STAT = "squared_error"
 
-    def __init__(self, device):
-        super(MSE, self).__init__(device)
-        self.criterion = nn.MSELoss(reduction="none").to(device)
 
-
-class L1(VPMeasure):
+class L1(PixelMeasure):
     r"""
     This class implements the pixel-wise Mean Absolute Error (MAE/L1).
     """
     NAME = "Mean Absolute Error (MAE) / L1 Loss"
-
-    def __init__(self, device):
-        super(L1, self).__init__(device)
-        self.criterion = nn.L1Loss(reduction="none").to(device)
+    PIXEL_STAT = "absolute_error"
 
 
-class SmoothL1(VPMeasure):
+class SmoothL1(PixelMeasure):
     r"""
     This class implements a smoothed L1 Loss, resembling the MSE/L2 loss for smaller discrepancies and
     transitioning to the MAE/L1 loss for larger discrepancies.
     """
     NAME = "Smooth L1 Loss"
-    
-    def __init__(self, device):
-        super(SmoothL1, self).__init__(device)
-        self.criterion = nn.SmoothL1Loss(reduction="none").to(device)
+    PIXEL_STAT = "smooth_l1_error"
 
 
-class PSNR(VPMeasure):
+class PSNR(PixelMeasure):
     r"""
     This class implements the Peak Signal-to-Noise Ratio, which is related to the MSE.
     """
     NAME = "Peak Signal to Noise Ratio (PSNR)"
     BIGGER_IS_BETTER = True
     OPT_VALUE = float("inf")
+    PIXEL_STAT = "squared_error"
 
-    def __init__(self, device):
-        super(PSNR, self).__init__(device)
-        self.criterion = nn.MSELoss(reduction="none").to(device)
-
-    def forward(self, pred, target):
-        if pred.ndim != 5 or target.ndim != 5:
-            raise ValueError(f"{self.NAME} expects 5-D inputs!")
-        b, t, _, _, _ = pred.shape
-        mses = self.criterion(pred, target).mean(dim=(-1, -2, -3))  # [b, t]
-        psnr_losses = torch.log10(mses) * 10
-        return psnr_losses.mean(dim=1).mean(dim=0)
+    @classmethod
+    def from_stat_sums(cls, stat_sums, n_values):
+        return torch.log10(stat_sums / n_values) * 10
 
     @classmethod
     def to_display(cls, x):
         return -x
 
 
+def _reshape_clamp(x: torch.Tensor):
+    r"""
+    Reshapes and clamps a single input tensor like :meth:`VPMeasure.reshape_clamp()`.
+    """
+    return ((x.reshape(-1, *x.shape[2:]) + 1) / 2).clamp_(min=0.0, max=1.0)  # [b*t, ...], range: [0., 1.]
+
+
 class LPIPS(VPMeasure):
     r"""
     This class implements the "Learned Perceptual Image Patch Similarity (LPIPS)"
@@ -87,13 +141,32 @@ class LPIPS(VPMeasure):
 
     def __init__(self, device):
         super(LPIPS, self).__init__(device)
-        self.criterion = piqa.lpips.LPIPS().to(device)
+        self.criterion = piqa.lpips.LPIPS(reduction="none").to(device)
+
+    def _unit_features(self, target):
+        r"""
+        Returns the normalized activations of the perceptual network layers for the given [b*t, 3, h, w] input.
+        """
+        features = self.criterion.net((target - self.criterion.shift) / self.criterion.scale)
+        return [f / torch.linalg.norm(f, dim=1, keepdim=True) for f in features]
 
-    def forward(self, pred, target):
+    def extract_target_features(self, target):
+        if target.shape[2] != 3:
+            raise ValueError(f"{self.NAME} needs 3-channel images with the channels at dim 2")
+        return self._unit_features(_reshape_clamp(target))
+
+    def frame_values(self, pred, target, target_features=None):
         if pred.shape[2] != 3 or target.shape[2] != 3:
             raise ValueError(f"{self.NAME} needs 3-channel images with the channels at dim 2")
-        pred, target = self.reshape_clamp(pred, target)
-        return self.criterion(pred, target)
+        b, t = pred.shape[:2]
+        if target_features is None:
+            pred, target = self.reshape_clamp(pred, target)
+            return self.criterion(pred, target).reshape(b, t)
+
+        lpips = 0
+        for lin, fx, fy in zip(self.criterion.lins, self._unit_features(_reshape_clamp(pred)), target_features):
+            lpips = lpips + lin(((fx - fy) ** 2).mean(dim=(-1, -2), keepdim=True)).flatten()
+        return lpips.reshape(b, t)
 
 
 class SSIM(VPMeasure):
@@ -105,16 +178,46 @@ class SSIM(VPMeasure):
     REFERENCE = "https://ieeexplore.ieee.org/document/1284395"
     BIGGER_IS_BETTER = True
     OPT_VALUE = 1
+    _C1 = 0.01 ** 2  #: The stabilizing constant for the luminance term (for a value range of 1).
+    _C2 = 0.03 ** 2  #: The stabilizing constant for the contrast/structure term (for a value range of 1).
 
     def __init__(self, device):
         super(SSIM, self).__init__(device)
-        self.criterion = piqa.ssim.SSIM().to(device)
+        self.criterion = piqa.ssim.SSIM(reduction="none").to(device)
+
+    def _blur(self, x):
+        r"""
+        Applies the criterion's separable gaussian window to the given [b*t, c, h, w] tensor (without padding).
+        """
+        kernel, c = self.criterion.kernel, x.shape[1]  # kernel: [c, 1, k]
+        x = F.conv2d(x, kernel.unsqueeze(-1), groups=c)
+        return F.conv2d(x, kernel.unsqueeze(-2), groups=c)
+
+    def extract_target_features(self, target):
+        if target.shape[2] != 3:
+            raise ValueError(f"{self.NAME} needs 3-channel images with the channels at dim 2")
+        y = _reshape_clamp(target)
+        mu_y = self._blur(y)
+        mu_yy = mu_y ** 2
+        return y, mu_y, mu_yy, self._blur(y ** 2) - mu_yy  # local statistics of the target
 
-    def forward(self, pred, target):
+    def frame_values(self, pred, target, target_features=None):
         if pred.shape[2] != 3 or target.shape[2] != 3:
             raise ValueError(f"{self.NAME} needs 3-channel images with the channels at dim 2")
-        pred, target = self.reshape_clamp(pred, target)
-        return 1.0 - self.criterion(pred, target)
+        b, t = pred.shape[:2]
+        if target_features is None:
+            pred, target = self.reshape_clamp(pred, target)
+            return 1.0 - self.criterion(pred, target).reshape(b, t)
+
+        x = _reshape_clamp(pred)
+        y, mu_y, mu_yy, sigma_yy = target_features
+        mu_x = self._blur(x)
+        mu_xx, mu_xy = mu_x ** 2, mu_x * mu_y
+        sigma_xx = self._blur(x ** 2) - mu_xx
+        sigma_xy = self._blur(x * y) - mu_xy
+        cs = (2 * sigma_xy + self._C2) / (sigma_xx + sigma_yy + self._C2)
+        ss = (2 * mu_xy + self._C1) / (mu_xx + mu_yy + self._C1) * cs
+        return 1.0 - ss.flatten(start_dim=1).mean(dim=-1).reshape(b, t)
 
     @classmethod
     def to_display(cls, x):
@@ -1,6 +1,7 @@
 import warnings
 import torch
 from vp_suite.measure import LOSS_CLASSES
+from vp_suite.measure.image_wise import PixelMeasure, pixel_frame_values
 
 
 class PredictionLossProvider:
@@ -10,12 +11,12 @@ class PredictionLossProvider:
 
         Attributes:
             device (str): A string specifying whether to use the GPU for calculations (`cuda`) or the CPU (`cpu`).
-            losses (dict): The concrete instantiated losses that the loss provider uses when provided with input tensors.
+            losses (dict): The concrete instantiated losses that the loss provider uses when provided with input tensors (instances are shared within the process).
     """
     def __init__(self, config: dict):
         r"""
         Initializes the provider by extracting device and loss IDs from the provided config dict
-        and instantiating the losses that shall be used.
+        and obtaining the (shared) instances of the losses that shall be used.
 
         Args:
             config (dict): A dictionary containing the devices and losses to use. The provided losses come with the scales that should be multiplied by the respective loss value.
@@ -25,9 +26,9 @@ class PredictionLossProvider:
         if "fvd" in loss_scales.keys() and config["img_c"] not in [2, 3]:
             warnings.warn("'FVD' measure won't be used since image channels needs to be in [2, 3]")
             loss_scales.pop("fvd")
-        self.losses = {k: (LOSS_CLASSES[k](device=self.device), scale) for k, scale in loss_scales.items()}
+        self.losses = {k: (LOSS_CLASSES[k].get_shared(device=self.device), scale) for k, scale in loss_scales.items()}
 
-    def get_losses(self, pred: torch.Tensor, target: torch.Tensor):
+    def get_losses(self, pred: torch.Tensor, target: torch.Tensor, reduction: str = "mean", accumulators: dict = None):
         r"""
         Takes in tensors of predicted frames and the corresponding ground truth and calculates the losses for
         the loss classes instantiated previously. Each loss
@@ -35,6 +36,8 @@ class PredictionLossProvider:
         Args:
             pred (torch.Tensor): The predicted frame sequence as a 5D float tensor (batch, frames, c, h, w).
             target (torch.Tensor): The ground truth frame sequence as a 5D float tensor (batch, frames, c, h, w)
+            reduction (str): If 'mean', the losses are averaged over the batch. If 'none', all returned values are per-sample tensors (batch).
+            accumulators (dict): If specified, accumulatable losses (e.g. FVD, which is not defined per sample) are not calculated on the given batch. Instead, the batch is added to the loss's accumulator in this dictionary (which is created if not yet present), and the loss is left out of the returned values and the total loss.
 
         Returns:
             1. A dictionary containing the loss IDs and the corresponding values of each loss in display representation.
@@ -44,10 +47,22 @@ class PredictionLossProvider:
         if pred.shape != target.shape:
             raise ValueError("Output images and target images are of different shape!")
 
+        # pixel-wise losses are calculated together in a single pass
+        pixel_losses = {key: loss for key, (loss, _) in self.losses.items() if isinstance(loss, PixelMeasure)}
+        pixel_frame_vals = pixel_frame_values(pred, target, pixel_losses)
+
         loss_display_values, total_loss = {}, torch.tensor(0.0, device=self.device)
         for key, (loss, scale) in self.losses.items():
-            val = loss(pred, target)
-            total_loss += scale * val
+            if accumulators is not None and loss.ACCUMULATABLE:
+                if key not in accumulators:
+                    accumulators[key] = loss.new_accumulator()
+                loss.accumulate(pred, target, accumulators[key])
+                continue
+            if key in pixel_frame_vals:
+                val = loss.reduce(pixel_frame_vals[key].mean(dim=1), reduction)
+            else:
+                val = loss(pred, target, reduction=reduction)
+            total_loss = total_loss + scale * val
             loss_display_values[key] = loss.to_display(val)
 
         return loss_display_values, total_loss
@@ -3,6 +3,7 @@ import warnings
 import torch
 
 from vp_suite.measure import METRIC_CLASSES
+from vp_suite.measure.image_wise import PixelMeasure, pixel_frame_values
 
 
 class PredictionMetricProvider:
@@ -13,12 +14,12 @@ class PredictionMetricProvider:
         Attributes:
             device (str): A string specifying whether to use the GPU for calculations (`cuda`) or the CPU (`cpu`).
             available_metrics (dict): A dictionary containing the string identifiers and corresponding metrics that the metric provider should use when provided with input tensors.
-            metrics (dict): The concrete instantiated metrics that the metric provider uses when provided with input tensors.
+            metrics (dict): The concrete instantiated metrics that the metric provider uses when provided with input tensors (instances are shared within the process).
     """
     def __init__(self, config: dict):
         r"""
         Initializes the provider by extracting device and metric IDs from the provided config dict
-        and instantiating the metrics that shall be used.
+        and obtaining the (shared) instances of the metrics that shall be used.
 
         Args:
             config (dict): A dictionary containing the devices and metrics to use.
@@ -29,9 +30,10 @@ class PredictionMetricProvider:
         if config["img_c"] not in [2, 3]:
             warnings.warn("'FVD' measure won't be used since image channels needs to be in [2, 3]")
             self.available_metrics.pop("fvd")
-        self.metrics = {k: metric(device=self.device) for k, metric in self.available_metrics.items()}
+        self.metrics = {k: metric.get_shared(device=self.device) for k, metric in self.available_metrics.items()}
 
-    def get_metrics(self, pred: torch.Tensor, target: torch.Tensor, frames: int = None, all_frame_cnts: bool = False):
+    def get_metrics(self, pred: torch.Tensor, target: torch.Tensor, frames: int = None, all_frame_cnts: bool = False,
+                    reduction: str = "mean", accumulators: dict = None, target_features: dict = None):
         r"""
         Takes in tensors of predicted frames and the corresponding ground truth and calculates the metric scores for
         the metrics instantiated previously.
@@ -42,6 +44,9 @@ class PredictionMetricProvider:
 
             frames (int): If frames is specified, only considers the first 'frames' frames.
             all_frame_cnts (bool): If set to true, elicits metrics for all prediction horizons from 1 up to the maximum number of frames. Otherwise, just elicits metrics for the specified number of frames
+            reduction (str): If 'mean', each metric value is averaged over the batch. If 'none', each metric value is a list containing one value per sample.
+            accumulators (dict): If specified, accumulatable metrics (e.g. FVD) are not calculated on the given batch. Instead, the batch is added to the metric's accumulator in this dictionary (which is created if not yet present), so that the metric can later be obtained over all accumulated batches.
+            target_features (dict): If specified, the target features of metrics that compare features of prediction and target (e.g. LPIPS, SSIM) are taken from/stored to this dictionary. When assessing multiple predictions of the same target (e.g. of different models), passing the same dictionary avoids re-computing the target features.
 
         Returns:
             A list of dictionaries, where each dictionary contains the metric ids
@@ -55,19 +60,96 @@ class PredictionMetricProvider:
         target = target.contiguous()
         frames = frames or pred.shape[1]
 
+        horizons = [frames] if not all_frame_cnts else list(range(1, frames + 1))
+        pred, target = pred[:, :frames], target[:, :frames]
+        if target_features is not None:
+            if "target" in target_features and not torch.equal(target_features["target"], target):
+                target_features.clear()  # stored features belong to a different target
+            target_features["target"] = target
+
+        # frame-wise metrics are assessed once per frame, and the value of each horizon is the mean over its frames.
+        # Sequence-level metrics have to be assessed (or accumulated, if requested) separately for every horizon.
+        # pixel-wise metrics are calculated together in a single pass
+        pixel_metrics = {key: metric for key, metric in self.metrics.items() if isinstance(metric, PixelMeasure)}
+        pixel_frame_vals = pixel_frame_values(pred, target, pixel_metrics)
+        horizon_vals = dict()
+        for key, metric in self.metrics.items():
+            if accumulators is not None and metric.ACCUMULATABLE:
+                display_key = self.display_key(key)
+                if display_key not in accumulators:
+                    accumulators[display_key] = metric.new_accumulator()
+                for i, frame_cnt in enumerate(horizons):
+                    metric.accumulate(pred[:, :frame_cnt], target[:, :frame_cnt], accumulators[display_key], i)
+            elif metric.FRAME_WISE:
+                if key in pixel_frame_vals:
+                    frame_vals = pixel_frame_vals[key]
+                elif target_features is not None:
+                    if key not in target_features:
+                        target_features[key] = metric.extract_target_features(target)
+                    frame_vals = metric.frame_values(pred, target, target_features=target_features[key])
+                else:
+                    frame_vals = metric.frame_values(pred, target)
+                frame_vals = frame_vals.double()  # [b, t]
+                frame_cnts = torch.arange(1, frames + 1, dtype=frame_vals.dtype, device=frame_vals.device)
+                cum_means = frame_vals.cumsum(dim=1) / frame_cnts  # [b, t]
+                horizon_vals[key] = [cum_means[:, frame_cnt - 1] for frame_cnt in horizons]
+            else:
+                horizon_vals[key] = [metric(pred[:, :frame_cnt], target[:, :frame_cnt], reduction="none")
+                                     for frame_cnt in horizons]
+
         metrics = []
-        frames = [frames] if not all_frame_cnts else range(1, frames + 1)
-        for frame_cnt in frames:
-            pred_ = pred[:, :frame_cnt]
-            target_ = target[:, :frame_cnt]
+        for i in range(len(horizons)):
             frame_cnt_metrics = dict()
             for key, metric in self.metrics.items():
-                metric_val = metric(pred_, target_)
-                if metric_val is not None:
-                    frame_cnt_metrics[f"{key} ({'↑' if metric.BIGGER_IS_BETTER else '↓'})"] \
-                        = metric.to_display(metric_val.item())
-            # remove metrics that returned 'None' (e.g. because they don't support the current frame cnt
-            frame_cnt_metrics = {k: v for k, v in frame_cnt_metrics.items() if v is not None}
+                metric_val = horizon_vals[key][i] if key in horizon_vals else None
+                # skip metrics that returned 'None' (e.g. because they don't support the current frame cnt)
+                if metric_val is None:
+                    continue
+                if reduction == "mean":
+                    metric_val = metric.to_display(metric_val.mean().item())
+                elif reduction == "none":
+                    metric_val = [metric.to_display(v) for v in metric_val.tolist()]
+                else:
+                    raise ValueError(f"unknown reduction '{reduction}' (supported: 'mean', 'none')")
+                frame_cnt_metrics[self.display_key(key)] = metric_val
             metrics.append(frame_cnt_metrics)
 
         return metrics
+
+    def extract_target_features(self, target: torch.Tensor, frames: int = None, all_frame_cnts: bool = False) -> dict:
+        r"""
+        Extracts the target features of all metrics that compare features of prediction and target
+        (e.g. LPIPS, SSIM) for the given ground truth, so that they can be computed once and then be passed to
+        :meth:`get_metrics()` (possibly in other processes) for multiple predictions of this ground truth.
+        If the FVD measure has a feature cache, the I3D features of the ground truth sequences of all assessed
+        horizons are obtained through it and included as well.
+
+        Args:
+            target (torch.Tensor): The ground truth frame sequence as a 5D float tensor (batch, frames, c, h, w)
+            frames (int): If frames is specified, only considers the first 'frames' frames.
+            all_frame_cnts (bool): If set to true, the I3D features are obtained for all prediction horizons from 1 up to the maximum number of frames, as needed by :meth:`get_metrics()` with `all_frame_cnts=True`.
+
+        Returns: The target features, to be passed to :meth:`get_metrics()` as `target_features`.
+        The I3D features are stored under the FVD's key, as a dictionary of feature cache entries.
+        """
+        target = target.contiguous()
+        frames = frames or target.shape[1]
+        horizons = [frames] if not all_frame_cnts else list(range(1, frames + 1))
+        target = target[:, :frames]
+        target_features = {"target": target}
+        for key, metric in self.metrics.items():
+            if metric.FRAME_WISE and not isinstance(metric, PixelMeasure):
+                target_features[key] = metric.extract_target_features(target)
+            elif getattr(metric, "feature_cache", None) is not None:
+                target_features[key] = {cache_key: features for frame_cnt in horizons for cache_key, features
+                                        in metric.cached_target_features(target[:, :frame_cnt]).items()}
+        return target_features
+
+    def display_key(self, key: str):
+        r"""
+        Args:
+            key (str): The string identifier of a metric.
+
+        Returns: The key under which the metric's values are reported, which also indicates the direction of improvement.
+        """
+        return f"{key} ({'↑' if self.metrics[key].BIGGER_IS_BETTER else '↓'})"
@@ -0,0 +1,117 @@
+r"""
+This module contains the :class:`AsyncMetricPipeline`, which computes metrics in background threads so that
+model inference and metric computation can overlap.
+"""
+import queue
+import threading
+from typing import List, Tuple
+
+import torch
+
+from vp_suite.measure.aggregation import MetricAggregator
+from vp_suite.measure.metric_provider import PredictionMetricProvider
+
+
+class AsyncMetricPipeline:
+    r"""
+    Computes the metrics of submitted predictions in worker threads and adds them to the corresponding
+    :class:`MetricAggregator`. Jobs are passed through a bounded queue, so that submitting blocks if the workers fall
+    behind (backpressure). Each job's metrics are first collected in a separate aggregator, which is merged into the
+    corresponding target aggregator strictly in submission order, so that the aggregated results don't depend on
+    the order in which the workers finish.
+
+    Note:
+        As PyTorch releases the GIL during tensor operations, the worker threads actually run concurrently to the
+        model inference in the main thread.
+    """
+    def __init__(self, metric_provider: PredictionMetricProvider, num_workers: int = 1, queue_size: int = 8,
+                 accumulate: bool = False):
+        r"""
+        Args:
+            metric_provider (PredictionMetricProvider): The metric provider used to compute the metrics.
+            num_workers (int): The number of worker threads.
+            queue_size (int): The maximum number of pending jobs. If reached, submitting blocks until a job is taken.
+            accumulate (bool): If set to True, accumulatable metrics (e.g. FVD) are accumulated instead of being calculated per batch.
+        """
+        if num_workers < 1:
+            raise ValueError(f"number of metric workers needs to be positive (given: {num_workers})")
+        self.metric_provider = metric_provider
+        self.accumulate = accumulate
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._results = dict()
+        self._next_submit_idx, self._next_commit_idx = 0, 0
+        self._error = None
+        self._workers = [threading.Thread(target=self._work, daemon=True) for _ in range(num_workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, job: List[Tuple[MetricAggregator, torch.Tensor, torch.Tensor]], target_features: dict = None):
+        r"""
+        Submits a job, blocking if the queue is full.
+
+        Args:
+            job (List[Tuple[MetricAggregator, torch.Tensor, torch.Tensor]]): A list of (aggregator, prediction, target)
+                triplets, e.g. the predictions of all tested models on the same batch.
+                The target features of LPIPS/SSIM are shared within a job.
+            target_features (dict): If specified, the job's target features have already been extracted (see :meth:`PredictionMetricProvider.extract_target_features()`).
+        """
+        self._raise_error()
+        self._queue.put((self._next_submit_idx, job, target_features))
+        self._next_submit_idx += 1
+
+    def finish(self):
+        r"""
+        Waits until all submitted jobs have been processed and stops the workers.
+        Re-raises the first error that occurred in a worker (if any).
+        """
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise RuntimeError("metric computation failed") from self._error
+
+    def _process(self, job, target_features):
+        target_features = dict() if target_features is None else target_features
+        results = []
+        for aggregator, pred, target in job:
+            job_aggregator = MetricAggregator()
+            accumulators = job_aggregator.accumulators if self.accumulate else None
+            cur_metrics = self.metric_provider.get_metrics(pred, target, all_frame_cnts=True, reduction="none",
+                                                           accumulators=accumulators,
+                                                           target_features=target_features)
+            job_aggregator.update(cur_metrics)
+            results.append((aggregator, job_aggregator))
+        return results
+
+    def _work(self):
+        with torch.inference_mode():  # inference mode is thread-local
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                job_idx, job, target_features = item
+                try:
+                    results = self._process(job, target_features)
+                except Exception as e:
+                    results = e
+                with self._lock:
+                    self._results[job_idx] = results
+                    self._commit()
+
+    def _commit(self):
+        r"""
+        Merges all finished job results that are next in submission order (called with the lock held).
+        """
+        while self._next_commit_idx in self._results:
+            results = self._results.pop(self._next_commit_idx)
+            self._next_commit_idx += 1
+            if isinstance(results, Exception):
+                self._error = self._error or results
+                continue
+            for aggregator, job_aggregator in results:
+                aggregator.merge(job_aggregator)
@@ -2,6 +2,7 @@ from torch import nn
 import torch
 
 from vp_suite.base import VPModelBlock
+from vp_suite.utils.memory_format import match_memory_format, stack_frames
 
 
 class ConvLSTM(VPModelBlock):
@@ -43,6 +44,7 @@ class ConvLSTM(VPModelBlock):
                             dtype=torch.float, device=self.device)
             h = torch.zeros((b, self.enc_c, self.state_h, self.state_w),
                             dtype=torch.float, device=self.device)
+            c, h = match_memory_format(c, inputs), match_memory_format(h, inputs)
         else:
             h, c = states
             b = h.shape[0]
@@ -54,6 +56,7 @@ class ConvLSTM(VPModelBlock):
             if inputs is None:
                 x = torch.zeros((b, self.in_c, self.state_h,
                                  self.state_w), dtype=torch.float, device=self.device)
+                x = match_memory_format(x, h)
             else:
                 x = inputs[:, t]  # mustn't be None. Should be zero on first decoder step
             cat_x = torch.cat([x, h], dim=1)
@@ -67,5 +70,5 @@ class ConvLSTM(VPModelBlock):
             o = torch.sigmoid(o+self.Wco*c)
             h = o*torch.tanh(c)
             outputs.append(h)
-        return torch.stack(outputs, dim=1), (h, c)
+        return stack_frames(outputs), (h, c)
 
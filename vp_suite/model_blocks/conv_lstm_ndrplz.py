@@ -2,6 +2,7 @@ import torch.nn as nn
 import torch
 
 from vp_suite.base import VPModelBlock
+from vp_suite.utils.memory_format import match_memory_format, stack_frames
 
 
 class ConvLSTMCell(nn.Module):
@@ -102,6 +103,7 @@ class ConvLSTM(VPModelBlock):
         else:
             # Since the init is done in forward. Can send image size here
             hidden_state = self._init_hidden(batch_size=b, image_size=(h, w))
+            hidden_state = [[match_memory_format(s, input_tensor) for s in state] for state in hidden_state]
 
         layer_output_list = []
         last_state_list = []
@@ -118,7 +120,7 @@ class ConvLSTM(VPModelBlock):
                                                  cur_state=[h, c])
                 output_inner.append(h)
 
-            layer_output = torch.stack(output_inner, dim=1)
+            layer_output = stack_frames(output_inner)
             cur_layer_input = layer_output
 
             layer_output_list.append(layer_output)
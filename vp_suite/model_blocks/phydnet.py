@@ -6,6 +6,7 @@ from scipy.special import factorial
 from torch import nn as nn
 
 from vp_suite.base import VPModelBlock
+from vp_suite.utils.memory_format import match_memory_format
 from vp_suite.model_blocks.conv_lstm_ndrplz import ConvLSTMCell
 from vp_suite.model_blocks.conv import DCGANConv, DCGANConvTranspose
 
@@ -96,6 +97,7 @@ class PhyCell(VPModelBlock):
         batch_size = frame.data.size()[0]
         if (first_timestep):
             self.init_hidden(batch_size)  # init Hidden at each forward start
+            self.H = [match_memory_format(h, frame) for h in self.H]
 
         for j, cell in enumerate(self.cell_list):
             if j == 0:  # bottom layer
@@ -148,6 +150,8 @@ class SingleStepConvLSTM(nn.Module):
         batch_size = frame.data.size()[0]
         if first_timestep:
             self.init_hidden(batch_size)  # init Hidden at each forward start
+            self.H = [match_memory_format(h, frame) for h in self.H]
+            self.C = [match_memory_format(c, frame) for c in self.C]
 
         input = frame
         if self.action_conditional:
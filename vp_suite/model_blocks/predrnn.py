@@ -2,6 +2,7 @@ import torch
 from torch import nn as nn
 
 from vp_suite.base import VPModelBlock
+from vp_suite.utils.memory_format import match_memory_format
 
 
 class SpatioTemporalLSTMCell(VPModelBlock):
@@ -55,9 +56,10 @@ class SpatioTemporalLSTMCell(VPModelBlock):
 
 
     def forward(self, x_t, h_t, c_t, m_t):
-        x_concat = self.conv_x(x_t)
-        h_concat = self.conv_h(h_t)
-        m_concat = self.conv_m(m_t)
+        # layer norm outputs are in the default memory format -> convert back if running in channels_last
+        x_concat = match_memory_format(self.conv_x(x_t), x_t)
+        h_concat = match_memory_format(self.conv_h(h_t), x_t)
+        m_concat = match_memory_format(self.conv_m(m_t), x_t)
         i_x, f_x, g_x, i_x_prime, f_x_prime, g_x_prime, o_x = torch.split(x_concat, self.num_hidden, dim=1)
         i_h, f_h, g_h, o_h = torch.split(h_concat, self.num_hidden, dim=1)
         i_m, f_m, g_m = torch.split(m_concat, self.num_hidden, dim=1)
@@ -77,7 +79,7 @@ class SpatioTemporalLSTMCell(VPModelBlock):
         m_new = f_t_prime * m_t + delta_m
 
         mem = torch.cat((c_new, m_new), 1)
-        o_t = torch.sigmoid(o_x + o_h + self.conv_o(mem))
+        o_t = torch.sigmoid(o_x + o_h + match_memory_format(self.conv_o(mem), x_t))
         h_new = o_t * torch.tanh(self.conv_last(mem))
 
         return h_new, c_new, m_new, delta_c, delta_m
@@ -140,10 +142,11 @@ class ActionConditionalSpatioTemporalLSTMCell(VPModelBlock):
         self.conv_last = nn.Conv2d(num_hidden * 2, num_hidden, kernel_size=1, stride=1, padding=0)
 
     def forward(self, x_t, h_t, c_t, m_t, a_t):
-        x_concat = self.conv_x(x_t)
-        h_concat = self.conv_h(h_t)
-        a_concat = self.conv_a(a_t)
-        m_concat = self.conv_m(m_t)
+        # layer norm outputs are in the default memory format -> convert back if running in channels_last
+        x_concat = match_memory_format(self.conv_x(x_t), x_t)
+        h_concat = match_memory_format(self.conv_h(h_t), x_t)
+        a_concat = match_memory_format(self.conv_a(a_t), x_t)
+        m_concat = match_memory_format(self.conv_m(m_t), x_t)
         i_x, f_x, g_x, i_x_prime, f_x_prime, g_x_prime, o_x = torch.split(x_concat, self.num_hidden, dim=1)
         i_h, f_h, g_h, o_h = torch.split(h_concat * a_concat, self.num_hidden, dim=1)
         i_m, f_m, g_m = torch.split(m_concat, self.num_hidden, dim=1)
@@ -163,7 +166,7 @@ class ActionConditionalSpatioTemporalLSTMCell(VPModelBlock):
         m_new = f_t_prime * m_t + delta_m
 
         mem = torch.cat((c_new, m_new), 1)
-        o_t = torch.sigmoid(o_x + o_h + self.conv_o(mem))
+        o_t = torch.sigmoid(o_x + o_h + match_memory_format(self.conv_o(mem), x_t))
         h_new = o_t * torch.tanh(self.conv_last(mem))
 
         return h_new, c_new, m_new, delta_c, delta_m
@@ -3,6 +3,7 @@ from torch import nn
 import torch.nn.functional as F
 
 from vp_suite.base import VPModelBlock
+from vp_suite.utils.memory_format import match_memory_format, stack_frames
 
 
 class Activation():
@@ -172,6 +173,7 @@ class TrajGRU(BaseConvRNN):
         if states is None:
             states = torch.zeros((inputs.shape[0], self._num_filter, self._state_height, self._state_width),
                                  dtype=torch.float, device=self.device)
+            states = match_memory_format(states, inputs)
 
         if inputs is not None:
             b, _, c, h, w = inputs.shape
@@ -211,4 +213,4 @@ class TrajGRU(BaseConvRNN):
             outputs.append(next_h)
             prev_h = next_h
 
-        return torch.stack(outputs, dim=1), next_h
+        return stack_frames(outputs), next_h
@@ -3,6 +3,7 @@ from torch import nn as nn
 from torchvision import transforms as TF
 
 from vp_suite.base import VPModel
+from vp_suite.utils.memory_format import stack_frames
 
 
 class LSTM(VPModel):
@@ -43,10 +44,10 @@ class LSTM(VPModel):
             inflated_action_size = self.bottleneck_dim // 10
             self.bottleneck_dim += inflated_action_size
             self.action_inflate = nn.Linear(self.action_size, inflated_action_size)
-        self.rnn_layers = [
+        self.rnn_layers = nn.ModuleList([
             nn.LSTMCell(input_size=self.bottleneck_dim, hidden_size=self.lstm_hidden_dim, device=self.device)
             for _ in range(self.lstm_num_layers)
-        ]
+        ])
         self.from_linear = nn.Linear(self.lstm_hidden_dim, self.encoded_numel)
         self.dec1 = nn.ConvTranspose2d(256, 128, kernel_size=3, stride=2, padding=1)
         self.dec2 = nn.ConvTranspose2d(128, 64, kernel_size=3, stride=2, padding=1)
@@ -110,5 +111,5 @@ class LSTM(VPModel):
             preds.append(self.decode(output))
 
         # prepare for return
-        preds = torch.stack(preds, dim=1)  # output is [b, t, c, h, w] again
+        preds = stack_frames(preds)  # output is [b, t, c, h, w] again
         return preds, None
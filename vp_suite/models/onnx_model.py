@@ -0,0 +1,163 @@
+import json
+from pathlib import Path
+from typing import Union
+
+import torch
+from torch import nn as nn
+
+from vp_suite.base import VPModel
+
+ONNX_OPSET_VERSION = 13  #: The ONNX opset version used for exporting models.
+
+
+class _ExportWrapper(nn.Module):
+    r"""
+    Exposes the prediction of a video prediction model for a fixed number of predicted frames
+    as a function of the input frames (and actions) only.
+    """
+    def __init__(self, model: VPModel, pred_frames: int):
+        super(_ExportWrapper, self).__init__()
+        self.model = model
+        self.pred_frames = pred_frames
+
+    def forward(self, frames, actions=None):
+        if actions is None:
+            return self.model(frames, pred_frames=self.pred_frames)[0]
+        return self.model(frames, pred_frames=self.pred_frames, actions=actions)[0]
+
+
+def export_onnx(model: VPModel, fp: Union[str, Path], context_frames: int, pred_frames: int,
+                opset_version: int = ONNX_OPSET_VERSION):
+    r"""
+    Exports the given model to an ONNX graph that predicts `pred_frames` frames from `context_frames` context frames
+    (the batch dimension remains dynamic). The model configuration needed to run the exported graph as a
+    :class:`ONNXModel` is saved next to the graph file, as a JSON file of the same name.
+
+    Args:
+        model (VPModel): The model to export.
+        fp (Union[str, Path]): The file path of the exported graph.
+        context_frames (int): The number of context frames the exported graph takes as input.
+        pred_frames (int): The number of frames the exported graph predicts.
+        opset_version (int): The ONNX opset version to export to.
+    """
+    fp = Path(fp)
+    input_frames = context_frames + pred_frames if model.NEEDS_COMPLETE_INPUT else context_frames
+    device = next(model.parameters(), torch.empty(0)).device
+    example_inputs = [torch.zeros(1, input_frames, *model.img_shape, device=device)]
+    input_names, dynamic_axes = ["frames"], {"frames": {0: "batch"}, "predictions": {0: "batch"}}
+    if model.action_conditional:
+        example_inputs.append(torch.zeros(1, context_frames + pred_frames - 1, model.action_size, device=device))
+        input_names.append("actions")
+        dynamic_axes["actions"] = {0: "batch"}
+
+    was_training = model.training
+    model.eval()
+    try:
+        with torch.no_grad():
+            torch.onnx.export(_ExportWrapper(model, pred_frames), tuple(example_inputs), str(fp),
+                              input_names=input_names, output_names=["predictions"], dynamic_axes=dynamic_axes,
+                              opset_version=opset_version)
+    finally:
+        model.train(was_training)
+
+    onnx_config = {
+        "NAME": model.NAME,
+        "img_shape": list(model.img_shape),
+        "action_size": model.action_size,
+        "tensor_value_range": list(model.tensor_value_range),
+        "action_conditional": model.action_conditional,
+        "can_handle_actions": model.CAN_HANDLE_ACTIONS,
+        "needs_complete_input": model.NEEDS_COMPLETE_INPUT,
+        "context_frames": context_frames,
+        "pred_frames": pred_frames,
+        "exported_model_config": model.config,
+    }
+    with open(str(fp.with_suffix(".json")), "w") as onnx_config_file:
+        json.dump(onnx_config, onnx_config_file, indent=4,
+                  default=lambda o: str(o) if callable(getattr(o, "__str__", None)) else '<not serializable>')
+
+
+class ONNXModel(VPModel):
+    r"""
+    This class wraps a video prediction model that has been exported to ONNX (see :func:`export_onnx()`) and runs
+    its graph with onnxruntime. It can be used like the other models for testing and visualization, but only for the
+    numbers of context and predicted frames it has been exported with. It can't be trained.
+
+    Note:
+        This model requires the `onnxruntime` package.
+    """
+    NAME = "ONNX Model"
+    TRAINABLE = False
+    CAN_HANDLE_ACTIONS = True
+
+    onnx_fp: str = None  #: The file path of the exported ONNX graph.
+    exported_context_frames: int = None  #: The number of context frames the graph has been exported with.
+    exported_pred_frames: int = None  #: The number of predicted frames the graph has been exported with.
+
+    def __init__(self, device, onnx_fp: Union[str, Path]):
+        r"""
+        Initializes the model by loading the configuration of the exported model from the JSON file that has been
+        saved next to the graph file. The inference session is created on first use.
+
+        Args:
+            device (str): The device identifier for the module. The predictions are returned on this device.
+            onnx_fp (Union[str, Path]): The file path of the exported ONNX graph.
+        """
+        onnx_fp = Path(onnx_fp)
+        with open(str(onnx_fp.with_suffix(".json")), "r") as onnx_config_file:
+            onnx_config = json.load(onnx_config_file)
+        super(ONNXModel, self).__init__(device, img_shape=tuple(onnx_config["img_shape"]),
+                                        action_size=onnx_config["action_size"],
+                                        tensor_value_range=onnx_config["tensor_value_range"],
+                                        action_conditional=onnx_config["action_conditional"])
+        self.NAME = f"{onnx_config['NAME']} (ONNX)"
+        self.CAN_HANDLE_ACTIONS = onnx_config["can_handle_actions"]
+        self.NEEDS_COMPLETE_INPUT = onnx_config["needs_complete_input"]
+        self.MIN_CONTEXT_FRAMES = onnx_config["context_frames"]
+        self.onnx_fp = str(onnx_fp.resolve())
+        self.exported_context_frames = onnx_config["context_frames"]
+        self.exported_pred_frames = onnx_config["pred_frames"]
+        self._session = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_session"] = None  # inference sessions can't be pickled -> re-created on demand
+        return state
+
+    @property
+    def exported_frames(self):
+        r"""
+        Returns: The numbers of context and predicted frames the graph has been exported with.
+        """
+        return self.exported_context_frames, self.exported_pred_frames
+
+    def _get_session(self):
+        r"""
+        Returns: The onnxruntime inference session running the exported graph (created on first access).
+        """
+        if self._session is None:
+            try:
+                import onnxruntime
+            except ImportError:
+                raise ImportError("Importing onnxruntime failed -> install it to run exported models.")
+            self._session = onnxruntime.InferenceSession(self.onnx_fp, providers=["CPUExecutionProvider"])
+        return self._session
+
+    def pred_1(self, x, **kwargs):
+        return self(x, pred_frames=self.exported_pred_frames, **kwargs)[0][:, 0]
+
+    def forward(self, x, pred_frames=1, **kwargs):
+        context_frames, exported_pred_frames = self.exported_frames
+        if pred_frames != exported_pred_frames:
+            raise ValueError(f"exported model predicts {exported_pred_frames} frames (requested: {pred_frames})")
+        expected_frames = context_frames + pred_frames if self.NEEDS_COMPLETE_INPUT else context_frames
+        if x.shape[1] != expected_frames:
+            raise ValueError(f"exported model expects {expected_frames} input frames (given: {x.shape[1]})")
+        inputs = {"frames": x.detach().cpu().float().numpy()}
+        if self.action_conditional:
+            actions = kwargs.get("actions", None)
+            if actions is None or actions.shape[-1] != self.action_size:
+                raise ValueError("Given actions are None or of the wrong size!")
+            inputs["actions"] = actions[:, :context_frames + pred_frames - 1].detach().cpu().float().numpy()
+        predictions = self._get_session().run(["predictions"], inputs)[0]
+        return torch.from_numpy(predictions).to(x.device), None
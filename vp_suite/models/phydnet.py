@@ -5,6 +5,9 @@ import random
 from tqdm import tqdm
 
 from vp_suite.base import VPModel
+from vp_suite.utils.precision import autocast, full_precision
+from vp_suite.utils.memory_format import stack_frames
+from vp_suite.utils.distributed import broadcast_object, is_main_process
 from vp_suite.model_blocks.enc import DCGANEncoder, DCGANDecoder
 from vp_suite.model_blocks.phydnet import K2M, DecoderSplit, EncoderSplit, PhyCell, SingleStepConvLSTM
 
@@ -120,23 +123,25 @@ class PhyDNet(VPModel):
             out_frames.append(output_image)
             decoder_input = x[:, context_frames + di] if teacher_forcing else output_image
             ac_index += 1
-        out_frames = torch.stack(out_frames, dim=1)
+        out_frames = stack_frames(out_frames)
 
         # Moment regularization loss during training
         if train:
-            k2m = K2M(self.phycell_kernel_size).to(self.device)
-            moment_loss = 0
-            for b in range(0, self.phycell.cell_list[0].input_dim):
-                filters = self.phycell.cell_list[0].F.conv1.weight[:, b]
-                moment = k2m(filters.double()).float()
-                moment_loss += torch.mean((moment - self.constraints) ** 2)
+            with full_precision():  # the moment matrices are numerically sensitive
+                k2m = K2M(self.phycell_kernel_size).to(self.device)
+                moment_loss = 0
+                for b in range(0, self.phycell.cell_list[0].input_dim):
+                    filters = self.phycell.cell_list[0].F.conv1.weight[:, b]
+                    moment = k2m(filters.double()).float()
+                    moment_loss += torch.mean((moment - self.constraints) ** 2)
             model_losses = {"moment regularization loss": self.moment_loss_scale * moment_loss}
         else:
             model_losses = None
 
         return out_frames, model_losses
 
-    def train_iter(self, config, data_loader, optimizer, loss_provider, epoch):
+    def train_iter(self, config, data_loader, optimizer, loss_provider, epoch, grad_scaler=None,
+                   ddp_model=None):
         r"""
         PhyDNet's training iteration utilizes a scheduled teacher forcing ratio.
         Otherwise, the iteration logic is the same as in the default :meth:`train_iter()` function.
@@ -147,28 +152,35 @@ class PhyDNet(VPModel):
             optimizer (Optimizer): The optimizer to use for weight update calculations.
             loss_provider (PredictionLossProvider): An instance of the :class:`LossProvider` class for flexible loss calculation.
             epoch (int): The current epoch.
+            grad_scaler (Optional[GradScaler]): The gradient scaler of the training run (if any).
+            ddp_model (Optional[DistributedDataParallel]): In distributed runs, the data-parallel wrapper of this model.
         """
         teacher_forcing_ratio = np.maximum(0, 1 - epoch * self.teacher_forcing_decay)
-        loop = tqdm(data_loader)
+        loop = tqdm(data_loader, disable=not is_main_process())
         for batch_idx, data in enumerate(loop):
-
-            # fwd
-            input_frames, _, actions = self.unpack_data(data, config, complete=True)
-            teacher_forcing = True if random.random() < teacher_forcing_ratio else False
-            predictions, model_losses = self(input_frames, pred_frames=config["pred_frames"],
-                                             actions=actions, train=True, teacher_forcing=teacher_forcing)
-
-            # loss
-            targets = input_frames[:, 1:]  # image-wise loss are taken from 2nd context frame onwards
-            _, total_loss = loss_provider.get_losses(predictions, targets)
-            if model_losses is not None:
-                for value in model_losses.values():
-                    total_loss += value
-
-            # bwd
-            optimizer.zero_grad()
-            total_loss.backward()
-            optimizer.step()
+            # same for all micro-batches (and all ranks of distributed runs)
+            teacher_forcing = broadcast_object(True if random.random() < teacher_forcing_ratio else False)
+            batch_loss = 0.
+            for micro_data, weight, model in self.micro_batches(data, config, ddp_model):
+
+                # fwd
+                input_frames, _, actions = self.unpack_data(micro_data, config, complete=True)
+                with autocast(config):
+                    predictions, model_losses = model(input_frames, pred_frames=config["pred_frames"],
+                                                      actions=actions, train=True, teacher_forcing=teacher_forcing)
+
+                # loss
+                targets = input_frames[:, 1:]  # image-wise loss are taken from 2nd context frame onwards
+                _, total_loss = loss_provider.get_losses(predictions.float(), targets)
+                if model_losses is not None:
+                    for value in model_losses.values():
+                        total_loss += value
+
+                # bwd
+                self.accumulate_gradients(total_loss, weight, grad_scaler)
+                batch_loss += total_loss.detach() * weight
+
+            self.optimization_step(optimizer, grad_scaler)
 
             # bookkeeping
-            loop.set_postfix(loss=total_loss.item())
+            loop.set_postfix(loss=batch_loss.item())
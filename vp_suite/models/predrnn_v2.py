@@ -4,6 +4,9 @@ import torch.nn as nn
 from vp_suite.model_blocks import SpatioTemporalLSTMCell as STCell,\
     ActionConditionalSpatioTemporalLSTMCell as ACSTCell
 from vp_suite.base import VPModel
+from vp_suite.utils.precision import autocast
+from vp_suite.utils.memory_format import is_channels_last, match_memory_format, stack_frames
+from vp_suite.utils.distributed import is_main_process
 import torch.nn.functional as F
 from tqdm import tqdm
 
@@ -156,14 +159,16 @@ class PredRNN_V2(VPModel):
         delta_m_list = []
         decouple_loss = []
         for i in range(self.num_layers):
-            zeros = torch.zeros([b, self.num_hidden[i], self.rnn_h, self.rnn_w], device=self.device)
+            zeros = match_memory_format(torch.zeros([b, self.num_hidden[i], self.rnn_h, self.rnn_w], device=self.device),
+                                        x_patch)
             h_t.append(zeros)
             c_t.append(zeros)
             delta_c_list.append(zeros)
             delta_m_list.append(zeros)
 
-        memory = torch.zeros([b, self.num_hidden[0], self.rnn_h, self.rnn_w], device=self.device)
-        mask_true = self._scheduled_sampling(b, context_frames, pred_frames, train)
+        memory = match_memory_format(torch.zeros([b, self.num_hidden[0], self.rnn_h, self.rnn_w], device=self.device),
+                                     x_patch)
+        mask_true = match_memory_format(self._scheduled_sampling(b, context_frames, pred_frames, train), x_patch)
         first_t_with_blending = 1 if self.reverse_scheduled_sampling else context_frames
         x_gen = None
 
@@ -224,7 +229,7 @@ class PredRNN_V2(VPModel):
             next_frames.append(x_gen)
 
         # finalize
-        predictions_patch = torch.stack(next_frames[-pred_frames:], dim=1)  # [b, t_pred, cpp, h_, w_]
+        predictions_patch = stack_frames(next_frames[-pred_frames:])  # [b, t_pred, cpp, h_, w_]
         predictions = self._reshape_patch_back(predictions_patch)  # [b, t_pred, c, h, w]
         decouple_loss = torch.mean(torch.stack(decouple_loss, dim=0))
         return predictions, {"ST-LSTM decouple loss": self.decoupling_loss_scale * decouple_loss}
@@ -234,7 +239,11 @@ class PredRNN_V2(VPModel):
         expected_input_shape = (self.img_c, self.img_h, self.img_w)
         if expected_input_shape != (c, h, w):
             raise ValueError(f"shape mismatch: expected {expected_input_shape}, got {(c, h, w)}")
+        channels_last = is_channels_last(x)
         x = x.view(b, t, c, self.patch_h, self.patch_size, self.patch_w, self.patch_size)
+        if channels_last:  # keep the patch channels innermost in memory
+            x = x.permute((0, 1, 3, 5, 4, 6, 2)).contiguous()  # [b, t, h_, w_, p, p, c]
+            return x.view(b, t, self.patch_h, self.patch_w, -1).permute((0, 1, 4, 2, 3))
         x = x.permute((0, 1, 4, 6, 2, 3, 5)).contiguous()  # [b, t, p, p, c, h_, w_], 'channels' order: (p_h, p_w, c)
         x_patch = x.view(b, t, -1, self.patch_h, self.patch_w)  # infer channel dim automatically since there might be actions included
         return x_patch
@@ -283,8 +292,8 @@ class PredRNN_V2(VPModel):
         pred_frames_m1 = pred_frames - 1
 
         if not self.scheduled_sampling:
-            return 0.0, torch.zeros(batch_size, pred_frames_m1, self.patch_c, self.patch_h, self.patch_w,
-                                    device=self.device)
+            return torch.zeros(batch_size, pred_frames_m1, self.patch_c, self.patch_h, self.patch_w,
+                               device=self.device)
 
         if self.training_iteration < self.sampling_stop_iter:
             self.sampling_eta -= self.sampling_changing_rate
@@ -316,7 +325,8 @@ class PredRNN_V2(VPModel):
         else:
             return self._std_schedule_sampling(batch_size, context_frames, pred_frames)
 
-    def train_iter(self, config, loader, optimizer, loss_provider, epoch):
+    def train_iter(self, config, loader, optimizer, loss_provider, epoch, grad_scaler=None,
+                   ddp_model=None):
         r"""
         PredRNN++'s training iteration utilizes reversed input and keeps track of the number of training iterations
         done so far in order to adjust the sampling schedule.
@@ -328,38 +338,50 @@ class PredRNN_V2(VPModel):
             optimizer (Optimizer): The optimizer to use for weight update calculations.
             loss_provider (PredictionLossProvider): An instance of the :class:`LossProvider` class for flexible loss calculation.
             epoch (int): The current epoch.
+            grad_scaler (Optional[GradScaler]): The gradient scaler of the training run (if any).
+            ddp_model (Optional[DistributedDataParallel]): In distributed runs, the data-parallel wrapper of this model.
         """
-        loop = tqdm(loader)
+        loop = tqdm(loader, disable=not is_main_process())
         for data in loop:
-
-            # fwd
-            input, targets, actions = self.unpack_data(data, config)
-            predictions, model_losses = self(input, pred_frames=config["pred_frames"], actions=actions, train=True)
-
-            # loss
-            _, total_loss = loss_provider.get_losses(predictions, targets)
-            if model_losses is not None:
-                for value in model_losses.values():
-                    total_loss += value
-
-            # reverse
-            if self.reverse_input:
-                input_rev, targets_rev, actions_rev = self.unpack_data(data, config, reverse=True)
-                predictions_rev, model_losses_rev = self(input_rev, pred_frames=config["pred_frames"],
-                                                         actions=actions, train=True)
-
-                # reverse_loss
-                _, total_loss_rev = loss_provider.get_losses(predictions_rev, targets_rev)
-                if model_losses_rev is not None:
-                    for value in model_losses_rev.values():
-                        total_loss_rev += value
-                total_loss = (total_loss + total_loss_rev) / 2
-
-            # bwd
-            optimizer.zero_grad()
-            total_loss.backward()
-            optimizer.step()
-
-            # bookkeeping
+            sampling_eta = self.sampling_eta
+            batch_loss = 0.
+            for micro_data, weight, model in self.micro_batches(data, config, ddp_model):
+                self.sampling_eta = sampling_eta  # the sampling schedule advances once per batch, not per micro-batch
+
+                # fwd (with reversed input, the reverse pass is the one that runs through the data-parallel wrapper,
+                # as the wrapper expects a single forward pass per backward pass)
+                input, targets, actions = self.unpack_data(micro_data, config)
+                forward_model = self if self.reverse_input else model
+                with autocast(config):
+                    predictions, model_losses = forward_model(input, pred_frames=config["pred_frames"],
+                                                              actions=actions, train=True)
+
+                # loss
+                _, total_loss = loss_provider.get_losses(predictions.float(), targets)
+                if model_losses is not None:
+                    for value in model_losses.values():
+                        total_loss += value
+
+                # reverse
+                if self.reverse_input:
+                    input_rev, targets_rev, actions_rev = self.unpack_data(micro_data, config, reverse=True)
+                    with autocast(config):
+                        predictions_rev, model_losses_rev = model(input_rev, pred_frames=config["pred_frames"],
+                                                                  actions=actions, train=True)
+
+                    # reverse_loss
+                    _, total_loss_rev = loss_provider.get_losses(predictions_rev.float(), targets_rev)
+                    if model_losses_rev is not None:
+                        for value in model_losses_rev.values():
+                            total_loss_rev += value
+                    total_loss = (total_loss + total_loss_rev) / 2
+
+                # bwd
+                self.accumulate_gradients(total_loss, weight, grad_scaler)
+                batch_loss += total_loss.detach() * weight
+
+            self.optimization_step(optimizer, grad_scaler)
+
+            # bookkeeping (all ranks of distributed runs process the same number of batches -> counters stay in sync)
             self.training_iteration += 1
-            loop.set_postfix(loss=total_loss.item())
+            loop.set_postfix(loss=batch_loss.item())
@@ -8,6 +8,9 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 from vp_suite.base import VPModel
+from vp_suite.utils.precision import autocast, full_precision
+from vp_suite.utils.memory_format import match_memory_format, stack_frames
+from vp_suite.utils.distributed import broadcast_object, is_main_process
 from vp_suite.model_blocks import Autoencoder
 from vp_suite.model_blocks.predrnn import SpatioTemporalLSTMCell, ActionConditionalSpatioTemporalLSTMCell
 from vp_suite.model_blocks.phydnet import PhyCell_Cell, K2M
@@ -112,13 +115,16 @@ class STPhy(VPModel):
 
         for i in range(self.num_layers):
             zeros = torch.zeros([batch_size, self.dim_st_hidden[i], self.enc_h, self.enc_w]).to(self.device)
+            zeros = match_memory_format(zeros, x)
             st_h_t.append(zeros)
             st_c_t.append(zeros)
             delta_c_list.append(zeros)
             delta_m_list.append(zeros)
-            phy_h_t.append(torch.zeros(batch_size, self.st_cell_channels, self.enc_h, self.enc_w).to(self.device))
+            phy_h_t.append(match_memory_format(
+                torch.zeros(batch_size, self.st_cell_channels, self.enc_h, self.enc_w).to(self.device), x))
 
         st_memory = torch.zeros([batch_size, self.dim_st_hidden[0], self.enc_h, self.enc_w]).to(self.device)
+        st_memory = match_memory_format(st_memory, x)
         out_frames = []
         x_gen = None
 
@@ -161,16 +167,17 @@ class STPhy(VPModel):
                     decouple_loss.append(
                         torch.mean(torch.abs(torch.cosine_similarity(delta_c_list[i], delta_m_list[i], dim=2))))
 
-        out_frames = torch.stack(out_frames, dim=1)
+        out_frames = stack_frames(out_frames)
 
         if train:
-            # Moment regularization loss during training
-            k2m = K2M(self.phycell_kernel_size).to(self.device)
-            moment_loss = 0
-            for b in range(0, self.phycell_list[0].input_dim):
-                filters = self.phycell_list[0].F.conv1.weight[:, b]
-                moment = k2m(filters.double()).float()
-                moment_loss += torch.mean(self.moment_loss_scale * (moment - self.constraints) ** 2)
+            # Moment regularization loss during training (the moment matrices are numerically sensitive)
+            with full_precision():
+                k2m = K2M(self.phycell_kernel_size).to(self.device)
+                moment_loss = 0
+                for b in range(0, self.phycell_list[0].input_dim):
+                    filters = self.phycell_list[0].F.conv1.weight[:, b]
+                    moment = k2m(filters.double()).float()
+                    moment_loss += torch.mean(self.moment_loss_scale * (moment - self.constraints) ** 2)
             decoupling_loss = torch.mean(torch.stack(decouple_loss, dim=0))
             model_losses = {
                 "moment regularization loss": self.moment_loss_scale * moment_loss,
@@ -180,7 +187,8 @@ class STPhy(VPModel):
             model_losses = None
         return out_frames, model_losses
 
-    def train_iter(self, config, data_loader, optimizer, loss_provider, epoch):
+    def train_iter(self, config, data_loader, optimizer, loss_provider, epoch, grad_scaler=None,
+                   ddp_model=None):
         r"""
         ST-Phy's training iteration utilizes a scheduled teacher forcing ratio.
         Otherwise, the iteration logic is the same as in the default :meth:`train_iter()` function.
@@ -191,26 +199,33 @@ class STPhy(VPModel):
             optimizer (Optimizer): The optimizer to use for weight update calculations.
             loss_provider (PredictionLossProvider): An instance of the :class:`LossProvider` class for flexible loss calculation.
             epoch (int): The current epoch.
+            grad_scaler (Optional[GradScaler]): The gradient scaler of the training run (if any).
+            ddp_model (Optional[DistributedDataParallel]): In distributed runs, the data-parallel wrapper of this model.
         """
         teacher_forcing_ratio = np.maximum(0, 1 - epoch * self.teacher_forcing_decay)
-        loop = tqdm(data_loader)
+        loop = tqdm(data_loader, disable=not is_main_process())
         for batch_idx, data in enumerate(loop):
-
-            # fwd
-            input_frames, _, actions = self.unpack_data(data, config, complete=True)
-            teacher_forcing = True if random.random() < teacher_forcing_ratio else False
-            predictions, model_losses = self(input_frames, pred_frames=config["pred_frames"],
-                                             actions=actions, train=True, teacher_forcing=teacher_forcing)
-
-            # loss
-            targets = input_frames[:, 1:]
-            _, total_loss = loss_provider.get_losses(predictions, targets)
-            if model_losses is not None:
-                for value in model_losses.values():
-                    total_loss += value
-
-            optimizer.zero_grad()
-            total_loss.backward()
-            optimizer.step()
-
-            loop.set_postfix(loss=total_loss.item())
+            # same for all micro-batches (and all ranks of distributed runs)
+            teacher_forcing = broadcast_object(True if random.random() < teacher_forcing_ratio else False)
+            batch_loss = 0.
+            for micro_data, weight, model in self.micro_batches(data, config, ddp_model):
+
+                # fwd
+                input_frames, _, actions = self.unpack_data(micro_data, config, complete=True)
+                with autocast(config):
+                    predictions, model_losses = model(input_frames, pred_frames=config["pred_frames"],
+                                                      actions=actions, train=True, teacher_forcing=teacher_forcing)
+
+                # loss
+                targets = input_frames[:, 1:]
+                _, total_loss = loss_provider.get_losses(predictions.float(), targets)
+                if model_losses is not None:
+                    for value in model_losses.values():
+                        total_loss += value
+
+                self.accumulate_gradients(total_loss, weight, grad_scaler)
+                batch_loss += total_loss.detach() * weight
+
+            self.optimization_step(optimizer, grad_scaler)
+
+            loop.set_postfix(loss=batch_loss.item())
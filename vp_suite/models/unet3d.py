@@ -4,6 +4,7 @@ from torchvision.transforms import functional as TF
 
 from vp_suite.model_blocks import DoubleConv3d, DoubleConv2d
 from vp_suite.base import VPModel
+from vp_suite.utils.memory_format import match_memory_format, stack_frames
 
 
 class UNet3D(VPModel):
@@ -83,7 +84,7 @@ class UNet3D(VPModel):
                 inflated_action = self.action_inflates[i](actions_).view(-1, self.action_size, *x.shape[-2:])  # [temporal_dim*b, a, h, w]
                 inflated_action = inflated_action.reshape(*actions.shape[:2], *inflated_action.shape[1:])  # [temporal_dim, b, a, h, w]
                 inflated_action = inflated_action.permute((1, 2, 0, 3, 4))  # [b, a, temporal_dim, h, w]
-                x = torch.cat([x, inflated_action], dim=1)
+                x = match_memory_format(torch.cat([x, inflated_action], dim=1), x, channel_dim=1)
             x = self.downs[i](x)
 
             skip_connection = self.time3ds[i](x).squeeze(dim=2)
@@ -95,7 +96,7 @@ class UNet3D(VPModel):
             last_action = actions[-1]  # [b, a]
             inflated_action = self.bottleneck_action_inflate(last_action)  # [b, a*h*w]
             inflated_action = inflated_action.view(-1, self.action_size, *x.shape[-2:])  # [b, a, h, w]
-            x = torch.cat([x, inflated_action], dim=1)
+            x = match_memory_format(torch.cat([x, inflated_action], dim=1), x)
         x = self.bottleneck(x)
 
         # UP
@@ -123,9 +124,8 @@ class UNet3D(VPModel):
 
         for t in range(pred_frames):
             pred = self.pred_1(x, actions=actions)
-            pred = pred.unsqueeze(dim=1)
             preds.append(pred)
-            x = torch.cat([x[:, 1:], pred], dim=1)
+            x = match_memory_format(torch.cat([x[:, 1:], pred.unsqueeze(dim=1)], dim=1), x)
 
-        pred = torch.cat(preds, dim=1)
+        pred = stack_frames(preds)
         return pred, None
@@ -0,0 +1,285 @@
+r"""
+This module contains utilities for saving training checkpoints without stalling the training loop.
+A checkpoint holds a snapshot of the model (its parameters, buffers and Python-side attributes such as step counters)
+and, optionally, of the optimizer and learning rate scheduler states, all copied to CPU memory. The snapshot is then
+written to disk by a background thread, atomically replacing the previous checkpoint file, so that an interrupted write
+never leaves a corrupted checkpoint behind.
+Resumable checkpoints additionally hold the state of the training loop (position, RNG states, best validation loss),
+so that an interrupted training run can be continued (see :class:`ResumableSampler` and :class:`StepCallbackLoader`).
+"""
+import os
+import random
+import threading
+from collections import OrderedDict
+from copy import deepcopy
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+import numpy as np
+import torch
+from torch import nn as nn
+from torch.utils.data import DistributedSampler
+
+
+def snapshot(obj: Any) -> Any:
+    r"""
+    Args:
+        obj (Any): A tensor or a (nested) dict, list or tuple containing tensors, e.g. an optimizer's state dict.
+
+    Returns: A copy of given object in which all tensors are detached copies in CPU memory.
+    """
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return type(obj)((k, snapshot(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot(v) for v in obj)
+    return deepcopy(obj)
+
+
+def snapshot_model(model: nn.Module) -> nn.Module:
+    r"""
+    Creates a copy of given model whose parameters and buffers reside in CPU memory. Unlike `deepcopy(model).cpu()`,
+    this never copies parameters and buffers on the model's device. Gradients are not copied.
+
+    Args:
+        model (nn.Module): The model to copy.
+
+    Returns: The copied model.
+    """
+    memo = dict()
+    for p in model.parameters():
+        memo[id(p)] = nn.Parameter(snapshot(p), requires_grad=p.requires_grad)
+    for b in model.buffers():
+        memo[id(b)] = snapshot(b)
+    return deepcopy(model, memo)
+
+
+def training_checkpoint(model: nn.Module, optimizer: Optional[torch.optim.Optimizer] = None,
+                        scheduler: Optional[Any] = None, **extra) -> dict:
+    r"""
+    Creates a checkpoint of the given training components in CPU memory.
+
+    Args:
+        model (nn.Module): The trained model.
+        optimizer (Optional[torch.optim.Optimizer]): The optimizer.
+        scheduler (Optional[Any]): The learning rate scheduler.
+        **extra (Any): Additional entries of the checkpoint.
+
+    Returns: The checkpoint, containing the model snapshot ('model') and the state dicts of optimizer and scheduler
+    ('optimizer_state_dict' and 'scheduler_state_dict', if given) as well as the additional entries.
+    """
+    checkpoint = {"model": snapshot_model(model)}
+    if optimizer is not None:
+        checkpoint["optimizer_state_dict"] = snapshot(optimizer.state_dict())
+    if scheduler is not None:
+        checkpoint["scheduler_state_dict"] = snapshot(scheduler.state_dict())
+    checkpoint.update(snapshot(extra))
+    return checkpoint
+
+
+def load_checkpoint(fp: Union[str, Path], map_location=None) -> dict:
+    r"""
+    Loads a checkpoint saved from a training run. Checkpoint files that contain a model only (i.e. that have been
+    saved with `torch.save(model, fp)`) are loaded as checkpoints containing that model.
+
+    Args:
+        fp (Union[str, Path]): The checkpoint file path.
+        map_location (Any): Passed on to `torch.load()`.
+
+    Returns: The loaded checkpoint.
+    """
+    checkpoint = torch.load(str(fp), map_location=map_location)
+    if isinstance(checkpoint, nn.Module):
+        return {"model": checkpoint}
+    return checkpoint
+
+
+def atomic_save(obj: Any, fp: Union[str, Path]):
+    r"""
+    Saves given object to given file path by writing it to a temporary file in the same directory first,
+    which then replaces the target file in a single (atomic) step.
+
+    Args:
+        obj (Any): The object to save.
+        fp (Union[str, Path]): The file path.
+    """
+    fp = Path(fp)
+    tmp_fp = fp.with_name(f".{fp.name}.tmp")
+    try:
+        with open(str(tmp_fp), "wb") as tmp_file:
+            torch.save(obj, tmp_file)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())  # the data has to be on disk before the file is renamed
+        os.replace(str(tmp_fp), str(fp))
+    except BaseException:
+        if tmp_fp.exists():
+            tmp_fp.unlink()
+        raise
+
+
+class AsyncCheckpointWriter:
+    r"""
+    Writes checkpoints in a background thread using :func:`atomic_save()`, so that the caller can continue immediately.
+    The checkpoints are written in submission order. If a checkpoint is submitted for a file path while an older
+    checkpoint for the same file path is still waiting to be written, the older one is dropped,
+    as it would be overwritten anyway.
+
+    Note:
+        Submitted checkpoints must not be modified afterwards, so they should be CPU snapshots
+        (see :func:`training_checkpoint()`).
+    """
+    def __init__(self):
+        self._pending = OrderedDict()  # file path -> checkpoint
+        self._cond = threading.Condition()
+        self._writing = False
+        self._closed = False
+        self._error = None
+        self._thread = threading.Thread(target=self._work, daemon=True)
+        self._thread.start()
+
+    def save(self, checkpoint: Any, fp: Union[str, Path]):
+        r"""
+        Submits given checkpoint for writing to given file path.
+        Re-raises the first error that occurred while writing previous checkpoints (if any).
+
+        Args:
+            checkpoint (Any): The checkpoint to write.
+            fp (Union[str, Path]): The file path.
+        """
+        with self._cond:
+            self._raise_error()
+            if self._closed:
+                raise RuntimeError("checkpoint writer has been closed")
+            fp = str(fp)
+            self._pending.pop(fp, None)  # re-submitted file paths move to the end of the queue
+            self._pending[fp] = checkpoint
+            self._cond.notify_all()
+
+    def wait(self):
+        r"""
+        Blocks until all submitted checkpoints have been written.
+        Re-raises the first error that occurred while writing (if any).
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: (len(self._pending) == 0 and not self._writing) or self._error is not None)
+            self._raise_error()
+
+    def close(self):
+        r"""
+        Waits until all submitted checkpoints have been written and stops the background thread.
+        Re-raises the first error that occurred while writing (if any).
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise RuntimeError("writing checkpoint failed") from self._error
+
+    def _work(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._pending) > 0 or self._closed)
+                if len(self._pending) == 0 or self._error is not None:  # closed (or failed) and nothing left to do
+                    self._cond.notify_all()
+                    return
+                fp, checkpoint = self._pending.popitem(last=False)
+                self._writing = True
+            try:
+                atomic_save(checkpoint, fp)
+            except Exception as e:
+                with self._cond:
+                    self._error = self._error or e
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self._cond.notify_all()
+
+
+def get_rng_state() -> dict:
+    r"""
+    Returns: The states of the Python, numpy and PyTorch (CPU and GPU) random number generators of this process.
+    """
+    rng_state = {"python": random.getstate(), "numpy": np.random.get_state(), "torch": torch.get_rng_state()}
+    if torch.cuda.is_available():
+        rng_state["cuda"] = torch.cuda.get_rng_state_all()
+    return rng_state
+
+
+def set_rng_state(rng_state: dict):
+    r"""
+    Restores the random number generator states obtained from :func:`get_rng_state()`.
+
+    Args:
+        rng_state (dict): The random number generator states.
+    """
+    random.setstate(rng_state["python"])
+    np.random.set_state(rng_state["numpy"])
+    torch.set_rng_state(rng_state["torch"])
+    if "cuda" in rng_state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(rng_state["cuda"])
+
+
+class ResumableSampler(DistributedSampler):
+    r"""
+    A :class:`DistributedSampler` (which, with a single replica, simply shuffles the data differently in every epoch)
+    that can start an epoch at a given position, skipping the datapoints that have already been processed
+    in an interrupted run. As the order of each epoch only depends on the seed and the epoch number,
+    the remaining datapoints are the same as in the interrupted run.
+    """
+    def __init__(self, dataset, num_replicas: int = 1, rank: int = 0, shuffle: bool = True, seed: int = 0,
+                 drop_last: bool = False):
+        super(ResumableSampler, self).__init__(dataset, num_replicas=num_replicas, rank=rank, shuffle=shuffle,
+                                               seed=seed, drop_last=drop_last)
+        self.start_index = 0
+
+    def set_epoch(self, epoch: int, start_index: int = 0):
+        r"""
+        Sets the epoch (which determines the order of the datapoints) and the position the epoch starts at.
+
+        Args:
+            epoch (int): The epoch number.
+            start_index (int): The number of datapoints of this epoch that are skipped.
+        """
+        super(ResumableSampler, self).set_epoch(epoch)
+        self.start_index = start_index
+
+    def __iter__(self):
+        return iter(list(super(ResumableSampler, self).__iter__())[self.start_index:])
+
+    def __len__(self):
+        return max(0, self.num_samples - self.start_index)
+
+
+class StepCallbackLoader:
+    r"""
+    Wraps a data loader so that given callback is called after each training step, i.e. whenever the training loop
+    requests the next batch (or the end of the data). If the callback returns True, the iteration ends early.
+    """
+    def __init__(self, loader, callback: Callable[[], bool], skip_batches: int = 0):
+        r"""
+        Args:
+            loader (DataLoader): The wrapped data loader.
+            callback (Callable[[], bool]): The function to call after each step.
+            skip_batches (int): The number of batches that are loaded and discarded at the beginning of the next iteration (e.g. to fast-forward streamed data when resuming).
+        """
+        self.loader = loader
+        self.callback = callback
+        self.skip_batches = skip_batches
+
+    def __len__(self):
+        return max(0, len(self.loader) - self.skip_batches)
+
+    def __iter__(self):
+        batches = iter(self.loader)
+        for _ in range(self.skip_batches):
+            next(batches, None)
+        self.skip_batches = 0
+        for data in batches:
+            yield data
+            if self.callback():
+                return
@@ -74,6 +74,12 @@ def check_run_and_model_compat(model: VPModel, run_config: dict):
     model_config = model.config
     model_dir_str =  f"(location: {model.model_dir})"
 
+    # exported models only work with the sequence lengths they have been exported with
+    exported_frames = getattr(model, "exported_frames", None)
+    if exported_frames is not None and exported_frames != (run_config["context_frames"], run_config["pred_frames"]):
+        raise ValueError(f"Model '{model.NAME}' {model_dir_str} has been exported for {exported_frames[0]} context "
+                         f"frames and {exported_frames[1]} predicted frames")
+
     # action conditioning
     mdl_ac, run_ac = model_config["action_conditional"], run_config["use_actions"]
     if model.CAN_HANDLE_ACTIONS:
@@ -0,0 +1,180 @@
+r"""
+This module contains utilities for compiling the per-step recurrent cells of the video prediction models.
+The models' Python-level loops over time stay in place, but each call of a recurrent cell executes a graph that has
+been compiled for the call's input signature (shapes, dtypes, devices and static arguments).
+"""
+import warnings
+from typing import Optional
+
+import torch
+from torch import nn as nn
+
+from vp_suite.model_blocks import SpatioTemporalLSTMCell, ActionConditionalSpatioTemporalLSTMCell, PhyCell_Cell, \
+    TrajGRU, ConvLSTM
+from vp_suite.model_blocks.conv_lstm_ndrplz import ConvLSTMCell
+
+COMPILE_MODES = ["trace", "compile"]  #: The supported compilation modes: TorchScript tracing or torch.compile (PyTorch 2.0 and later).
+STEP_MODULE_CLASSES = (SpatioTemporalLSTMCell, ActionConditionalSpatioTemporalLSTMCell, PhyCell_Cell,
+                       ConvLSTMCell, ConvLSTM, TrajGRU)  #: The recurrent cell types that get compiled.
+_STATIC_TYPES = (type(None), bool, int, float, str)  # non-tensor argument types that are baked into compiled graphs
+_EAGER = object()  # cache entry marking input signatures that fall back to eager execution
+
+
+class _StepCall(nn.Module):
+    r"""
+    Calls the (class-level, i.e. eager) forward method of given module with given static arguments filled in,
+    so that it can be compiled as a function of the tensor arguments only.
+    """
+    def __init__(self, module: nn.Module, static_args: dict, n_args: int):
+        super(_StepCall, self).__init__()
+        self.module = module
+        self.static_args = static_args
+        self.n_args = n_args
+
+    def forward(self, *dynamic_args):
+        dynamic_args = iter(dynamic_args)
+        args = [self.static_args[i] if i in self.static_args else next(dynamic_args) for i in range(self.n_args)]
+        return type(self.module).forward(self.module, *args)
+
+
+def _is_tensor_arg(arg):
+    if isinstance(arg, (tuple, list)):
+        return len(arg) > 0 and all(isinstance(a, torch.Tensor) for a in arg)
+    return isinstance(arg, torch.Tensor)
+
+
+def _tensor_signature(t: torch.Tensor):
+    return tuple(t.shape), t.dtype, str(t.device), t.requires_grad
+
+
+def _flatten(x):
+    if isinstance(x, torch.Tensor):
+        return [x]
+    if isinstance(x, (tuple, list)):
+        return [t for item in x for t in _flatten(item)]
+    return []
+
+
+class CompiledStep:
+    r"""
+    Replaces the forward method of a recurrent cell: Compiles the cell for each new input signature on demand,
+    checks the compiled version for numerical equivalence against eager execution and caches it.
+    Calls that can't be compiled or whose compiled version deviates from eager execution are executed eagerly.
+    Compiled graphs are not pickled, but re-compiled on demand after unpickling.
+    """
+    def __init__(self, module: nn.Module, mode: str = "trace", rtol: float = 1e-4, atol: float = 1e-5):
+        r"""
+        Args:
+            module (nn.Module): The recurrent cell to compile.
+            mode (str): The compilation mode (see :attr:`COMPILE_MODES`).
+            rtol (float): Relative tolerance for the equivalence check of compiled and eager outputs.
+            atol (float): Absolute tolerance for the equivalence check of compiled and eager outputs.
+        """
+        if mode not in COMPILE_MODES:
+            raise ValueError(f"invalid compilation mode '{mode}' (supported: {COMPILE_MODES})")
+        if mode == "compile" and not hasattr(torch, "compile"):
+            raise ValueError("compilation mode 'compile' needs PyTorch 2.0 or later -> use 'trace' instead")
+        self.module = module
+        self.mode = mode
+        self.rtol = rtol
+        self.atol = atol
+        self._cache = dict()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_cache"] = dict()
+        return state
+
+    def _eager(self, *args, **kwargs):
+        return type(self.module).forward(self.module, *args, **kwargs)
+
+    def _signature(self, args):
+        r"""
+        Returns: The cache key for given call arguments as well as the static (non-tensor) and dynamic (tensor) arguments,
+        or (None, None, None) if the call can't be compiled.
+        """
+        static_args, dynamic_args, arg_keys = dict(), [], []
+        for i, arg in enumerate(args):
+            if _is_tensor_arg(arg):
+                dynamic_args.append(tuple(arg) if isinstance(arg, (tuple, list)) else arg)
+                arg_keys.append(tuple(_tensor_signature(t) for t in _flatten(arg)))
+            elif isinstance(arg, _STATIC_TYPES):
+                static_args[i] = arg
+                arg_keys.append(("static", arg))
+            else:
+                return None, None, None
+        mode_key = (self.module.training, torch.is_grad_enabled(), torch.is_inference_mode_enabled(),
+                    torch.is_autocast_enabled(), torch.is_autocast_cpu_enabled())
+        return (tuple(arg_keys), mode_key), static_args, dynamic_args
+
+    def _compile(self, static_args: dict, dynamic_args: list, n_args: int):
+        r"""
+        Compiles the cell for the given arguments and checks the compiled version against eager execution.
+
+        Returns: The compiled cell, or None if compilation failed or the compiled outputs deviate from eager execution.
+        """
+        step_call = _StepCall(self.module, static_args, n_args)
+        patched_forward = self.module.__dict__.pop("forward", None)  # the compiler has to see the plain cell
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", category=torch.jit.TracerWarning)
+                if self.mode == "trace":
+                    compiled = torch.jit.trace(step_call, tuple(dynamic_args), check_trace=False)
+                else:
+                    compiled = torch.compile(step_call)
+            with torch.no_grad():
+                eager_out = _flatten(step_call(*dynamic_args))
+                compiled_out = _flatten(compiled(*dynamic_args))
+        except Exception as e:
+            warnings.warn(f"compiling '{type(self.module).__name__}' failed ({e}) -> executing it eagerly")
+            return None
+        finally:
+            if patched_forward is not None:
+                self.module.forward = patched_forward
+        equivalent = len(eager_out) == len(compiled_out) and all(
+            e.shape == c.shape and torch.allclose(e.float(), c.float(), rtol=self.rtol, atol=self.atol)
+            for e, c in zip(eager_out, compiled_out))
+        if not equivalent:
+            warnings.warn(f"compiled '{type(self.module).__name__}' deviates from eager execution "
+                          f"-> executing it eagerly")
+            return None
+        return compiled
+
+    def __call__(self, *args, **kwargs):
+        if kwargs:
+            return self._eager(*args, **kwargs)
+        key, static_args, dynamic_args = self._signature(args)
+        if key is None:
+            return self._eager(*args)
+        compiled = self._cache.get(key, None)
+        if compiled is None:
+            compiled = self._compile(static_args, dynamic_args, len(args))
+            compiled = _EAGER if compiled is None else compiled
+            self._cache[key] = compiled
+        if compiled is _EAGER:
+            return self._eager(*args)
+        return compiled(*dynamic_args)
+
+
+def compile_model(model: nn.Module, mode: Optional[str] = "trace", rtol: float = 1e-4, atol: float = 1e-5):
+    r"""
+    Compiles the recurrent cells of given model (in-place) by replacing their forward methods with :class:`CompiledStep`
+    instances. Parameters and state dict of the model remain untouched.
+
+    Args:
+        model (nn.Module): The model to compile.
+        mode (Optional[str]): The compilation mode (see :attr:`COMPILE_MODES`). If None, the model is reverted to eager execution.
+        rtol (float): Relative tolerance for the equivalence check of compiled and eager outputs.
+        atol (float): Absolute tolerance for the equivalence check of compiled and eager outputs.
+
+    Returns: The number of compiled cells.
+    """
+    n_compiled = 0
+    for module in model.modules():
+        if not isinstance(module, STEP_MODULE_CLASSES):
+            continue
+        module.__dict__.pop("forward", None)  # revert previous compilation
+        if mode is not None:
+            module.forward = CompiledStep(module, mode, rtol, atol)
+            n_compiled += 1
+    return n_compiled
@@ -0,0 +1,222 @@
+r"""
+This module contains utilities for distributed data-parallel training in multiple processes.
+Each process (rank) holds a replica of the model and trains it on its share of every training batch.
+The replicas are wrapped in :class:`~torch.nn.parallel.DistributedDataParallel`, which averages the gradients over all
+ranks during the backward pass, so that all replicas take the same optimization steps. Random decisions that are taken once per batch (e.g. teacher forcing) are made by rank 0 and
+shared with the other ranks.
+"""
+import os
+import socket
+import sys
+from typing import Any, Callable, List, Optional
+
+import numpy as np
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch import nn as nn
+
+DIST_BACKENDS = ["gloo", "nccl"]  #: The supported communication backends: Gloo for CPU training, NCCL for GPU training.
+
+
+def is_distributed() -> bool:
+    r"""
+    Returns: True if the calling process is part of a distributed run.
+    """
+    return dist.is_available() and dist.is_initialized()
+
+
+def get_rank() -> int:
+    r"""
+    Returns: The rank of the calling process (0 if not part of a distributed run).
+    """
+    return dist.get_rank() if is_distributed() else 0
+
+
+def get_world_size() -> int:
+    r"""
+    Returns: The number of processes of the distributed run (1 if not part of a distributed run).
+    """
+    return dist.get_world_size() if is_distributed() else 1
+
+
+def is_main_process() -> bool:
+    r"""
+    Returns: True if the calling process is rank 0 of a distributed run or not part of a distributed run at all.
+    Only the main process saves checkpoints, creates visualizations and logs to Weights and Biases.
+    """
+    return get_rank() == 0
+
+
+def broadcast_object(obj: Any, src: int = 0) -> Any:
+    r"""
+    Args:
+        obj (Any): A picklable object.
+        src (int): The rank whose object is shared.
+
+    Returns: The object of the source rank (or given object if not part of a distributed run).
+    """
+    if not is_distributed():
+        return obj
+    obj_list = [obj]
+    dist.broadcast_object_list(obj_list, src=src)
+    return obj_list[0]
+
+
+def all_gather_object(obj: Any) -> List[Any]:
+    r"""
+    Args:
+        obj (Any): A picklable object.
+
+    Returns: The objects of all ranks, ordered by rank (or a list containing given object if not part of a distributed run).
+    """
+    if not is_distributed():
+        return [obj]
+    obj_list = [None] * get_world_size()
+    dist.all_gather_object(obj_list, obj)
+    return obj_list
+
+
+def broadcast_module_state(module: nn.Module, buffers_only: bool = False, src: int = 0):
+    r"""
+    Overwrites the parameters and buffers of given module with those of the source rank (in-place).
+
+    Args:
+        module (nn.Module): The module to synchronize.
+        buffers_only (bool): If True, only the buffers (e.g. batch normalization statistics) are synchronized.
+        src (int): The rank whose parameters and buffers are shared.
+    """
+    if not is_distributed():
+        return
+    tensors = [b for b in module.buffers() if b.is_floating_point() or b.dtype in (torch.int64, torch.int32)]
+    if not buffers_only:
+        tensors = [p.data for p in module.parameters()] + tensors
+    with torch.no_grad():
+        for t in tensors:
+            if t.is_contiguous():
+                dist.broadcast(t, src=src)
+            else:  # e.g. in the channels_last memory format
+                contiguous_t = t.contiguous()
+                dist.broadcast(contiguous_t, src=src)
+                t.copy_(contiguous_t)
+
+
+def _reduction_device():
+    return torch.device("cuda", torch.cuda.current_device()) if dist.get_backend() == "nccl" else "cpu"
+
+
+def any_rank(flag: bool) -> bool:
+    r"""
+    Args:
+        flag (bool): The flag of the calling rank.
+
+    Returns: True if the flag is set on any rank (or the given flag if not part of a distributed run).
+    """
+    if not is_distributed():
+        return flag
+    flag_tensor = torch.tensor([float(flag)], device=_reduction_device())
+    dist.all_reduce(flag_tensor, op=dist.ReduceOp.MAX)
+    return flag_tensor.item() > 0
+
+
+def wrap_data_parallel(model: nn.Module) -> nn.Module:
+    r"""
+    Wraps given model replica for data-parallel training in the current distributed run. Buffers (e.g. batch
+    normalization statistics) are not synchronized in every forward pass, but need to be synchronized explicitly
+    (see :func:`broadcast_module_state()`) before the model is evaluated or saved.
+
+    Args:
+        model (nn.Module): The model replica of the calling rank.
+
+    Returns: The DistributedDataParallel wrapper of the model.
+    """
+    device_ids = [torch.cuda.current_device()] if dist.get_backend() == "nccl" else None
+    # models may leave parameters unused depending on their inputs and configuration (e.g. action-conditioning)
+    return nn.parallel.DistributedDataParallel(model, device_ids=device_ids, broadcast_buffers=False,
+                                               find_unused_parameters=True)
+
+
+def all_reduce_sums(sums: dict, count: float):
+    r"""
+    Sums up given per-key sums and given count over all ranks.
+
+    Args:
+        sums (dict): The values to sum up, per key. The keys need to be the same on all ranks.
+        count (float): The count to sum up (e.g. the number of samples the sums are taken over).
+
+    Returns: The summed up values and count (or the given ones if not part of a distributed run).
+    """
+    if not is_distributed():
+        return sums, count
+    keys = sorted(sums.keys())
+    values = torch.tensor([float(sums[k]) for k in keys] + [float(count)], dtype=torch.double,
+                          device=_reduction_device())
+    dist.all_reduce(values)
+    values = values.tolist()
+    return {k: values[i] for i, k in enumerate(keys)}, values[-1]
+
+
+def get_split_indices(num_datapoints: int, world_size: int, rank: int) -> List[int]:
+    r"""
+    Splits the datapoint indices of a dataset into contiguous parts of (nearly) equal size, one per rank.
+    Unlike with a :class:`DistributedSampler`, no datapoints are repeated to equalize the part sizes,
+    so that metrics summed up over all parts equal those of the whole dataset.
+
+    Args:
+        num_datapoints (int): The number of datapoints of the dataset.
+        world_size (int): The number of ranks.
+        rank (int): The rank whose indices are returned.
+
+    Returns: The datapoint indices of the given rank (may be empty).
+    """
+    return np.array_split(np.arange(num_datapoints), world_size)[rank].tolist()
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _distributed_worker(rank: int, fn: Callable, world_size: int, backend: str, init_method: str,
+                        num_threads: int, result_queue):
+    if rank > 0:
+        sys.stdout = open(os.devnull, "w")  # only the main process reports progress
+    torch.set_num_threads(num_threads)
+    if backend == "nccl":
+        torch.cuda.set_device(rank % torch.cuda.device_count())
+    dist.init_process_group(backend, init_method=init_method, rank=rank, world_size=world_size)
+    try:
+        result = fn()
+        if rank == 0:
+            result_queue.put(result)
+    finally:
+        dist.destroy_process_group()
+
+
+def run_distributed(fn: Callable, world_size: int, backend: str = "gloo", num_threads: Optional[int] = None):
+    r"""
+    Spawns the given number of processes on this machine, connects them as the ranks of a distributed run and calls
+    given function in each of them. If the function raises an error in any rank, all ranks are terminated and the
+    error is re-raised.
+
+    Args:
+        fn (Callable): The (picklable) function to call in each rank.
+        world_size (int): The number of processes to spawn.
+        backend (str): The communication backend (see :attr:`DIST_BACKENDS`).
+        num_threads (Optional[int]): The number of CPU threads each rank uses. If None, the available threads are shared equally among the ranks.
+
+    Returns: The return value of the function in rank 0.
+    """
+    if backend not in DIST_BACKENDS:
+        raise ValueError(f"invalid distributed backend '{backend}' (supported: {DIST_BACKENDS})")
+    if not dist.is_available():
+        raise ValueError("distributed training is not supported by this PyTorch installation")
+    if backend == "nccl" and torch.cuda.device_count() < world_size:
+        raise ValueError(f"backend 'nccl' needs a GPU per process ({world_size} processes, "
+                         f"{torch.cuda.device_count()} GPUs)")
+    num_threads = num_threads or max(1, torch.get_num_threads() // world_size)
+    result_queue = mp.get_context("spawn").SimpleQueue()
+    mp.spawn(_distributed_worker, nprocs=world_size, join=True,
+             args=(fn, world_size, backend, f"tcp://127.0.0.1:{_free_port()}", num_threads, result_queue))
+    return result_queue.get()
@@ -0,0 +1,342 @@
+r"""
+This module contains the evaluation loop used for testing: Obtaining the predictions of the tested models on the
+test data and assessing them with the specified metrics, either in the calling process or in worker processes.
+"""
+import queue
+import traceback
+from itertools import chain
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+from vp_suite.base import VPData, VPSubset
+from vp_suite.measure.aggregation import MetricAggregator
+from vp_suite.measure.fvd.fvd import I3DFeatureCache
+from vp_suite.measure.metric_provider import PredictionMetricProvider
+from vp_suite.measure.pipeline import AsyncMetricPipeline
+from vp_suite.utils.utils import get_loader
+from vp_suite.utils.checkpoint import snapshot
+from vp_suite.utils.precision import autocast
+
+_POLL_INTERVAL = 1.0  #: The interval (in seconds) in which the liveness of worker processes is checked while waiting.
+
+
+def predict(model, preprocess, postprocess, data: VPData, config: dict):
+    r"""
+    Obtains the prediction of given model for given batch of test data.
+
+    Args:
+        model (VPModel): The model to obtain the prediction from.
+        preprocess (nn.Module): The adapter converting the test data to the format expected by the model.
+        postprocess (nn.Module): The adapter converting the model's predictions to the test data format.
+        data (VPData): The batch of test data.
+        config (dict): The test configuration.
+
+    Returns: The prediction and the corresponding ground truth.
+    """
+    input, target, actions = model.unpack_data(data, config)
+    input = preprocess(input)  # test format to model format
+    with autocast(config):
+        if getattr(model, "use_actions", False):
+            pred, _ = model(input, pred_frames=config["pred_frames"], actions=actions)
+        else:
+            pred, _ = model(input, pred_frames=config["pred_frames"])
+    return postprocess(pred.float()), target  # model format to test format
+
+
+def _to_device(obj: Any, device) -> Any:
+    r"""
+    Returns: A copy of the given tensor or (nested) dict, list or tuple in which all tensors reside on given device.
+    """
+    if isinstance(obj, torch.Tensor):
+        return obj.to(device)
+    if isinstance(obj, dict):
+        return type(obj)((k, _to_device(v, device)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_to_device(v, device) for v in obj)
+    return obj
+
+
+def evaluate_batches(batches: Iterable[VPData], model_info_list, config: dict,
+                     feature_cache_fp: Optional[Path] = None,
+                     with_target_features: bool = False) -> Optional[I3DFeatureCache]:
+    r"""
+    Evaluates all given models on the given batches of test data, adding the metrics of each model to its aggregator.
+
+    Args:
+        batches (Iterable[VPData]): The batches of test data.
+        model_info_list (Any): A list of (model, preprocessing, postprocessing, metric aggregator) tuples.
+        config (dict): The test configuration.
+        feature_cache_fp (Optional[Path]): If specified, the I3D features of the ground truth sequences are shared across models using a feature cache stored at this location.
+        with_target_features (bool): If set to True, each item of `batches` is a pair of a batch and its target features (see :meth:`PredictionMetricProvider.extract_target_features()`, with `all_frame_cnts=True`), which are used instead of being computed again.
+
+    Returns: The used I3D feature cache (if any).
+    """
+    metric_provider = PredictionMetricProvider(config)
+
+    # the I3D features of the ground truth sequences are shared across models (and runs, via the cache file)
+    feature_cache = None
+    if (feature_cache_fp is not None or with_target_features) and "fvd" in metric_provider.metrics:
+        feature_cache = I3DFeatureCache(feature_cache_fp)
+        metric_provider.metrics["fvd"].feature_cache = feature_cache
+
+    for (model, _, _, _) in model_info_list:
+        model.eval()
+    try:
+        with torch.inference_mode():
+            # metrics can be computed asynchronously, overlapping with model inference
+            metric_pipeline = None
+            if config["metric_workers"] > 0:
+                metric_pipeline = AsyncMetricPipeline(metric_provider, config["metric_workers"],
+                                                      config["metric_queue_size"], config["accumulate_metrics"])
+
+            for item in batches:
+                target_features = dict()  # target-side metric features, shared by all models
+                if with_target_features:
+                    data, target_features = item
+                    if feature_cache is not None:  # grow-only, as asynchronous metric jobs may still read older entries
+                        feature_cache.features.update(target_features.pop("fvd", dict()))
+                    target_features = _to_device(target_features, config["device"])
+                else:
+                    data = item
+                metric_job = []
+                for (model, preprocess, postprocess, metric_aggregator) in model_info_list:
+                    pred, target = predict(model, preprocess, postprocess, data, config)
+                    if metric_pipeline is not None:
+                        metric_job.append((metric_aggregator, pred, target))
+                        continue
+
+                    # per-sample metrics: for each frame count, a dict of metric values (one per sample)
+                    accumulators = metric_aggregator.accumulators if config["accumulate_metrics"] else None
+                    cur_metrics = metric_provider.get_metrics(pred, target, all_frame_cnts=True, reduction="none",
+                                                              accumulators=accumulators,
+                                                              target_features=target_features)
+                    metric_aggregator.update(cur_metrics)
+                if metric_pipeline is not None:
+                    metric_pipeline.submit(metric_job, target_features if with_target_features else None)
+            if metric_pipeline is not None:
+                metric_pipeline.finish()
+    finally:
+        if feature_cache is not None:
+            metric_provider.metrics["fvd"].feature_cache = None  # the FVD instance is shared within the process
+        for (model, _, _, _) in model_info_list:
+            model.train()
+    return feature_cache
+
+
+def _check_workers(processes: List[mp.Process]):
+    for p in processes:
+        if p.exitcode is not None and p.exitcode != 0:
+            raise RuntimeError(f"test worker process {p.name} terminated unexpectedly (exit code: {p.exitcode})")
+
+
+def _put(q: mp.Queue, item, processes: List[mp.Process]):
+    r"""
+    Puts the item into the given queue, blocking while it is full (but raising if a worker process has died).
+    """
+    while True:
+        try:
+            q.put(item, timeout=_POLL_INTERVAL)
+            return
+        except queue.Full:
+            _check_workers(processes)
+
+
+def _collect_results(result_queue: mp.Queue, processes: List[mp.Process]):
+    r"""
+    Waits for the results of all worker processes, re-raising errors that occurred in the workers.
+
+    Returns: The workers' results, ordered by worker index.
+    """
+    results = dict()
+    while len(results) < len(processes):
+        try:
+            worker_idx, result, error = result_queue.get(timeout=_POLL_INTERVAL)
+        except queue.Empty:
+            _check_workers(processes)
+            continue
+        if error is not None:
+            raise RuntimeError(f"test worker process {worker_idx} failed:\n{error}")
+        results[worker_idx] = result
+    return [results[i] for i in range(len(processes))]
+
+
+def _worker_model_info(model_info):
+    r"""
+    Returns a copy of the given model info tuple with an empty aggregator, to be filled by a worker process.
+    """
+    model, preprocess, postprocess, _ = model_info
+    return model, preprocess, postprocess, MetricAggregator()
+
+
+def _worker_result(model_info_list, feature_cache: Optional[I3DFeatureCache]):
+    new_features = feature_cache.new_features() if feature_cache is not None else dict()
+    return [metric_aggregator for (_, _, _, metric_aggregator) in model_info_list], new_features
+
+
+def _model_worker(worker_idx: int, model_info, data_queue: mp.Queue, result_queue: mp.Queue, config: dict,
+                  num_threads: int):
+    try:
+        torch.set_num_threads(num_threads)
+        batches = iter(data_queue.get, None)  # (batch, target features) pairs
+        evaluate_batches(batches, [model_info], config, with_target_features=True)
+        result_queue.put((worker_idx, _worker_result([model_info], None), None))
+    except Exception:
+        result_queue.put((worker_idx, None, traceback.format_exc()))
+
+
+def _shard_worker(worker_idx: int, model_info_list, data, result_queue: mp.Queue, config: dict,
+                  feature_cache_fp: Optional[Path], num_threads: int):
+    try:
+        torch.set_num_threads(num_threads)
+        batches = get_loader(data, config["test_batch_size"], config)
+        feature_cache = evaluate_batches(batches, model_info_list, config, feature_cache_fp)
+        result_queue.put((worker_idx, _worker_result(model_info_list, feature_cache), None))
+    except Exception:
+        result_queue.put((worker_idx, None, traceback.format_exc()))
+
+
+def _run_workers(processes: List[mp.Process], result_queue: mp.Queue, feed: Iterable[Tuple[mp.Queue, Any]] = ()):
+    r"""
+    Starts the given worker processes, puts the (queue, item) pairs of the given feed into their queues
+    and waits for their results. If anything goes wrong, all workers are terminated.
+
+    Returns: The workers' results, ordered by worker index.
+    """
+    for p in processes:
+        p.start()
+    try:
+        for q, item in feed:
+            _put(q, item, processes)
+        return _collect_results(result_queue, processes)
+    except BaseException:
+        for p in processes:
+            p.terminate()
+        raise
+    finally:
+        for p in processes:
+            p.join()
+
+
+def _merge_worker_results(model_info_list, worker_results, feature_cache_fp: Optional[Path]):
+    r"""
+    Merges the aggregated metrics and new I3D features obtained from worker processes (in worker order).
+    Each worker result is accompanied by the indices of the models the worker has evaluated.
+    """
+    feature_cache = I3DFeatureCache(feature_cache_fp) if feature_cache_fp is not None else None
+    for model_ids, (aggregators, new_features) in worker_results:
+        for model_idx, aggregator in zip(model_ids, aggregators):
+            model_info_list[model_idx][3].merge(aggregator)
+        if feature_cache is not None:
+            for key, features in new_features.items():
+                feature_cache.put(key, features)
+    return feature_cache
+
+
+def _threads_per_worker(config: dict, num_workers: int):
+    return max(1, (config["test_threads"] or torch.get_num_threads()) // num_workers)
+
+
+def evaluate_models_in_processes(batches: Iterable[VPData], model_info_list, config: dict,
+                                 feature_cache_fp: Optional[Path] = None) -> Optional[I3DFeatureCache]:
+    r"""
+    Evaluates all given models on the given batches of test data, evaluating each model in a separate worker process.
+    The calling process loads the test data and feeds each batch to all workers via queues,
+    through which the batches' tensors are passed in shared memory. As the ground truth is the same for all models,
+    the calling process also extracts its target-side metric features (LPIPS, SSIM and, if assessing FVD,
+    the I3D features) once per batch and passes them along, so that the workers only assess the predictions.
+    Each worker gets an equal share of the CPU threads available for testing. Finally, the aggregated metrics
+    of each worker are merged into the aggregators of the given model info list.
+
+    Args:
+        batches (Iterable[VPData]): The batches of test data.
+        model_info_list (Any): A list of (model, preprocessing, postprocessing, metric aggregator) tuples.
+        config (dict): The test configuration.
+        feature_cache_fp (Optional[Path]): If specified, the I3D features of the ground truth sequences are cached at this location.
+
+    Returns: The I3D feature cache containing the ground truth features computed for the test data (if any).
+    """
+    metric_provider = PredictionMetricProvider(config)
+    feature_cache = None
+    if "fvd" in metric_provider.metrics:  # the I3D features are extracted here, so the cache is held here as well
+        feature_cache = I3DFeatureCache(feature_cache_fp)
+        metric_provider.metrics["fvd"].feature_cache = feature_cache
+    target_model = model_info_list[0][0]  # all models are assessed against the same ground truth
+
+    def attach_target_features(data: VPData):
+        with torch.no_grad():
+            _, target, _ = target_model.unpack_data(data, config)
+            return data, snapshot(metric_provider.extract_target_features(target, all_frame_cnts=True))
+
+    ctx = mp.get_context("spawn")
+    num_threads = _threads_per_worker(config, len(model_info_list))
+    data_queues = [ctx.Queue(maxsize=config["metric_queue_size"]) for _ in model_info_list]
+    result_queue = ctx.Queue()
+    processes = [ctx.Process(target=_model_worker, name=f"test-model-{i}",
+                             args=(i, _worker_model_info(model_info), data_queues[i], result_queue, config,
+                                   num_threads))
+                 for i, model_info in enumerate(model_info_list)]
+    feed = chain(((data_queue, item) for item in map(attach_target_features, batches) for data_queue in data_queues),
+                 ((data_queue, None) for data_queue in data_queues))
+    try:
+        results = _run_workers(processes, result_queue, feed)
+    finally:
+        if feature_cache is not None:
+            metric_provider.metrics["fvd"].feature_cache = None  # the FVD instance is shared within the process
+    _merge_worker_results(model_info_list, [([i], result) for i, result in enumerate(results)], None)
+    return feature_cache if feature_cache_fp is not None else None
+
+
+def get_shard_indices(num_datapoints: int, batch_size: int, num_shards: int) -> List[range]:
+    r"""
+    Splits the datapoint indices of a dataset into contiguous shards whose sizes are multiples of the batch size
+    (except for the last one), so that the batches of all shards together equal the batches of the whole dataset.
+
+    Args:
+        num_datapoints (int): The number of datapoints of the dataset.
+        batch_size (int): The batch size used for loading the data.
+        num_shards (int): The (maximum) number of shards. If there are fewer batches than shards, fewer shards are returned.
+
+    Returns: The datapoint indices of each (non-empty) shard.
+    """
+    num_batches = -(-num_datapoints // batch_size)
+    shard_batches = [b for b in np.array_split(np.arange(num_batches), num_shards) if len(b) > 0]
+    return [range(b[0] * batch_size, min((b[-1] + 1) * batch_size, num_datapoints)) for b in shard_batches]
+
+
+def evaluate_shards_in_processes(data, model_info_list, config: dict,
+                                 feature_cache_fp: Optional[Path] = None) -> Optional[I3DFeatureCache]:
+    r"""
+    Evaluates all given models on the given test data, splitting the data into contiguous shards that are evaluated
+    in separate worker processes. Each worker loads its shard with its own DataLoader, evaluates its own replica of
+    the models and gets an equal share of the CPU threads available for testing. Finally, the aggregated metrics
+    of all shards are merged (in shard order) into the aggregators of the given model info list.
+    As the shards are aligned to the test batch size, the merged results equal those of evaluating in-process.
+
+    Args:
+        data (Union[VPDataset, VPSubset]): The test data.
+        model_info_list (Any): A list of (model, preprocessing, postprocessing, metric aggregator) tuples.
+        config (dict): The test configuration.
+        feature_cache_fp (Optional[Path]): If specified, the I3D features of the ground truth sequences are cached at this location.
+
+    Returns: The I3D feature cache containing the features computed by the workers (if any).
+    """
+    if getattr(data, "ON_THE_FLY", False):
+        raise ValueError("test data that is generated on-the-fly can't be split into shards")
+    if config["test_processes"] < 1:
+        raise ValueError(f"number of test processes needs to be positive (given: {config['test_processes']})")
+    shard_indices = get_shard_indices(len(data), config["test_batch_size"], config["test_processes"])
+    ctx = mp.get_context("spawn")
+    num_threads = _threads_per_worker(config, len(shard_indices))
+    result_queue = ctx.Queue()
+    worker_model_info_list = [_worker_model_info(model_info) for model_info in model_info_list]
+    processes = [ctx.Process(target=_shard_worker, name=f"test-shard-{i}",
+                             args=(i, worker_model_info_list, VPSubset(data, list(indices)), result_queue, config,
+                                   feature_cache_fp, num_threads))
+                 for i, indices in enumerate(shard_indices)]
+    results = _run_workers(processes, result_queue)
+    model_ids = list(range(len(model_info_list)))
+    return _merge_worker_results(model_info_list, [(model_ids, result) for result in results], feature_cache_fp)
@@ -0,0 +1,108 @@
+r"""
+This module contains utilities for running models in the channels_last memory format, i.e. with the channels stored
+as the innermost (fastest-changing) dimension of frames and feature maps (NHWC instead of NCHW, and NDHWC instead of
+NCDHW for 3D convolutions). The logical tensor shapes stay the same.
+Sequences of frames ([b, t, c, h, w]) are stored so that each of their frames is in the channels_last format.
+"""
+from typing import List, Optional
+
+import torch
+from torch import nn as nn
+
+
+def is_channels_last(x: torch.Tensor, channel_dim: int = -3) -> bool:
+    r"""
+    Args:
+        x (torch.Tensor): A frame, feature map or sequence of frames.
+        channel_dim (int): The channel dimension of given tensor.
+
+    Returns: True if the channels are the innermost dimension of given tensor in memory.
+    """
+    return x.dim() in (4, 5) and x.stride(channel_dim) == 1 and x.shape[-2:].numel() > 1
+
+
+def _innermost_channels(x: torch.Tensor, order: List[int]) -> torch.Tensor:
+    r"""
+    Returns: A copy of given tensor whose dimensions are laid out in memory in given order (outermost first).
+    Unlike `contiguous()`, this also sets the strides if the channel dimension has size 1.
+    """
+    inverse_order = sorted(range(len(order)), key=lambda d: order[d])
+    out = torch.empty([x.shape[d] for d in order], dtype=x.dtype, device=x.device).permute(inverse_order)
+    return out.copy_(x)
+
+
+def to_channels_last(x: torch.Tensor, channel_dim: int = -3) -> torch.Tensor:
+    r"""
+    Stores given tensor in the channels_last format: Frames and 2D feature maps ([b, c, h, w]) are stored like
+    torch.channels_last, 3D feature maps ([b, c, t, h, w], channel_dim = 1) like torch.channels_last_3d and sequences of
+    frames ([b, t, c, h, w]) such that each frame is in torch.channels_last.
+
+    Args:
+        x (torch.Tensor): A frame, feature map or sequence of frames.
+        channel_dim (int): The channel dimension of given tensor.
+
+    Returns: The converted tensor (or given tensor if it already is in the channels_last format).
+    """
+    if x.dim() == 4:
+        order = [0, 2, 3, 1]
+    elif x.dim() == 5 and channel_dim in [1, -4]:
+        order = [0, 2, 3, 4, 1]
+    elif x.dim() == 5:
+        order = [0, 1, 3, 4, 2]
+    else:
+        raise ValueError(f"channels_last needs 4- or 5-dimensional tensors (given: {x.dim()} dimensions)")
+    if is_channels_last(x, channel_dim) and x.permute(order).is_contiguous():
+        return x
+    return _innermost_channels(x, order)
+
+
+def match_memory_format(x: torch.Tensor, ref: Optional[torch.Tensor], channel_dim: int = -3) -> torch.Tensor:
+    r"""
+    Converts given tensor to the channels_last format if the reference tensor is in that format.
+    Used for tensors that are created within the models (e.g. initial recurrent states), so that they don't
+    revert the computations they are part of to the default format.
+
+    Args:
+        x (torch.Tensor): The tensor to convert.
+        ref (Optional[torch.Tensor]): The reference tensor (if None, given tensor is returned unchanged).
+        channel_dim (int): The channel dimension of both tensors.
+
+    Returns: The converted tensor (or given tensor if no conversion is needed).
+    """
+    if ref is None or not is_channels_last(ref, channel_dim) or is_channels_last(x, channel_dim):
+        return x
+    return to_channels_last(x, channel_dim)
+
+
+def stack_frames(frames: List[torch.Tensor]) -> torch.Tensor:
+    r"""
+    Stacks given frames or feature maps ([b, c, h, w]) to a sequence ([b, t, c, h, w]) like `torch.stack(frames, dim=1)`
+    does, but keeps the frames in the channels_last format if they are in that format.
+
+    Args:
+        frames (List[torch.Tensor]): The frames to stack.
+
+    Returns: The stacked sequence.
+    """
+    if not is_channels_last(frames[0]):
+        return torch.stack(frames, dim=1)
+    return torch.stack([frame.permute(0, 2, 3, 1) for frame in frames], dim=1).permute(0, 1, 4, 2, 3)
+
+
+def model_to_channels_last(model: nn.Module) -> nn.Module:
+    r"""
+    Converts the 4-dimensional parameters and buffers of given model (e.g. 2D convolution weights) to
+    torch.channels_last and the 5-dimensional ones (e.g. 3D convolution weights) to torch.channels_last_3d (in-place).
+
+    Args:
+        model (nn.Module): The model to convert.
+
+    Returns: The converted model.
+    """
+    def convert(t: torch.Tensor):
+        if t.dim() == 4:
+            return t.contiguous(memory_format=torch.channels_last)
+        elif t.dim() == 5:
+            return t.contiguous(memory_format=torch.channels_last_3d)
+        return t
+    return model._apply(convert)
@@ -0,0 +1,76 @@
+r"""
+This module contains utilities for running models in mixed precision, i.e. with the forward passes
+executed under :class:`torch.autocast` in a reduced-precision floating point format.
+"""
+from contextlib import contextmanager
+from typing import Optional
+
+import torch
+
+AUTOCAST_DTYPES = {"bf16": torch.bfloat16, "fp16": torch.float16}  #: The supported reduced-precision formats and their corresponding dtypes.
+
+
+def _device_type(device) -> str:
+    return "cuda" if str(device).startswith("cuda") else "cpu"
+
+
+def get_autocast_dtype(precision: Optional[str], device) -> Optional[torch.dtype]:
+    r"""
+    Determines the autocast dtype for given precision setting and device.
+
+    Args:
+        precision (Optional[str]): The precision setting. None means full precision (float32), 'auto' chooses bfloat16 on the CPU and float16 on the GPU.
+        device (str): The device the model runs on.
+
+    Returns: The dtype to autocast to, or None if running in full precision.
+    """
+    if precision is None:
+        return None
+    device_type = _device_type(device)
+    if precision == "auto":
+        precision = "fp16" if device_type == "cuda" else "bf16"
+    if precision not in AUTOCAST_DTYPES.keys():
+        raise ValueError(f"invalid precision '{precision}' (supported: None, 'auto', {list(AUTOCAST_DTYPES.keys())})")
+    if precision == "fp16" and device_type == "cpu":
+        raise ValueError("float16 autocast is not supported on the CPU -> use 'bf16' instead")
+    return AUTOCAST_DTYPES[precision]
+
+
+def autocast(config: dict):
+    r"""
+    Args:
+        config (dict): The run configuration, specifying the device and the precision setting.
+
+    Returns: An autocast context for the configured device and precision (disabled if running in full precision).
+    """
+    device_type = _device_type(config["device"])
+    dtype = get_autocast_dtype(config.get("precision", None), config["device"])
+    if dtype is None:
+        return torch.autocast(device_type=device_type, enabled=False)
+    return torch.autocast(device_type=device_type, dtype=dtype)
+
+
+@contextmanager
+def full_precision():
+    r"""
+    A context (also usable as function decorator) in which autocasting is disabled on all devices,
+    so that numerically sensitive computations run in the precision of their inputs.
+    """
+    with torch.autocast(device_type="cpu", enabled=False), torch.autocast(device_type="cuda", enabled=False):
+        yield
+
+
+def create_grad_scaler(config: dict):
+    r"""
+    Creates a gradient scaler for the configured precision. Gradient scaling is only needed for float16 training,
+    as bfloat16 covers the same exponent range as float32.
+
+    Args:
+        config (dict): The run configuration, specifying the device and the precision setting.
+
+    Returns: A GradScaler if training in float16 mixed precision, None otherwise.
+    """
+    dtype = get_autocast_dtype(config.get("precision", None), config["device"])
+    if dtype != torch.float16:
+        return None
+    return torch.cuda.amp.GradScaler()
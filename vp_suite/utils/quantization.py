@@ -0,0 +1,186 @@
+r"""
+This module contains utilities for quantizing video prediction models to int8 for CPU inference.
+Linear layers and LSTM cells are quantized dynamically (int8 weights, activations quantized on the fly),
+while the convolutional encoder and decoder blocks are quantized statically (int8 weights and activations, with
+activation ranges calibrated on sample data). The recurrent cells are left in floating point.
+"""
+import warnings
+from copy import deepcopy
+from typing import Iterable, Optional
+
+import torch
+from torch import nn as nn
+from torch import quantization as tq
+
+from vp_suite.base import VPData
+from vp_suite.measure.aggregation import MetricAggregator
+from vp_suite.utils.compilation import STEP_MODULE_CLASSES
+from vp_suite.utils.evaluation import predict, evaluate_batches
+
+QUANT_BACKENDS = ["fbgemm", "qnnpack"]  #: The supported quantization backends: FBGEMM for x86 CPUs, QNNPACK for ARM CPUs.
+DYNAMIC_QUANT_MODULE_CLASSES = {nn.Linear, nn.LSTMCell}  #: The module types that get quantized dynamically.
+STATIC_QUANT_CONV_CLASSES = (nn.Conv2d, nn.Conv3d, nn.ConvTranspose2d)  #: The convolution types that get quantized statically.
+_STATIC_QUANT_LEAF_CLASSES = STATIC_QUANT_CONV_CLASSES + (
+    nn.BatchNorm2d, nn.BatchNorm3d, nn.GroupNorm, nn.ReLU, nn.LeakyReLU, nn.MaxPool2d, nn.MaxPool3d, nn.Identity
+)  # module types that can be part of statically quantized blocks
+_SUPPORTED_PADDING_MODES = ["zeros", "reflect"]  # padding modes supported by quantized convolutions
+_FUSABLE_PATTERNS = [
+    ((nn.Conv2d, nn.BatchNorm2d, nn.ReLU), (nn.Conv3d, nn.BatchNorm3d, nn.ReLU)),
+    ((nn.Conv2d, nn.BatchNorm2d), (nn.Conv3d, nn.BatchNorm3d)),
+    ((nn.Conv2d, nn.ReLU), (nn.Conv3d, nn.ReLU)),
+]  # module sequences that get fused into a single module before static quantization, longest first
+
+
+def _is_static_quantizable(module: nn.Module):
+    r"""
+    Returns: True if given module is a convolution or a sequential block containing convolutions, normalization,
+    activation and pooling layers only (which can be executed in int8 as a whole).
+    """
+    if isinstance(module, nn.Sequential):
+        leaves = list(module.modules())[1:]
+        return any(isinstance(m, STATIC_QUANT_CONV_CLASSES) for m in leaves) \
+            and all(isinstance(m, (nn.Sequential,) + _STATIC_QUANT_LEAF_CLASSES) for m in leaves) \
+            and all(_is_static_quantizable(m) for m in leaves if isinstance(m, STATIC_QUANT_CONV_CLASSES))
+    return isinstance(module, STATIC_QUANT_CONV_CLASSES) and module.padding_mode in _SUPPORTED_PADDING_MODES
+
+
+def _fuse_sequential(block: nn.Sequential):
+    r"""
+    Fuses the convolution-batchnorm-relu sequences of given sequential block (in-place).
+    """
+    names, modules = zip(*block.named_children())
+    groups, i = [], 0
+    while i < len(modules):
+        for patterns in _FUSABLE_PATTERNS:
+            n = len(patterns[0])
+            types = tuple(type(m) for m in modules[i:i + n])
+            if types in patterns:
+                groups.append(list(names[i:i + n]))
+                i += n
+                break
+        else:
+            i += 1
+    if len(groups) > 0:
+        tq.fuse_modules(block, groups, inplace=True)
+
+
+def _wrap_static_blocks(module: nn.Module, qconfig, transpose_qconfig, wrappers: dict = None):
+    r"""
+    Wraps the statically quantizable blocks within given module (in-place) so that they quantize their inputs
+    and de-quantize their outputs. Recurrent cells are skipped.
+
+    Returns: The number of wrapped blocks.
+    """
+    wrappers = dict() if wrappers is None else wrappers  # blocks that are registered multiple times share a wrapper
+    n_wrapped = 0
+    for name, child in module.named_children():
+        if isinstance(child, STEP_MODULE_CLASSES) or isinstance(child, tq.QuantWrapper):
+            continue
+        if child in wrappers:
+            setattr(module, name, wrappers[child])
+            continue
+        if not _is_static_quantizable(child):
+            n_wrapped += _wrap_static_blocks(child, qconfig, transpose_qconfig, wrappers)
+            continue
+        if isinstance(child, nn.Sequential):
+            _fuse_sequential(child)
+        wrapper = tq.QuantWrapper(child)
+        wrapper.qconfig = qconfig
+        for m in child.modules():
+            if isinstance(m, nn.ConvTranspose2d):
+                m.qconfig = transpose_qconfig  # per-channel weight quantization is not supported for these
+        setattr(module, name, wrapper)
+        wrappers[child] = wrapper
+        n_wrapped += 1
+    return n_wrapped
+
+
+def quantize_model(model: nn.Module, calibration_batches: Iterable[VPData] = None, config: dict = None,
+                   preprocess: nn.Module = None, static: bool = True, dynamic: bool = True,
+                   backend: str = "fbgemm"):
+    r"""
+    Creates an int8-quantized copy of given model for CPU inference. The copy is a regular pickleable model,
+    so that it can be saved with `torch.save()` and loaded with :meth:`VPSuite.load_model()`.
+
+    Args:
+        model (nn.Module): The model to quantize. Needs to reside on the CPU.
+        calibration_batches (Iterable[VPData]): The batches of data the activation ranges are calibrated on (only needed for static quantization).
+        config (dict): The run configuration used to obtain predictions from the calibration batches.
+        preprocess (nn.Module): The adapter converting the calibration data to the format expected by the model.
+        static (bool): Whether to statically quantize the convolutional blocks.
+        dynamic (bool): Whether to dynamically quantize the linear layers and LSTM cells.
+        backend (str): The quantization backend (see :attr:`QUANT_BACKENDS`).
+
+    Returns: The quantized model.
+    """
+    if backend not in QUANT_BACKENDS:
+        raise ValueError(f"invalid quantization backend '{backend}' (supported: {QUANT_BACKENDS})")
+    if backend not in torch.backends.quantized.supported_engines:
+        raise ValueError(f"quantization backend '{backend}' is not supported on this machine")
+    if str(getattr(model, "device", "cpu")) != "cpu":
+        raise ValueError("quantized models run on the CPU only -> quantize a model that has been created on the CPU")
+    if static and calibration_batches is None:
+        raise ValueError("static quantization needs calibration data")
+    torch.backends.quantized.engine = backend
+
+    quantized = deepcopy(model).eval()
+    if static:
+        qconfig = tq.get_default_qconfig(backend)
+        transpose_qconfig = tq.QConfig(activation=qconfig.activation, weight=tq.default_weight_observer)
+        if _wrap_static_blocks(quantized, qconfig, transpose_qconfig) > 0:
+            tq.prepare(quantized, inplace=True)
+            calibrate(quantized, calibration_batches, config, preprocess)
+            tq.convert(quantized, inplace=True)
+        else:
+            warnings.warn(f"model '{model.NAME}' does not contain statically quantizable blocks")
+    if dynamic:
+        tq.quantize_dynamic(quantized, DYNAMIC_QUANT_MODULE_CLASSES, dtype=torch.qint8, inplace=True)
+
+    quantized.NAME = f"{model.NAME} (int8)"
+    quantized.TRAINABLE = False
+    quantized.quantization_backend = backend
+    return quantized
+
+
+def calibrate(model: nn.Module, calibration_batches: Iterable[VPData], config: dict,
+              preprocess: Optional[nn.Module] = None):
+    r"""
+    Feeds the given batches through given model prepared for static quantization,
+    so that its observers record the ranges of the activations.
+
+    Args:
+        model (nn.Module): The prepared model.
+        calibration_batches (Iterable[VPData]): The batches of calibration data.
+        config (dict): The run configuration used to obtain predictions from the calibration batches.
+        preprocess (Optional[nn.Module]): The adapter converting the calibration data to the format expected by the model.
+    """
+    preprocess = preprocess or nn.Identity()
+    model.eval()
+    with torch.no_grad():
+        for data in calibration_batches:
+            predict(model, preprocess, nn.Identity(), data, config)
+
+
+def quantization_report(model: nn.Module, quantized: nn.Module, batches: Iterable[VPData], config: dict,
+                        preprocess: Optional[nn.Module] = None, postprocess: Optional[nn.Module] = None):
+    r"""
+    Evaluates the float model and its quantized copy on given batches with the configured metrics.
+
+    Args:
+        model (nn.Module): The float model.
+        quantized (nn.Module): The quantized model.
+        batches (Iterable[VPData]): The batches of evaluation data.
+        config (dict): The run configuration specifying the metrics.
+        preprocess (Optional[nn.Module]): The adapter converting the evaluation data to the format expected by the models.
+        postprocess (Optional[nn.Module]): The adapter converting the models' predictions to the evaluation data format.
+
+    Returns: For each metric, its value for the float model, the quantized model and their difference
+    (over the full prediction horizon).
+    """
+    preprocess, postprocess = preprocess or nn.Identity(), postprocess or nn.Identity()
+    model_info_list = [(m, preprocess, postprocess, MetricAggregator()) for m in [model, quantized]]
+    evaluate_batches(batches, model_info_list, config)
+    float_metrics, quantized_metrics = [aggregator.result()[-1] for (_, _, _, aggregator) in model_info_list]
+    return {metric: {"float": float_metrics[metric], "int8": quantized_metrics[metric],
+                     "diff": quantized_metrics[metric] - float_metrics[metric]}
+            for metric in float_metrics.keys()}
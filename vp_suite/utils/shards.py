@@ -0,0 +1,301 @@
+r"""
+This module contains utilities for storing prepared datasets as sequential tar shards and for streaming them back.
+Reading few large files sequentially is much faster than reading many small files at random
+(e.g. on network storage), which is the typical access pattern of the map-style datasets.
+
+Each shard is a tar archive holding the datapoints of the exported dataset split in order.
+Every datapoint is stored as three members sharing the same key: `<key>.frames.npy`, `<key>.actions.npy`
+and `<key>.origin.txt`. An index file (`index.json`) lists the shards, their sizes and the dataset configuration.
+The training and validation splits of a dataset can be exported together using :meth:`export_splits_to_shards()`
+and then be trained on by loading them with `VPSuite.load_dataset(..., shards_dir=...)`.
+"""
+import io
+import json
+import tarfile
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+import numpy as np
+import torch
+from torch.utils.data import IterableDataset, Subset
+from tqdm import tqdm
+
+from vp_suite.base import VPData, VPVideoDataset
+from vp_suite.utils.streaming import VPVideoStream, get_partition, get_stream_rng, shuffle_buffered
+
+SHARD_INDEX_FILENAME = "index.json"  #: The file name of the index file that accompanies the exported shards.
+
+
+def _add_to_tar(tar: tarfile.TarFile, name: str, payload: bytes):
+    info = tarfile.TarInfo(name)
+    info.size = len(payload)
+    tar.addfile(info, io.BytesIO(payload))
+
+
+def _npy_bytes(x: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, x, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def _iter_datapoints(dataset) -> Iterator[VPData]:
+    r"""
+    Yields the datapoints of the given dataset (or subset). The windows of video datasets are yielded sequence by
+    sequence (see :class:`~vp_suite.utils.streaming.VPVideoStream`), so that each video is decoded only once.
+    """
+    video_dataset = dataset
+    while isinstance(video_dataset, Subset):
+        video_dataset = video_dataset.dataset
+    if isinstance(video_dataset, VPVideoDataset):
+        yield from VPVideoStream(dataset, shuffle=False)
+    else:
+        for i in range(len(dataset)):
+            yield dataset[i]
+
+
+def export_to_shards(dataset, out_dir: Union[str, Path], samples_per_shard: int = 1000, float_frames: bool = False):
+    r"""
+    Writes the datapoints of the given (prepared) dataset split into sequential tar shards.
+    By default, the frames are stored as 8-bit integers, like the images/videos of the datasets. This is lossless
+    as long as the frames are not resized or augmented by the dataset's transformations.
+
+    Args:
+        dataset (Union[VPDataset, VPSubset]): The dataset split to export. Its sequence length needs to be set.
+        out_dir (Union[str, Path]): The directory to write the shards and the index file to.
+        samples_per_shard (int): The maximum number of datapoints per shard.
+        float_frames (bool): If set to True, frames are stored as 32-bit floats instead of 8-bit integers (lossless for resized/augmented frames, but 4x larger).
+
+    Returns: The index dictionary that has been written to the index file.
+    """
+    if not dataset.ready_for_usage:
+        raise RuntimeError("dataset is not ready for usage (call set_seq_len() first)")
+    if samples_per_shard < 1:
+        raise ValueError(f"parameter 'samples_per_shard' needs to be positive (given: {samples_per_shard})")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    value_range = [dataset.value_range_min, dataset.value_range_max]
+
+    shards = []
+    tar = None
+    for i, data in enumerate(tqdm(_iter_datapoints(dataset), total=len(dataset), postfix="exporting shards")):
+        if i % samples_per_shard == 0:
+            if tar is not None:
+                tar.close()
+            shard_name = f"shard-{len(shards):06d}.tar"
+            shards.append({"name": shard_name, "samples": 0})
+            tar = tarfile.open(out_dir / shard_name, "w")
+        frames = data["frames"].cpu().numpy()  # [t, c, h, w]
+        if not float_frames:
+            frames = (frames - value_range[0]) / (value_range[1] - value_range[0])
+            frames = np.round(np.clip(frames, 0.0, 1.0) * 255).astype(np.uint8)
+        key = f"{i:09d}"
+        _add_to_tar(tar, f"{key}.frames.npy", _npy_bytes(frames))
+        _add_to_tar(tar, f"{key}.actions.npy", _npy_bytes(data["actions"].cpu().numpy()))
+        _add_to_tar(tar, f"{key}.origin.txt", data["origin"].encode("utf-8"))
+        shards[-1]["samples"] += 1
+    if tar is not None:
+        tar.close()
+
+    index = {
+        "shards": shards,
+        "num_samples": len(dataset),
+        "quantized": not float_frames,
+        "value_range": value_range,
+        "total_frames": dataset.total_frames,
+        "seq_step": dataset.seq_step,
+        "img_shape": list(dataset.img_shape),
+        "action_size": dataset.ACTION_SIZE,
+        "dataset_config": dataset.config,
+    }
+    with open(out_dir / SHARD_INDEX_FILENAME, "w") as index_file:
+        json.dump(index, index_file, default=lambda o: str(o))
+    return index
+
+
+def export_splits_to_shards(dataset, out_dir: Union[str, Path], samples_per_shard: int = 1000,
+                            float_frames: bool = False) -> dict:
+    r"""
+    Writes the training and validation splits of the given (prepared) training dataset into sequential tar shards,
+    each split into its own sub-directory of the given directory (see :meth:`export_to_shards()`).
+    The resulting directory can be loaded using :meth:`VPShardDataset.get_train_val()`.
+
+    Args:
+        dataset (VPDatasetWrapper): The training dataset to export. Its sequence length needs to be set.
+        out_dir (Union[str, Path]): The directory to write the shards to.
+        samples_per_shard (int): The maximum number of datapoints per shard.
+        float_frames (bool): If set to True, frames are stored as 32-bit floats instead of 8-bit integers.
+
+    Returns: The index dictionaries of the exported splits.
+    """
+    if not dataset.is_training_set():
+        raise ValueError("only training datasets (with training and validation splits) can be exported this way")
+    return {split: export_to_shards(dataset.datasets[split], Path(out_dir) / split, samples_per_shard, float_frames)
+            for split in ["train", "val"]}
+
+
+class VPShardDataset(IterableDataset):
+    r"""
+    An iterable dataset that streams datapoints from tar shards written by :meth:`export_to_shards()`.
+    The shards are read sequentially and are assigned to DataLoader workers and distributed ranks in a round-robin
+    fashion, so that each datapoint is emitted exactly once per epoch.
+    If shuffling, the shard order and a shuffle buffer over the read datapoints are randomized
+    (see :meth:`~vp_suite.utils.streaming.get_stream_rng()`). If a seed is set, call :meth:`set_epoch()` before
+    each epoch.
+
+    Like the map-style datasets, shard datasets provide their name, action size and configuration and
+    can be trained on (see :meth:`self.get_train_val()`). As the sequences are stored with a fixed length,
+    :meth:`self.set_seq_len()` only accepts sequence lengths that can be cut from the stored sequences.
+    """
+    ON_THE_FLY = False  #: Shards store pre-computed datapoints.
+
+    def __init__(self, shard_dir: Union[str, Path], shuffle: bool = False, shuffle_buffer_size: int = 512,
+                 seed: Optional[int] = None):
+        r"""
+        Args:
+            shard_dir (Union[str, Path]): The directory containing the shards and their index file.
+            shuffle (bool): If set to True, the shard order and the datapoints within the shuffle buffer are randomized.
+            shuffle_buffer_size (int): The number of datapoints that are mixed in the shuffle buffer.
+            seed (Optional[int]): If specified, the order of each epoch only depends on this seed and the epoch.
+        """
+        super(VPShardDataset, self).__init__()
+        self.shard_dir = Path(shard_dir)
+        with open(self.shard_dir / SHARD_INDEX_FILENAME, "r") as index_file:
+            self.index = json.load(index_file)
+        self.shuffle = shuffle
+        self.shuffle_buffer_size = shuffle_buffer_size
+        self.seed = seed
+        self.epoch = 0
+        self.total_frames = self.index["total_frames"]
+        self.ready_for_usage = False  # becomes True once sequence length has been set
+
+    @classmethod
+    def get_train_val(cls, shards_dir: Union[str, Path], shuffle_buffer_size: int = 512, **seq_kwargs):
+        r"""
+        Loads the training and validation splits written by :meth:`export_splits_to_shards()`.
+
+        Args:
+            shards_dir (Union[str, Path]): The directory the splits have been exported to.
+            shuffle_buffer_size (int): The number of training datapoints that are mixed in the shuffle buffer.
+            **seq_kwargs (Any): Optional sequence parameters ('context_frames', 'pred_frames' and 'seq_step'), which are set later on. As the datapoints have been prepared on export, no other dataset options are accepted.
+
+        Returns: The training data (shuffled) and the validation data (in order).
+        """
+        invalid_kwargs = set(seq_kwargs.keys()) - {"context_frames", "pred_frames", "seq_step"}
+        if len(invalid_kwargs) > 0:
+            raise ValueError(f"dataset options {sorted(invalid_kwargs)} can't be applied to exported shards")
+        shards_dir = Path(shards_dir)
+        return cls(shards_dir / "train", shuffle=True, shuffle_buffer_size=shuffle_buffer_size), \
+            cls(shards_dir / "val")
+
+    @classmethod
+    def get_test(cls, shards_dir: Union[str, Path], **seq_kwargs):
+        raise ValueError("shard datasets can only be used for training (testing needs random access to the data)")
+
+    @property
+    def NAME(self) -> str:
+        r"""
+        Returns: The name of the dataset the shards have been exported from.
+        """
+        return self.index["dataset_config"]["NAME"]
+
+    @property
+    def ACTION_SIZE(self) -> int:
+        r"""
+        Returns: The action size of the dataset the shards have been exported from.
+        """
+        return self.index["action_size"]
+
+    @property
+    def data_dir(self) -> str:
+        r"""
+        Returns: The directory containing the shards.
+        """
+        return str(self.shard_dir)
+
+    @property
+    def config(self) -> dict:
+        r"""
+        Returns: The configuration of the dataset the shards have been exported from.
+        """
+        return self.index["dataset_config"]
+
+    @property
+    def img_shape(self):
+        r"""
+        Returns: The shape of each frame of the stored sequences.
+        """
+        return tuple(self.index["img_shape"])
+
+    def set_seq_len(self, context_frames: int, pred_frames: int, seq_step: int):
+        r"""
+        Sets the sequence length for the upcoming run. The sequences are cut from the start of the stored sequences,
+        so the sequence step has to be the one used for exporting and the number of frames may not exceed the
+        stored number of frames.
+
+        Args:
+            context_frames (int): Number of input/context frames.
+            pred_frames (int): Number of frames to be predicted.
+            seq_step (int): Sequence step (for step N, assemble the sequence by taking every Nth frame).
+        """
+        total_frames = context_frames + pred_frames
+        if seq_step != self.index["seq_step"] or total_frames > self.index["total_frames"]:
+            raise ValueError(f"the shards in '{self.shard_dir}' hold sequences of {self.index['total_frames']} frames "
+                             f"with seq step {self.index['seq_step']}, which don't fit your configuration: "
+                             f"{{context frames: {context_frames}, pred frames: {pred_frames}, seq step: {seq_step}}}")
+        self.total_frames = total_frames
+        self.ready_for_usage = True
+
+    def reset_rng(self):
+        pass
+
+    def __len__(self):
+        r"""
+        Returns: The number of datapoints streamed to the calling rank (by all of its DataLoader workers).
+        """
+        return sum(shard["samples"] for shard in get_partition(self.index["shards"], per_worker=False))
+
+    def _read_shard(self, shard_name: str) -> Iterator[VPData]:
+        value_min, value_max = self.index["value_range"]
+        sample, sample_key = dict(), None
+        with tarfile.open(self.shard_dir / shard_name, "r|") as tar:  # stream mode: strictly sequential reads
+            for member in tar:
+                key, field = member.name.split(".", 1)
+                if key != sample_key and len(sample) > 0:
+                    yield self._make_datapoint(sample, value_min, value_max)
+                    sample = dict()
+                sample_key = key
+                payload = tar.extractfile(member).read()
+                if field == "origin.txt":
+                    sample["origin"] = payload.decode("utf-8")
+                else:
+                    sample[field.split(".")[0]] = np.load(io.BytesIO(payload), allow_pickle=False)
+        if len(sample) > 0:
+            yield self._make_datapoint(sample, value_min, value_max)
+
+    def _make_datapoint(self, sample: dict, value_min: float, value_max: float) -> VPData:
+        frames = torch.from_numpy(sample["frames"][:self.total_frames])
+        if self.index["quantized"]:
+            frames = frames.float() / 255. * (value_max - value_min) + value_min
+        actions = torch.from_numpy(sample["actions"][:self.total_frames])
+        return {"frames": frames, "actions": actions, "origin": sample["origin"]}
+
+    def set_epoch(self, epoch: int):
+        r"""
+        Sets the epoch, which determines the order of the streamed data if shuffling with a set seed.
+
+        Args:
+            epoch (int): The epoch number.
+        """
+        self.epoch = epoch
+
+    def __iter__(self) -> Iterator[VPData]:
+        shard_names = get_partition([shard["name"] for shard in self.index["shards"]])
+        if not self.shuffle:
+            for shard_name in shard_names:
+                yield from self._read_shard(shard_name)
+            return
+
+        rng = get_stream_rng(self.seed, self.epoch)
+        rng.shuffle(shard_names)
+        datapoints = (datapoint for shard_name in shard_names for datapoint in self._read_shard(shard_name))
+        yield from shuffle_buffered(datapoints, self.shuffle_buffer_size, rng)
@@ -0,0 +1,162 @@
+r"""
+This module contains utilities for streaming data, i.e. for providing datapoints through iterable
+(instead of map-style) datasets that read their underlying data sequentially.
+"""
+import random
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+import torch
+import torch.distributed as dist
+from torch.utils.data import IterableDataset, Subset, get_worker_info
+
+from vp_suite.base import VPVideoDataset, VPData
+
+
+def get_partition(items: Sequence, per_worker: bool = True) -> list:
+    r"""
+    Determines the part of the given items that the calling process is responsible for. The items are split
+    among the distributed ranks (if applicable) first, and the part of each rank is then split among
+    its DataLoader workers (if applicable), so that the part of a rank doesn't depend on its number of workers.
+
+    Args:
+        items (Sequence): The items to partition (e.g. sequences or shards).
+        per_worker (bool): If False, returns the part of the calling rank, i.e. the union of the parts of its workers.
+
+    Returns: The items of the calling rank/worker, in their given order.
+    """
+    rank, world_size = 0, 1
+    if dist.is_available() and dist.is_initialized():
+        rank, world_size = dist.get_rank(), dist.get_world_size()
+    items = list(items)[rank::world_size]
+    worker_info = get_worker_info()
+    if not per_worker or worker_info is None:
+        return items
+    return items[worker_info.id::worker_info.num_workers]
+
+
+def get_stream_rng(seed: Optional[int], epoch: int) -> random.Random:
+    r"""
+    Creates the random number generator that randomizes the order of the streamed data of the calling worker/rank.
+
+    Args:
+        seed (Optional[int]): If specified, the generator is seeded from this seed, the epoch, the distributed rank and the DataLoader worker, so that the order of every epoch is reproducible regardless of the global RNG states (e.g. when resuming an interrupted epoch). Otherwise, it is seeded from PyTorch's RNG, which the DataLoader seeds per worker and epoch.
+        epoch (int): The current epoch.
+
+    Returns: The random number generator.
+    """
+    if seed is None:
+        return random.Random(torch.empty((), dtype=torch.int64).random_().item())
+    rank = dist.get_rank() if dist.is_available() and dist.is_initialized() else 0
+    worker_info = get_worker_info()
+    worker_id = worker_info.id if worker_info is not None else 0
+    return random.Random(f"{seed}-{epoch}-{rank}-{worker_id}")
+
+
+def shuffle_buffered(items: Iterable, buffer_size: int, rng: random.Random) -> Iterator:
+    r"""
+    Approximately shuffles the given stream of items by keeping a buffer of given size,
+    from which a randomly chosen item is emitted for every incoming item.
+
+    Args:
+        items (Iterable): The stream of items to shuffle.
+        buffer_size (int): The number of items to keep in the buffer. Values < 2 disable shuffling.
+        rng (random.Random): The random number generator used for shuffling.
+
+    Returns: A generator yielding the shuffled items.
+    """
+    if buffer_size < 2:
+        yield from items
+        return
+    buffer = []
+    for item in items:
+        if len(buffer) < buffer_size:
+            buffer.append(item)
+            continue
+        idx = rng.randrange(buffer_size)
+        yield buffer[idx]
+        buffer[idx] = item
+    rng.shuffle(buffer)
+    yield from buffer
+
+
+class VPVideoStream(IterableDataset):
+    r"""
+    An iterable version of a :class:`~vp_suite.base.VPVideoDataset` (or of a subset of it, e.g. a training split):
+    Instead of seeking and decoding each datapoint separately, each sequence is decoded once from front to back
+    and all its windows are emitted in order. To decorrelate the emitted datapoints, they are mixed through
+    a shuffle buffer.
+
+    The sequences are partitioned across distributed ranks and DataLoader workers (see :meth:`get_partition()`)
+    so that each datapoint is emitted exactly once per epoch. Within a partition, the sequence order and the shuffle
+    buffer are randomized (see :meth:`get_stream_rng()`). If a seed is given, call :meth:`set_epoch()` before
+    each epoch.
+    """
+    def __init__(self, dataset, shuffle_buffer_size: int = 512, shuffle: bool = True, seed: Optional[int] = None):
+        r"""
+        Args:
+            dataset (Union[VPVideoDataset, VPSubset]): The (prepared) video dataset (or subset of it) to stream.
+            shuffle_buffer_size (int): The number of datapoints that are mixed in the shuffle buffer.
+            shuffle (bool): If False, sequences and windows are emitted in their original order.
+            seed (Optional[int]): If specified, the order of each epoch only depends on this seed and the epoch.
+        """
+        super(VPVideoStream, self).__init__()
+        self.seed = seed
+        self.epoch = 0
+        indices = range(len(dataset))
+        while isinstance(dataset, Subset):  # map the subset's indices to the underlying dataset
+            indices = [dataset.indices[i] for i in indices]
+            dataset = dataset.dataset
+        if not isinstance(dataset, VPVideoDataset):
+            raise ValueError(f"streaming is only supported for video datasets (given: {type(dataset).__name__})")
+        self.dataset = dataset
+        self.shuffle_buffer_size = shuffle_buffer_size
+        self.shuffle = shuffle
+
+        # the streamed windows: per sequence, the start indices of its windows that belong to the streamed data
+        window_starts = dict()
+        for i in indices:
+            sequence_path, start_idx = dataset.sequences_with_frame_index[i]
+            window_starts.setdefault(sequence_path, []).append(start_idx)
+        self.sequence_windows = [(sequence_path, frame_count, sorted(window_starts[sequence_path]))
+                                 for sequence_path, frame_count in dataset.sequences
+                                 if sequence_path in window_starts]
+
+    def __getattr__(self, item):
+        if item == "dataset":  # not set yet (e.g. during unpickling in worker processes)
+            raise AttributeError(item)
+        return getattr(self.dataset, item)
+
+    def __len__(self):
+        r"""
+        Returns: The number of datapoints streamed to the calling rank (by all of its DataLoader workers).
+        """
+        return sum(len(start_indices) for _, _, start_indices in get_partition(self.sequence_windows, False))
+
+    def set_epoch(self, epoch: int):
+        r"""
+        Sets the epoch, which determines the order of the streamed data if a seed is given.
+
+        Args:
+            epoch (int): The epoch number.
+        """
+        self.epoch = epoch
+
+    def partition_sequences(self) -> List:
+        r"""
+        Returns: The `(sequence_path, frame_count, start_indices)` tuples of the streamed sequences
+        that the calling worker/rank is responsible for.
+        """
+        return get_partition(self.sequence_windows)
+
+    def __iter__(self) -> Iterator[VPData]:
+        sequences = self.partition_sequences()
+        if not self.shuffle:
+            for sequence_path, frame_count, start_indices in sequences:
+                yield from self.dataset.iter_sequence_windows(sequence_path, frame_count, start_indices)
+            return
+
+        rng = get_stream_rng(self.seed, self.epoch)
+        rng.shuffle(sequences)
+        datapoints = (datapoint for sequence_path, frame_count, start_indices in sequences
+                      for datapoint in self.dataset.iter_sequence_windows(sequence_path, frame_count, start_indices))
+        yield from shuffle_buffered(datapoints, self.shuffle_buffer_size, rng)
@@ -10,6 +10,9 @@ import cv2
 import numpy as np
 import torch
 import torch.nn as nn
+from torch.utils.data import DataLoader, Dataset, IterableDataset, Subset, Sampler, BatchSampler, RandomSampler, \
+    SequentialSampler
+from torch.utils.data.dataloader import default_collate
 
 
 def most(l: List[bool], factor: float = 0.67):
@@ -156,10 +159,79 @@ def set_from_kwarg(obj, kwarg_dict: dict, attr_name: str,
     setattr(obj, attr_name, attr_val)
 
 
-def read_video(fp: Union[Path, str], img_size: (int, int) = None,
+class _BatchFetchDataset(Dataset):
+    r"""
+    Wraps a dataset that provides a `__getitems__()` method (e.g. a :class:`~vp_suite.base.VPVideoDataset`)
+    so that indexing it with a list of indices retrieves all of these datapoints with a single call to that method.
+    """
+    def __init__(self, data):
+        self.data = data
+
+    def __getitem__(self, indices):
+        return self.data.__getitems__(indices)
+
+    def __len__(self):
+        return len(self.data)
+
+
+def _provides_batch_fetch(data) -> bool:
+    r"""
+    Returns: True if given (map-style) data, or the dataset underlying given (nested) subsets, defines `__getitems__()`.
+    """
+    while isinstance(data, Subset):
+        data = data.dataset
+    return hasattr(data, "__getitems__") and not isinstance(data, IterableDataset)
+
+
+def get_loader(data, batch_size: int, run_config: dict, shuffle: bool = False, drop_last: bool = False,
+               sampler: Sampler = None, generator: torch.Generator = None):
+    r"""
+    Creates a DataLoader for given data, configured by the DataLoader options of given run configuration.
+    If the data (or, for subsets, the underlying dataset) provides a `__getitems__()` method, the datapoints of each
+    batch are retrieved with a single call to that method (which, e.g., lets video datasets decode overlapping windows
+    only once). Other datasets are loaded datapoint by datapoint, as usual.
+
+    Note:
+        Unshuffled data of on-the-fly datasets (e.g. validation/test data) is always loaded in the main process,
+        regardless of the configured number of workers, as each worker would generate data from its own copy
+        of the dataset's RNG, which yields duplicated and irreproducible data.
+        Worker processes are never kept alive across epochs for streamed data that is ordered by epoch
+        (i.e. that provides a `set_epoch()` method), as persistent workers would keep streaming their own copy
+        of the data, which doesn't know about epochs set afterwards.
+
+    Args:
+        data (Dataset): The data to load.
+        batch_size (int): The batch size.
+        run_config (dict): The run configuration containing the DataLoader options.
+        shuffle (bool): Whether to shuffle the data.
+        drop_last (bool): Whether to drop the last batch if it is incomplete.
+        sampler (Sampler): If specified, the data is sampled by this sampler (e.g. a :class:`DistributedSampler`), which also takes care of shuffling.
+        generator (torch.Generator): If specified, the seeds of the worker processes are drawn from this generator instead of the global PyTorch RNG.
+
+    Returns: The created DataLoader.
+    """
+    num_workers = run_config["num_workers"]
+    if getattr(data, "ON_THE_FLY", False) and not shuffle:
+        num_workers = 0  # each worker would hold a copy of the dataset's RNG -> duplicated, irreproducible data
+    loader_kwargs = {"num_workers": num_workers, "pin_memory": run_config["pin_memory"]}
+    if num_workers > 0:
+        loader_kwargs["persistent_workers"] = run_config["persistent_workers"] and not hasattr(data, "set_epoch")
+        loader_kwargs["prefetch_factor"] = run_config["prefetch_factor"]
+    if _provides_batch_fetch(data):
+        if sampler is None:
+            sampler = RandomSampler(data, generator=generator) if shuffle else SequentialSampler(data)
+        batch_sampler = BatchSampler(sampler, batch_size, drop_last)  # yields the index lists of the batches
+        return DataLoader(_BatchFetchDataset(data), batch_size=None, sampler=batch_sampler,
+                          collate_fn=default_collate, generator=generator, **loader_kwargs)
+    return DataLoader(data, batch_size=batch_size, shuffle=shuffle and sampler is None, sampler=sampler,
+                      drop_last=drop_last, generator=generator, **loader_kwargs)
+
+
+def iter_video(fp: Union[Path, str], img_size: (int, int) = None,
                start_index=0, num_frames=-1):
     r"""
-    Reads and returns the video specified by given file path as a numpy array.
+    Reads the video specified by given file path sequentially, yielding one frame at a time.
+    Unlike repeatedly calling :meth:`read_video()`, this only seeks once (to the start index).
 
     Args:
         fp (Union[Path, str]): The filepath to read the video from.
@@ -167,7 +239,7 @@ def read_video(fp: Union[Path, str], img_size: (int, int) = None,
         start_index (int): Index of first frame to read.
         num_frames (int): Nmber of frames to read (default value -1 signifies that video is read to the end).
 
-    Returns: The read video as a numpy array of shape (frames, height, width, channels).
+    Returns: A generator yielding the read frames as numpy arrays of shape (height, width, channels).
     """
     if isinstance(fp, Path):
         fp = str(fp.resolve())
@@ -175,19 +247,37 @@ def read_video(fp: Union[Path, str], img_size: (int, int) = None,
     if not cap.isOpened():
         raise ValueError(f"opening MP4 file '{fp}' failed")
 
-    collected_frames = []
-    cap.set(cv2.CAP_PROP_POS_FRAMES, start_index)
-    while num_frames < 0 or len(collected_frames) < num_frames:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        collected_frames.append(frame)
-    cap.release()
-
-    if img_size is not None:
-        h, w = img_size
-        collected_frames = [cv2.resize(frame, (w, h)) for frame in collected_frames]
-    collected_frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in collected_frames]
+    try:
+        if start_index > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_index)
+        n_read = 0
+        while num_frames < 0 or n_read < num_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            n_read += 1
+            if img_size is not None:
+                h, w = img_size
+                frame = cv2.resize(frame, (w, h))
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)  # [h, w, c]
+    finally:
+        cap.release()
+
+
+def read_video(fp: Union[Path, str], img_size: (int, int) = None,
+               start_index=0, num_frames=-1):
+    r"""
+    Reads and returns the video specified by given file path as a numpy array.
+
+    Args:
+        fp (Union[Path, str]): The filepath to read the video from.
+        img_size ((int, int)): The desired frame size (height and width; frames will be reshaped to this size)
+        start_index (int): Index of first frame to read.
+        num_frames (int): Nmber of frames to read (default value -1 signifies that video is read to the end).
+
+    Returns: The read video as a numpy array of shape (frames, height, width, channels).
+    """
+    collected_frames = list(iter_video(fp, img_size, start_index, num_frames))
     return np.stack(collected_frames, axis=0)   # [t, h, w, c]
 
 
@@ -1,27 +1,38 @@
-import random, json, os, time
+import random, json, os, time, hashlib
 import warnings
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from pathlib import Path
 from copy import deepcopy
 
 import numpy as np
 import torch
 import torch.nn as nn
-from torch.utils.data import DataLoader
 import wandb
 from tqdm import tqdm
 
 from vp_suite.defaults import SETTINGS, DEFAULT_RUN_CONFIG
 from vp_suite.utils.dataset_wrapper import VPDatasetWrapper
+from vp_suite.utils.streaming import VPVideoStream
+from vp_suite.utils.shards import VPShardDataset
 from vp_suite.datasets import DATASET_CLASSES
-from vp_suite.base import VPModel
+from vp_suite.base import VPModel, VPSubset
 from vp_suite.models import MODEL_CLASSES, AVAILABLE_MODELS
 from vp_suite.models.copy_last_frame import CopyLastFrame
+from vp_suite.models.onnx_model import ONNXModel, export_onnx
 from vp_suite.measure import LOSS_CLASSES
 from vp_suite.measure.loss_provider import PredictionLossProvider
-from vp_suite.measure.metric_provider import PredictionMetricProvider
+from vp_suite.measure.aggregation import MetricAggregator
 from vp_suite.utils.visualization import visualize_vid, visualize_sequences
-from vp_suite.utils.utils import timestamp
+from vp_suite.utils.utils import timestamp, get_loader
+from vp_suite.utils.evaluation import evaluate_batches, evaluate_models_in_processes, evaluate_shards_in_processes
+from vp_suite.utils.compilation import compile_model
+from vp_suite.utils.quantization import quantize_model, quantization_report
+from vp_suite.utils.memory_format import model_to_channels_last
+from vp_suite.utils.precision import create_grad_scaler
+from vp_suite.utils.distributed import run_distributed, is_distributed, get_rank, get_world_size, \
+    broadcast_module_state, all_gather_object, any_rank, get_split_indices, wrap_data_parallel
+from vp_suite.utils.checkpoint import AsyncCheckpointWriter, atomic_save, load_checkpoint, training_checkpoint, \
+    get_rng_state, set_rng_state, ResumableSampler, StepCallbackLoader
 from vp_suite.utils.compatibility import check_model_and_data_compat, check_run_and_model_compat
 
 
@@ -74,18 +85,26 @@ class VPSuite:
         """
         self.models : List[VPModel] = []
 
-    def load_dataset(self, dataset_id: str, split: str = "train", **dataset_kwargs):
+    def load_dataset(self, dataset_id: str, split: str = "train", shards_dir: Optional[str] = None,
+                     **dataset_kwargs):
         r"""
         Creates the dataset specified by given dataset id and appends it to `VPSuite`'s list of loaded datasets.
         
         Args:
             dataset_id (str): The string ID mapping of the desired dataset.
             split (str): This string specifies whether to load the dataset in training or testing mode.
+            shards_dir (Optional[str]): If specified, the training and validation data are streamed from the tar shards that the dataset has been exported to (see :meth:`~vp_suite.utils.shards.export_splits_to_shards()`), instead of being read from the dataset's files. Only available for training.
             **dataset_kwargs (Any): Optional additional dataset configuration options.
         """
         # create dataset wrapper
         dataset_class = DATASET_CLASSES[dataset_id]
-        dataset = VPDatasetWrapper(dataset_class, split, **dataset_kwargs)
+        if shards_dir is not None:
+            dataset = VPDatasetWrapper(VPShardDataset, split, shards_dir=shards_dir, **dataset_kwargs)
+            if dataset.NAME != dataset_class.NAME:
+                raise ValueError(f"the shards in '{shards_dir}' have been exported from dataset '{dataset.NAME}' "
+                                 f"instead of '{dataset_class.NAME}'")
+        else:
+            dataset = VPDatasetWrapper(dataset_class, split, **dataset_kwargs)
         print(f"loaded dataset '{dataset.NAME}' from {dataset.data_dir} "
               f"(action size: {dataset.action_size})")
 
@@ -122,27 +141,37 @@ class VPSuite:
         for model_id, model_class in MODEL_CLASSES.items():
             print(f"'{model_id}': {model_class.NAME}")
 
-    def load_model(self, model_dir: str, ckpt_name: str = "best_model.pth"):
+    def load_model(self, model_dir: str, ckpt_name: str = "best_model.pth", compile: Optional[str] = None):
         r"""
         Loads the model saved in the specified checkpoint file or the specified directory
          and appends it to `VPSuite`'s list of loaded models.
 
         Args:
             model_dir (str): Relative path to the directory containing the saved model.
-            ckpt_name (str): File name of the saved model.
+            ckpt_name (str): File name of the saved model. If it ends with '.onnx', the model is loaded as exported ONNX model (see :meth:`export_model()`) that runs with onnxruntime.
+            compile (Optional[str]): If specified, the recurrent cells of the model are compiled using this compilation mode ('trace' or 'compile', see :func:`compile_model()`).
         """
         model_ckpt = os.path.join(model_dir, ckpt_name)
-        model = torch.load(model_ckpt)
+        if ckpt_name.endswith(".onnx"):
+            model = ONNXModel(self.device, model_ckpt)
+        else:
+            model = load_checkpoint(model_ckpt)["model"]
+            model.to(model.device)  # checkpoints saved during training hold CPU snapshots of the models
+            quantization_backend = getattr(model, "quantization_backend", None)
+            if quantization_backend is not None:  # quantized models (see quantize_model()) run on their backend
+                torch.backends.quantized.engine = quantization_backend
         model.model_dir = model_dir
-        self._model_setup(model, loaded=True)
+        self._model_setup(model, loaded=True, compile=compile)
 
-    def create_model(self, model_id: str, action_conditional: bool = False, **model_kwargs):
+    def create_model(self, model_id: str, action_conditional: bool = False, compile: Optional[str] = None,
+                     **model_kwargs):
         r"""
         Creates the model specified by given string ID and appends it to `VPSuite`'s list of loaded models.
 
         Args:
             model_id (str): The string ID corresponding to your desired model.
             action_conditional (bool): If the model supports actions, this variable determines whether the model will actually use provided actions for prediction.
+            compile (Optional[str]): If specified, the recurrent cells of the model are compiled using this compilation mode ('trace' or 'compile', see :func:`compile_model()`).
             **model_kwargs (Any): Optional additional model configuration options.
         """
 
@@ -168,15 +197,99 @@ class VPSuite:
 
         # model creation
         model = model_class(self.device, **model_kwargs).to(self.device)
-        self._model_setup(model)
+        self._model_setup(model, compile=compile)
+
+    def export_model(self, model_idx: int = -1, context_frames: int = None, pred_frames: int = None,
+                     out_fp: str = None):
+        r"""
+        Exports the specified model to ONNX. The exported model predicts a fixed number of frames from a fixed number
+        of context frames (with dynamic batch size) and can be loaded with :meth:`load_model()`.
+
+        Args:
+            model_idx (int): The list index of the model that should be exported.
+            context_frames (int): The number of context frames the exported model takes as input. If None, the default run configuration value is used.
+            pred_frames (int): The number of frames the exported model predicts. If None, the default run configuration value is used.
+            out_fp (str): The file path of the exported model. If None, the model is exported to 'model.onnx' in the model's save location.
 
-    def _model_setup(self, model: VPModel, loaded: bool = False):
+        Returns: The file path of the exported model.
+        """
+        model = self.models[model_idx]
+        context_frames = context_frames or DEFAULT_RUN_CONFIG["context_frames"]
+        pred_frames = pred_frames or DEFAULT_RUN_CONFIG["pred_frames"]
+        if out_fp is None:
+            if model.model_dir is None:
+                raise ValueError(f"model '{model.NAME}' has no save location -> specify the export file path")
+            out_fp = os.path.join(model.model_dir, "model.onnx")
+        export_onnx(model, out_fp, context_frames, pred_frames)
+        print(f"exported model '{model.NAME}' to {out_fp} (context frames: {context_frames}, "
+              f"pred frames: {pred_frames})")
+        return out_fp
+
+    def quantize_model(self, model_idx: int = -1, dataset_idx: int = -1, calibration_split: str = "val",
+                       calibration_batches: int = 16, report_batches: int = 16, static: bool = True,
+                       dynamic: bool = True, backend: str = "fbgemm", out_fp: str = None, **run_kwargs):
+        r"""
+        Creates an int8-quantized copy of the specified model for CPU inference (see :func:`quantize_model()`),
+        calibrating it on the first batches of the specified dataset split. Afterwards, the quantized model is
+        compared to the float model on the subsequent batches of that split with the configured metrics,
+        saved (so that it can be loaded with :meth:`load_model()`) and appended to the list of loaded models.
+
+        Args:
+            model_idx (int): The list index of the model that should be quantized.
+            dataset_idx (int): The list index of the dataset used for calibration and comparison.
+            calibration_split (str): The dataset split used for calibration and comparison ('train', 'val' or 'test').
+            calibration_batches (int): The number of batches used for calibration.
+            report_batches (int): The number of batches used for comparing the quantized and the float model. If 0, no comparison is done.
+            static (bool): Whether to statically quantize the convolutional blocks.
+            dynamic (bool): Whether to dynamically quantize the linear layers and LSTM cells.
+            backend (str): The quantization backend ('fbgemm' for x86 CPUs, 'qnnpack' for ARM CPUs).
+            out_fp (str): The file path the quantized model is saved to. If None, the model is saved to 'quantized_model.pth' in the model's save location (if existent).
+            **run_kwargs (Any): Optional run configuration parameters used for obtaining the predictions.
+
+        Returns: For each metric, its value for the float model, the quantized model and their difference (empty if no comparison is done).
+        """
+        if self.device != "cpu":
+            raise ValueError("quantized models run on the CPU only -> use a VPSuite instance with device 'cpu'")
+        model = self.models[model_idx]
+        dataset = self.datasets[dataset_idx]
+        run_config = self._prepare_run("test" if dataset.is_test_set() else "train", **run_kwargs)
+        data = dataset.datasets.get(calibration_split, None)
+        if data is None or calibration_split == "main":
+            raise ValueError(f"dataset '{dataset.NAME}' does not contain split '{calibration_split}'")
+        check_run_and_model_compat(model, run_config)
+        preprocessing, postprocessing = check_model_and_data_compat(model, dataset)
+        dataset.set_seq_len(run_config["context_frames"], run_config["pred_frames"], run_config["seq_step"])
+        config: Dict[str, Any] = {**run_config, **dataset.config, "device": self.device}
+
+        # the comparison uses the batches following the calibration batches
+        batches = iter(get_loader(data, run_config["test_batch_size"], run_config))
+        calibration_data = [batch for (_, batch) in zip(range(calibration_batches), batches)]
+        quantized = quantize_model(model, calibration_data, config, preprocessing, static, dynamic, backend)
+        report = dict()
+        if report_batches > 0:
+            report_data = [batch for (_, batch) in zip(range(report_batches), batches)]
+            report = quantization_report(model, quantized, report_data, config, preprocessing, postprocessing)
+            print(f"quantization report for model '{model.NAME}' ({calibration_split} split):")
+            for metric, values in report.items():
+                print(f" -> {metric}: {values['float']} (float) / {values['int8']} (int8), diff.: {values['diff']}")
+
+        if out_fp is None and model.model_dir is not None:
+            out_fp = os.path.join(model.model_dir, "quantized_model.pth")
+        if out_fp is not None:
+            torch.save(quantized, out_fp)
+            quantized.model_dir = os.path.dirname(out_fp)
+            print(f"saved quantized model to {out_fp}")
+        self._model_setup(quantized)
+        return report
+
+    def _model_setup(self, model: VPModel, loaded: bool = False, compile: Optional[str] = None):
         r"""
         Internal model setup, also appending the model to the list of loaded models.
 
         Args:
             model (VPModel): The video prediction model.
             loaded (bool): Identifies whether the model has been loaded (=True) or newly created (=False).
+            compile (Optional[str]): If specified, the recurrent cells of the model are compiled using this compilation mode.
         """
         ac_str = "(action-conditional)" if model.config["action_conditional"] else ""
         loaded_str = "loaded" if loaded else "created new"
@@ -184,6 +297,9 @@ class VPSuite:
         total_params = sum(p.numel() for p in model.parameters())
         trainable_params = sum(p.numel() for p in model.parameters() if p.requires_grad)
         print(f" - Model parameters (total / trainable): {total_params} / {trainable_params}")
+        if compile is not None:
+            n_compiled = compile_model(model, compile)
+            print(f" - Compiled recurrent cells ({compile}): {n_compiled}")
         self.models.append(model)
 
     def _prepare_run(self, split: str = "train", **run_kwargs):
@@ -252,6 +368,9 @@ class VPSuite:
             dataset_idx (int): The list index of the dataset that should be used for training.
             model_idx (int) The list index of the model that should be trained on.
             **run_kwargs (Any): Optional specified run configuration parameters (will override the defaults).
+
+        Returns: The model, the dataset, the run configuration and, if resuming an interrupted training run,
+        the loaded resumable checkpoint (else None).
         """
         run_config = self._prepare_run("train", **run_kwargs)
 
@@ -261,6 +380,18 @@ class VPSuite:
         except IndexError:
             raise ValueError("given indices for model and/or dataset are invalid")
 
+        # if resuming, the model is replaced by the one of the interrupted run
+        checkpoint = None
+        if run_config["resume_from"] is not None:
+            resume_fp = self._get_resume_fp(run_config["resume_from"])
+            checkpoint = load_checkpoint(resume_fp)
+            if "epoch" not in checkpoint:
+                raise ValueError(f"'{resume_fp}' is not a resumable checkpoint")
+            model = checkpoint["model"]
+            model.to(model.device)
+            model.model_dir = str(resume_fp.parent.resolve())
+            self.models[model_idx] = model
+
         # prepare dataset
         dataset.set_seq_len(run_config["context_frames"], run_config["pred_frames"], run_config["seq_step"])
         assert dataset.is_ready, "dataset is not ready even though set_seq_len has just been called"
@@ -268,8 +399,29 @@ class VPSuite:
         # compat checks: run <--> model; model <--> dataset
         check_run_and_model_compat(model, run_config)
         _, _ = check_model_and_data_compat(model, dataset, strict_mode=True)
+        if run_config["checkpoint_every"] is not None and run_config["checkpoint_every"] < 1:
+            raise ValueError(f"checkpoint_every needs to be at least 1 (given: {run_config['checkpoint_every']})")
+        if run_config["grad_accum_steps"] < 1:
+            raise ValueError(f"grad_accum_steps needs to be at least 1 (given: {run_config['grad_accum_steps']})")
+        if run_config["channels_last"]:
+            model_to_channels_last(model)
+
+        return model, dataset, run_config, checkpoint
+
+    @staticmethod
+    def _get_resume_fp(resume_from: str) -> Path:
+        r"""
+        Args:
+            resume_from (str): A resumable checkpoint file or the output directory of an interrupted training run.
 
-        return model, dataset, run_config
+        Returns: The path of the resumable checkpoint file.
+        """
+        resume_fp = Path(resume_from)
+        if resume_fp.is_dir():
+            resume_fp = resume_fp / "last_checkpoint.pth"
+        if not resume_fp.exists():
+            raise ValueError(f"resumable checkpoint '{resume_fp}' not found")
+        return resume_fp
 
     def train(self, trial=None, dataset_idx: int = -1, model_idx: int = -1, **run_kwargs):
         r"""
@@ -282,6 +434,9 @@ class VPSuite:
         set and saved if it improved its performance on that set. 3. Every few epochs, prediction visualizations are
         created and saved to the disk. 4. Current model performance is logged.
 
+        If `train_processes` is greater than 1, the training run is distributed data-parallel across that many
+        spawned processes (see :meth:`_train_distributed()`).
+
         Args:
             trial (Any): If calling this function within a hyperparameter optimization run, this object cantains the necessary parameters. Otherwise, it's None.
             dataset_idx (int): The list index of the dataset that should be used for training.
@@ -290,12 +445,36 @@ class VPSuite:
 
         Returns: The best obtained validation loss (the corresponding model is saved as 'best_model.pt').
         """
+        if run_kwargs.get("train_processes", DEFAULT_RUN_CONFIG["train_processes"]) > 1 and not is_distributed():
+            return self._train_distributed(trial, dataset_idx, model_idx, **run_kwargs)
+
         # PREPARATION
-        model, dataset, run_config = self._prepare_training(dataset_idx, model_idx, **run_kwargs)
+        model, dataset, run_config, checkpoint = self._prepare_training(dataset_idx, model_idx, **run_kwargs)
+        rank, world_size = get_rank(), get_world_size()
+        is_main_process = rank == 0
         train_data, val_data = dataset.train_data, dataset.val_data
-        train_loader = DataLoader(train_data, batch_size=run_config["batch_size"], shuffle=True, num_workers=4,
-                                  drop_last=True)
-        val_loader = DataLoader(val_data, batch_size=1, shuffle=False, num_workers=0, drop_last=True)
+        train_sampler, val_shard = None, val_data
+        if world_size > 1:
+            self._set_seeds(run_config["seed"] + rank)  # random draws (e.g. dropout) differ between the ranks
+            if self.device == "cuda":
+                model.to(torch.device("cuda", torch.cuda.current_device()))
+            broadcast_module_state(model)
+            if not getattr(val_data, "ON_THE_FLY", False):  # else, each rank validates on all of the generated data
+                val_shard = VPSubset(val_data, get_split_indices(len(val_data), world_size, rank))
+        if isinstance(train_data, VPShardDataset):  # already streamed
+            train_data.shuffle_buffer_size = run_config["shuffle_buffer_size"]
+            train_data.seed = run_config["seed"]
+        elif run_config["stream_train_data"]:
+            train_data = VPVideoStream(train_data, shuffle_buffer_size=run_config["shuffle_buffer_size"],
+                                       seed=run_config["seed"])
+        else:  # the order of the training data only depends on seed and epoch, so that it can be resumed mid-epoch
+            train_sampler = ResumableSampler(train_data, num_replicas=world_size, rank=rank, shuffle=True,
+                                             seed=run_config["seed"], drop_last=True)
+        train_batch_size = run_config["batch_size"] // world_size
+        loader_generator = torch.Generator()  # keeps the global RNG untouched when starting to iterate the data
+        train_loader = get_loader(train_data, train_batch_size, run_config, shuffle=train_sampler is not None,
+                                  drop_last=True, sampler=train_sampler, generator=loader_generator)
+        val_loader = get_loader(val_shard, run_config["val_batch_size"] or run_config["batch_size"], run_config)
         best_val_loss = float("inf")
 
         # re-use model_dir of pre-loaded/pre-initialized models if no out_dir has been specified
@@ -311,7 +490,7 @@ class VPSuite:
         best_model_path = str((out_path / 'best_model.pth').resolve())
         with_training = model.TRAINABLE and not run_config["no_train"]
         with_validation = not run_config["no_val"]
-        with_wandb = not run_config["no_wandb"]
+        with_wandb = not run_config["no_wandb"] and is_main_process
 
         # HYPERPARAMETER OPTIMIZATION
         optuna_config = run_config.get("optuna", None)
@@ -337,9 +516,10 @@ class VPSuite:
                                   "model_name": model.NAME, "dataset_name": dataset.NAME}
         save_config = {"run": run_config, "model": model.config,
                        "dataset": dataset.config, "device": self.device}
-        with open(str((out_path / 'run_cfg.json').resolve()), "w") as cfg_file:
-            json.dump(save_config, cfg_file, indent=4,
-                      default=lambda o: str(o) if callable(getattr(o, "__str__", None)) else '<not serializable>')
+        if is_main_process:
+            with open(str((out_path / 'run_cfg.json').resolve()), "w") as cfg_file:
+                json.dump(save_config, cfg_file, indent=4,
+                          default=lambda o: str(o) if callable(getattr(o, "__str__", None)) else '<not serializable>')
 
         # WandB
         if with_wandb:
@@ -348,11 +528,13 @@ class VPSuite:
                        dir=str(SETTINGS.WANDB_PATH.resolve()), reinit=wandb_reinit)
 
         # OPTIMIZER
-        optimizer, optimizer_scheduler = None, None
+        optimizer, optimizer_scheduler, grad_scaler = None, None, None
         if with_training:
             optimizer = torch.optim.Adam(params=model.parameters(), lr=run_config["lr"])
             optimizer_scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(optimizer, patience=5, factor=0.2,
                                                                              min_lr=1e-6, verbose=True)
+            grad_scaler = create_grad_scaler(config)  # only for float16 mixed precision, else None
+        ddp_model = wrap_data_parallel(model) if with_training and world_size > 1 else None
 
         # LOSSES AND MEASUREMENT
         loss_provider = PredictionLossProvider(config)
@@ -364,15 +546,80 @@ class VPSuite:
         else:
             def loss_improved(cur_loss, best_loss): return cur_loss < best_loss
 
+        # CHECKPOINTING
+        checkpoint_writer = AsyncCheckpointWriter() if run_config["async_checkpoints"] and is_main_process else None
+
+        def save_checkpoint(fp: str, **training_state):
+            # snapshot in CPU memory
+            new_checkpoint = training_checkpoint(model, optimizer, optimizer_scheduler, **training_state)
+            if checkpoint_writer is None:
+                atomic_save(new_checkpoint, fp)
+            else:
+                checkpoint_writer.save(new_checkpoint, fp)
+
+        last_checkpoint_path = str((out_path / 'last_checkpoint.pth').resolve())
+        with_resumable_checkpoints = run_config["checkpoint_every"] is not None
+        training_start, previous_training_time = time.time(), 0.
+
+        def save_resumable_checkpoint(next_epoch: int, next_step: int):
+            rng_states = all_gather_object(get_rng_state())  # the ranks of distributed runs have different RNG states
+            training_time = previous_training_time + time.time() - training_start
+            grad_scaler_state = {"grad_scaler_state_dict": grad_scaler.state_dict()} if grad_scaler is not None else {}
+            if is_main_process:
+                save_checkpoint(last_checkpoint_path, epoch=next_epoch, step=next_step, best_val_loss=best_val_loss,
+                                rng_states=rng_states, training_time=training_time, **grad_scaler_state)
+
+        # RESUMPTION
+        start_epoch, start_step = 0, 0
+        if checkpoint is not None:
+            if with_training:
+                optimizer.load_state_dict(checkpoint["optimizer_state_dict"])
+                optimizer_scheduler.load_state_dict(checkpoint["scheduler_state_dict"])
+                if grad_scaler is not None and "grad_scaler_state_dict" in checkpoint:
+                    grad_scaler.load_state_dict(checkpoint["grad_scaler_state_dict"])
+            start_epoch, start_step = checkpoint["epoch"], checkpoint["step"]
+            best_val_loss = checkpoint["best_val_loss"]
+            previous_training_time = checkpoint["training_time"]
+            if len(checkpoint["rng_states"]) == world_size:
+                set_rng_state(checkpoint["rng_states"][rank])
+            else:
+                warnings.warn(f"the interrupted run used {len(checkpoint['rng_states'])} training processes "
+                              f"-> not restoring the RNG states")
+            print(f"Resuming training at epoch {start_epoch+1}, step {start_step}...")
+
+        # called after every training step: checks the time limit and saves resumable checkpoints
+        steps_done, timed_out = 0, False
+
+        def after_step():
+            nonlocal steps_done, timed_out
+            steps_done += 1
+            timed_out = any_rank(time.time() > training_timeout)  # all ranks stop after the same step
+            if with_resumable_checkpoints and (timed_out or steps_done % run_config["checkpoint_every"] == 0):
+                save_resumable_checkpoint(epoch, steps_done)
+            return timed_out
+
         # --- MAIN LOOP ---
-        training_timeout = time.time() + config["max_training_hours"] * 3600
-        for epoch in range(0, run_config["epochs"]):
+        training_timeout = training_start + config["max_training_hours"] * 3600 - previous_training_time
+        for epoch in range(start_epoch, run_config["epochs"]):
             print(f"\nEpoch: {epoch+1} of {config['epochs']}")
 
             # train
             if with_training:
                 print("Training...")
-                model.train_iter(config, train_loader, optimizer, loss_provider, epoch)
+                steps_done = start_step if epoch == start_epoch else 0  # skip the steps done before an interruption
+                if train_sampler is not None:  # all ranks shuffle the same way, differently in every epoch
+                    train_sampler.set_epoch(epoch, start_index=steps_done * train_batch_size)
+                else:  # the order of streamed data only depends on seed and epoch, so that it can be fast-forwarded
+                    train_data.set_epoch(epoch)
+                loader_generator.manual_seed(run_config["seed"] + epoch * world_size + rank)  # seeds of loader workers
+                epoch_loader = StepCallbackLoader(train_loader, after_step,
+                                                  skip_batches=steps_done if train_sampler is None else 0)
+                optimizer.zero_grad()  # gradients are accumulated by the models and reset after each weight update
+                model.train_iter(config, epoch_loader, optimizer, loss_provider, epoch, grad_scaler, ddp_model)
+                broadcast_module_state(model, buffers_only=True)  # e.g. batch norm statistics, for validation and saving
+                if timed_out:
+                    print("Maximum training time exceeded, leaving training loop...")
+                    break
             else:
                 print("Skipping training loop.")
 
@@ -391,14 +638,18 @@ class VPSuite:
                 cur_val_loss = indicator_loss.item()
                 if loss_improved(cur_val_loss, best_val_loss):
                     best_val_loss = cur_val_loss
-                    torch.save(model, best_model_path)
+                    if is_main_process:
+                        save_checkpoint(best_model_path)
                     print(f"Minimum indicator loss ({config['val_rec_criterion']}) reduced -> model saved!")
             else:
                 print("Skipping validation loop and simply saving current model as the 'best' model.")
-                torch.save(model, best_model_path)
+                if is_main_process:
+                    save_checkpoint(best_model_path)
 
             # visualize current model performance every nth epoch, using eval mode and validation data.
-            if (epoch+1) % config["vis_every"] == 0 and not config["no_vis"]:
+            # (not available for validation data streamed from shards, as it can't be accessed at random)
+            if (epoch+1) % config["vis_every"] == 0 and not config["no_vis"] and is_main_process \
+                    and not isinstance(val_data, VPShardDataset):
                 print("Saving visualizations...")
                 vis_out_dir = out_path / f"vis_ep_{epoch+1:03d}"
                 vis_out_dir.mkdir(exist_ok=True)  # overrides existing visualizations (e.g. from previous runs)
@@ -415,16 +666,63 @@ class VPSuite:
             # final bookkeeping
             if with_validation and with_wandb:
                 wandb.log(val_losses, commit=True)
-            if time.time() > training_timeout:
+            if with_resumable_checkpoints:
+                save_resumable_checkpoint(epoch + 1, 0)
+            if any_rank(time.time() > training_timeout):  # all ranks leave the training loop together
                 print("Maximum training time exceeded, leaving training loop...")
                 break
 
         # finishing training by saving final model and returning best performance on validation set
         print("\nTraining done, cleaning up...")
-        torch.save(model, str((out_path / 'final_model.pth').resolve()))
+        if is_main_process:
+            save_checkpoint(str((out_path / 'final_model.pth').resolve()))
+        if checkpoint_writer is not None:
+            checkpoint_writer.close()  # waits until all checkpoints have been written
         wandb.finish()
         return best_val_loss  # return best validation loss for hyperparameter optimization
 
+    def _train_distributed(self, trial, dataset_idx: int, model_idx: int, **run_kwargs):
+        r"""
+        Executes a training run in `train_processes` spawned processes (see :meth:`train()`) that train replicas of the
+        model data-parallel. Afterwards, the trained model (saved as 'final_model.pth' by the first process)
+        replaces the model in `VPSuite`'s list of loaded models.
+
+        Args:
+            trial (Any): Needs to be None, as hyperparameter optimization doesn't support distributed training.
+            dataset_idx (int): The list index of the dataset that should be used for training.
+            model_idx (int) The list index of the model that should be trained on.
+            **run_kwargs (Any): Optional specified run configuration parameters (will override the defaults).
+
+        Returns: The best obtained validation loss.
+        """
+        from functools import partial
+        if trial is not None:
+            raise ValueError("hyperparameter optimization doesn't support distributed training")
+        run_config = self._prepare_run("train", **run_kwargs)
+        if run_config["batch_size"] % run_config["train_processes"] != 0:
+            raise ValueError(f"batch_size ({run_config['batch_size']}) has to be divisible by "
+                             f"the number of training processes ({run_config['train_processes']})")
+        if run_config["stream_train_data"] or isinstance(self.datasets[dataset_idx].train_data, VPShardDataset):
+            raise ValueError("streamed training data can't be used for distributed training")
+        try:
+            model: VPModel = self.models[model_idx]
+        except IndexError:
+            raise ValueError("given indices for model and/or dataset are invalid")
+
+        # all processes have to save to the same location -> determine it beforehand
+        if run_config["out_dir"] is None and run_config["resume_from"] is not None:
+            run_kwargs["out_dir"] = str(self._get_resume_fp(run_config["resume_from"]).parent.resolve())
+        elif run_config["out_dir"] is None:
+            run_kwargs["out_dir"] = model.model_dir or str(SETTINGS.OUT_PATH / timestamp('train'))
+        train_fn = partial(self.train, None, dataset_idx, model_idx, **run_kwargs)
+        best_val_loss = run_distributed(train_fn, run_config["train_processes"], run_config["dist_backend"])
+
+        trained_model = load_checkpoint(os.path.join(run_kwargs["out_dir"], "final_model.pth"))["model"]
+        trained_model.to(trained_model.device)
+        trained_model.model_dir = str(Path(run_kwargs["out_dir"]).resolve())
+        self.models[model_idx] = trained_model
+        return best_val_loss
+
     def hyperopt(self, optuna_config: dict, n_trials: int = 30, dataset_idx: int = -1, model_idx: int = -1,
                  **run_kwargs):
         r"""
@@ -478,6 +776,8 @@ class VPSuite:
         for model in self.models:
             try:
                 check_run_and_model_compat(model, run_config)
+                if run_config["channels_last"]:
+                    model_to_channels_last(model)
                 test_models.append(model)
             except ValueError as e:
                 print(f"skipping test of model '{model.NAME}' because of incompatibility with run config: {str(e)}")
@@ -490,7 +790,8 @@ class VPSuite:
                 try:
                     # model-data compat check returns adapters if discrepancies can be bridged for testing
                     preprocessing, postprocessing = check_model_and_data_compat(model, test_set)
-                    test_set_model_list.append((model, preprocessing, postprocessing, []))
+                    test_set_model_list.append((model, preprocessing, postprocessing,
+                                                MetricAggregator(run_config["metric_ci"])))
                 except ValueError as e:
                     print(f"skipping test of model '{model.NAME}' on dataset '{test_set.NAME}' "
                           f"because of incompatibility: {str(e)}")
@@ -498,7 +799,8 @@ class VPSuite:
 
             # add baseline copy model (doesn't need checks)
             clf_baseline = CopyLastFrame().to(self.device)
-            test_set_model_list.append((clf_baseline, nn.Identity(), nn.Identity(), []))
+            test_set_model_list.append((clf_baseline, nn.Identity(), nn.Identity(),
+                                        MetricAggregator(run_config["metric_ci"])))
 
         test_sets_and_model_lists = zip(test_sets, model_lists_all_test_sets)
         return test_sets_and_model_lists, run_config
@@ -516,11 +818,12 @@ class VPSuite:
         """
         # PREPARATION
         test_data = dataset.test_data
-        test_loader = DataLoader(test_data, batch_size=1, shuffle=False, num_workers=0)
-        if len(test_loader) < 1:
+        if len(test_data) < 1:
             raise RuntimeError("loaded dataset does not contain any data (len < 1)")
         test_mode = "brief" if brief_test else "full"
-        eval_length = min(len(test_loader), 10) if test_mode == "brief" else len(test_loader)
+        eval_data = VPSubset(test_data, list(range(min(len(test_data), 10)))) if brief_test else test_data
+        test_loader = get_loader(eval_data, run_config["test_batch_size"], run_config)
+        eval_length = len(eval_data)
 
         # assemble and save combined configuration
         config: Dict[str, Any] = {**run_config, **dataset.config, "device": self.device, "dataset_name": dataset.NAME}
@@ -529,25 +832,23 @@ class VPSuite:
         # evaluation / metric calc.
         context_frames = config["context_frames"]
         pred_frames = config["pred_frames"]
-        iter_loader = iter(test_loader)
-        with torch.no_grad():
-            metric_provider = PredictionMetricProvider(config)
-
-            for _ in tqdm(range(eval_length)):
-                data = next(iter_loader)
-
-                for (model, preprocess, postprocess, model_metrics_per_dp) in model_info_list:
-                    input, target, actions = model.unpack_data(data, config)
-                    input = preprocess(input)  # test format to model format
-                    model.eval()
-                    if getattr(model, "use_actions", False):
-                        pred, _ = model(input, pred_frames=pred_frames, actions=actions)
-                    else:
-                        pred, _ = model(input, pred_frames=pred_frames)
-                    model.train()
-                    pred = postprocess(pred)  # model format to test format
-                    cur_metrics = metric_provider.get_metrics(pred, target, all_frame_cnts=True)
-                    model_metrics_per_dp.append(cur_metrics)
+        feature_cache_fp = None
+        if config["fvd_feature_cache"]:
+            seq_config = {"dataset": dataset.config, "context_frames": context_frames,
+                          "pred_frames": pred_frames, "seq_step": config["seq_step"]}
+            cache_id = hashlib.sha1(json.dumps(seq_config, sort_keys=True, default=str).encode()).hexdigest()
+            feature_cache_fp = SETTINGS.DATA_PATH / "fvd_feature_cache" / f"{cache_id}.pt"
+        if config["parallel_test"] is None:
+            feature_cache = evaluate_batches(tqdm(test_loader), model_info_list, config, feature_cache_fp)
+        elif config["parallel_test"] == "models":
+            feature_cache = evaluate_models_in_processes(tqdm(test_loader), model_info_list, config, feature_cache_fp)
+        elif config["parallel_test"] == "shards":
+            feature_cache = evaluate_shards_in_processes(eval_data, model_info_list, config, feature_cache_fp)
+        else:
+            raise ValueError(f"invalid parallel test mode '{config['parallel_test']}' "
+                             f"(supported: None, 'models', 'shards')")
+        if feature_cache is not None:
+            feature_cache.save()
 
         # save visualizations
         timestamp_test = timestamp('test')
@@ -570,19 +871,9 @@ class VPSuite:
         # log or display metrics
         if eval_length > 0:
             wandb_full_suffix = f"{test_mode} test"
-            for i, (model, _, _, model_metrics_per_dp) in enumerate(model_info_list):
-                # model_metrics_per_dp: list of N lists of F metric dicts (called D).
-                # each D_{n,f} contains all calculated metrics for datapoint 'n' and a prediction horizon of 'f' frames.
-                # -> Aggregate these metrics over all n, keeping the specific metrics/prediction horizons separate
-                datapoint_range = range(len(model_metrics_per_dp))
-                frame_range = range(len(model_metrics_per_dp[0]))
-                metric_keys = model_metrics_per_dp[0][0].keys()
-                mean_metric_dicts = [
-                    {metric_key: np.mean(
-                        [model_metrics_per_dp[dp_i][frame][metric_key] for dp_i in datapoint_range]
-                    ) for metric_key in metric_keys}
-                    for frame in frame_range
-                ]
+            for i, (model, _, _, metric_aggregator) in enumerate(model_info_list):
+                # for each prediction horizon, the metrics aggregated over all datapoints
+                mean_metric_dicts = metric_aggregator.result()
 
                 # Log model to WandB
                 if with_wandb: